@@ -0,0 +1,290 @@
+"""Prune near-identical conformations from the negative-design backbones of
+an IsolateBB state version.
+
+The complexes given in neg_backbones.list and neg_complexes.list are
+grouped by mut_status. Within each group, the RMSD between the backbones
+(the N, CA, C and O atoms) of every pair of complexes is computed after
+optimal superposition (Kabsch), all pairs at once with NumPy. The
+complexes are then clustered in the order in which they are listed
+(neg_backbones.list first): a complex joins the first cluster whose
+representative is within the threshold of it, and otherwise becomes the
+representative of a new cluster. The representatives are kept.
+
+The reduced state version is written to a new state version directory:
+pos_backbones.list is copied, the two negative lists are written with
+each dropped line commented out (naming the complex it was clustered
+with), and the pdbs that the lists name are symlinked. A backbone of
+neg_backbones.list is kept, even if it was clustered with another, as
+long as some kept line of neg_complexes.list gives a conformation of it.
+
+If the .states files of the original state version have been created,
+the number of states (and so of cpus) that the pruning saves is counted
+from them:
+
+    python3 -m generic_msd.cluster_backbones --state_version_dir sv \\
+        --output_dir sv_clustered --threshold 0.5
+"""
+
+import os
+import shutil
+import numpy
+import blargs
+from .opt_holder import OptHolder
+from .pdb_coordinates import read_pdb_coordinates
+
+backbone_atom_names = (" N  ", " CA ", " C  ", " O  ")
+
+
+class NegativeEntry:
+    """A line of neg_backbones.list or neg_complexes.list"""
+
+    def __init__(self, list_fname, line, cols):
+        self.list_fname = list_fname
+        self.line = line
+        self.mut_status = cols[0]
+        self.bbname = cols[1]
+        if list_fname == "neg_backbones.list":
+            assert cols[2] == "complex="
+            assert cols[4] == "separated="
+            self.complex_pdb = cols[3]
+            self.pdbs = [cols[3], cols[5]]
+        else:
+            self.complex_pdb = cols[2]
+            self.pdbs = [cols[2]]
+        # set for the entries that are dropped: the entry kept in their stead
+        self.representative = None
+        self.rmsd = None
+
+
+def read_list_lines(fname):
+    if not os.path.isfile(fname):
+        return []
+    with open(fname) as fid:
+        return fid.readlines()
+
+
+def read_negative_entries(state_version_dir):
+    """The entries of neg_backbones.list and then of neg_complexes.list, in
+    the order in which they are listed"""
+    entries = []
+    for list_fname in ["neg_backbones.list", "neg_complexes.list"]:
+        for line in read_list_lines(os.path.join(state_version_dir, list_fname)):
+            stripped = line.strip()
+            if len(stripped) == 0 or stripped[0] == "#":
+                continue
+            entries.append(NegativeEntry(list_fname, line, stripped.split()))
+    return entries
+
+
+def backbone_coordinates(pdb_fname):
+    """The (chain, residue id, atom name) of each backbone atom of a pdb,
+    and an (N,3) array of their coordinates"""
+    pdbc = read_pdb_coordinates(pdb_fname)
+    keys = []
+    rows = []
+    for k, i in enumerate(pdbc.atom_rows):
+        line = pdbc.lines[i]
+        if line[12:16] in backbone_atom_names:
+            keys.append((line[21], line[22:27].strip(), line[12:16]))
+            rows.append(k)
+    return tuple(keys), pdbc.coords[rows]
+
+
+def pairwise_rmsd(coords):
+    """The (n,n) matrix of the RMSDs between each pair of n structures of
+    the same m atoms, given as an (n,m,3) array, after the optimal
+    superposition of one onto the other. The rotation is never built: the
+    RMSD follows from the singular values of the 3x3 covariance matrix of
+    each pair, with the sign of the last flipped if the best orthogonal
+    transformation would be a reflection. The covariance matrices of one
+    structure with all those after it are decomposed together"""
+    coords = numpy.asarray(coords, dtype=float)
+    n, m = coords.shape[0], coords.shape[1]
+    centered = coords - coords.mean(axis=1, keepdims=True)
+    sq_norms = numpy.einsum("nmk,nmk->n", centered, centered)
+    rmsd = numpy.zeros((n, n))
+    for i in range(n - 1):
+        others = centered[i + 1 :]
+        covariance = numpy.einsum("mk,jml->jkl", centered[i], others)
+        u, s, vt = numpy.linalg.svd(covariance)
+        reflection = numpy.linalg.det(u) * numpy.linalg.det(vt) < 0
+        s[reflection, -1] *= -1
+        msd = (sq_norms[i] + sq_norms[i + 1 :] - 2 * s.sum(axis=1)) / m
+        rmsd[i, i + 1 :] = numpy.sqrt(numpy.maximum(msd, 0.0))
+    return rmsd + rmsd.T
+
+
+def leader_clusters(rmsd, threshold):
+    """The index of the representative of the cluster of each structure:
+    each structure, in order, joins the first representative within the
+    threshold of it, or else becomes a representative"""
+    representatives = []
+    assignment = []
+    for i in range(rmsd.shape[0]):
+        for rep in representatives:
+            if rmsd[rep, i] <= threshold:
+                assignment.append(rep)
+                break
+        else:
+            representatives.append(i)
+            assignment.append(i)
+    return assignment
+
+
+def cluster_negative_entries(state_version_dir, threshold):
+    """Read the negative entries of a state version, set the representative
+    of each that is to be dropped, and return them all"""
+    entries = read_negative_entries(state_version_dir)
+    backbones = {}
+    for entry in entries:
+        if entry.complex_pdb not in backbones:
+            backbones[entry.complex_pdb] = backbone_coordinates(
+                os.path.join(state_version_dir, entry.complex_pdb)
+            )
+    by_mut_status = {}
+    for entry in entries:
+        by_mut_status.setdefault(entry.mut_status, []).append(entry)
+    for mut_status, group in by_mut_status.items():
+        keys = backbones[group[0].complex_pdb][0]
+        for entry in group:
+            if backbones[entry.complex_pdb][0] != keys:
+                raise ValueError(
+                    "The backbone atoms of "
+                    + entry.complex_pdb
+                    + " differ from those of "
+                    + group[0].complex_pdb
+                    + "; the complexes of mut_status "
+                    + mut_status
+                    + " cannot be compared"
+                )
+        rmsd = pairwise_rmsd(
+            numpy.stack([backbones[entry.complex_pdb][1] for entry in group])
+        )
+        for i, rep in enumerate(leader_clusters(rmsd, threshold)):
+            if rep != i:
+                group[i].representative = group[rep]
+                group[i].rmsd = rmsd[rep, i]
+
+    # keep the negative backbones that kept conformations still refer to
+    needed = set(
+        entry.bbname
+        for entry in entries
+        if entry.list_fname == "neg_complexes.list" and entry.representative is None
+    )
+    for entry in entries:
+        if entry.list_fname == "neg_backbones.list" and entry.bbname in needed:
+            entry.representative = None
+            entry.rmsd = None
+    return entries
+
+
+def positive_pdbs(state_version_dir):
+    """The complexes and separated complexes of pos_backbones.list"""
+    pdbs = set()
+    for line in read_list_lines(os.path.join(state_version_dir, "pos_backbones.list")):
+        cols = line.split()
+        if len(cols) >= 5 and cols[0][0] != "#":
+            pdbs.update([cols[2], cols[4]])
+    return pdbs
+
+
+def states_per_pdb(state_version_dir):
+    """The number of lines of the .states files of a state version that
+    name each pdb"""
+    counts = {}
+    for fname in os.listdir(state_version_dir):
+        if not fname.endswith(".states"):
+            continue
+        for line in read_list_lines(os.path.join(state_version_dir, fname)):
+            cols = line.split()
+            if cols:
+                counts[cols[0]] = counts.get(cols[0], 0) + 1
+    return counts
+
+
+def write_reduced_state_version(state_version_dir, output_dir, entries):
+    os.makedirs(output_dir, exist_ok=True)
+    kept_pdbs = positive_pdbs(state_version_dir)
+    for list_fname in ["neg_backbones.list", "neg_complexes.list"]:
+        fname = os.path.join(state_version_dir, list_fname)
+        if not os.path.isfile(fname):
+            continue
+        list_entries = dict(
+            (entry.line, entry) for entry in entries if entry.list_fname == list_fname
+        )
+        lines = []
+        for line in read_list_lines(fname):
+            entry = list_entries.get(line)
+            if entry is not None and entry.representative is not None:
+                lines.append(
+                    "# clustered with %s (backbone rmsd %.3f): %s"
+                    % (entry.representative.complex_pdb, entry.rmsd, line)
+                )
+            else:
+                lines.append(line)
+                if entry is not None:
+                    kept_pdbs.update(entry.pdbs)
+        with open(os.path.join(output_dir, list_fname), "w") as fid:
+            fid.writelines(lines)
+
+    shutil.copyfile(
+        os.path.join(state_version_dir, "pos_backbones.list"),
+        os.path.join(output_dir, "pos_backbones.list"),
+    )
+
+    for pdb in sorted(kept_pdbs):
+        src = os.path.abspath(os.path.join(state_version_dir, pdb))
+        dest = os.path.join(output_dir, pdb)
+        # a missing separated pdb is created when the state version is read
+        if os.path.isfile(src) and not os.path.lexists(dest):
+            os.symlink(src, dest)
+
+
+def report_reduction(entries, state_counts, pos_pdbs):
+    dropped = [entry for entry in entries if entry.representative]
+    print(
+        "Kept %d of the %d negative complexes"
+        % (len(entries) - len(dropped), len(entries))
+    )
+    mut_statuses = sorted(set(entry.mut_status for entry in entries))
+    for mut_status in mut_statuses:
+        group = [entry for entry in entries if entry.mut_status == mut_status]
+        ndropped = len([entry for entry in group if entry.representative])
+        print("  %s: kept %d of %d" % (mut_status, len(group) - ndropped, len(group)))
+    if not state_counts:
+        print(
+            "The .states files of the state version have not been created, so "
+            "the number of states saved is not known"
+        )
+        return
+    kept_pdbs = set(pos_pdbs)
+    kept_pdbs.update(
+        pdb for entry in entries if entry.representative is None for pdb in entry.pdbs
+    )
+    dropped_pdbs = set(
+        pdb for entry in dropped for pdb in entry.pdbs if pdb not in kept_pdbs
+    )
+    nstates = sum(state_counts.values())
+    nsaved = sum(state_counts.get(pdb, 0) for pdb in dropped_pdbs)
+    print(
+        "Removed %d of the %d states, which saves %d cpus per subjob at one "
+        "state per cpu" % (nsaved, nstates, nsaved)
+    )
+
+
+if __name__ == "__main__":
+    opts = OptHolder()
+    with blargs.Parser(opts) as p:
+        p.str("state_version_dir").required()
+        p.str("output_dir").required()
+        p.float("threshold").default(0.5)
+
+    if os.path.abspath(opts.output_dir) == os.path.abspath(opts.state_version_dir):
+        raise ValueError("The reduced state version must be written to a new directory")
+    entries = cluster_negative_entries(opts.state_version_dir, opts.threshold)
+    write_reduced_state_version(opts.state_version_dir, opts.output_dir, entries)
+    report_reduction(
+        entries,
+        states_per_pdb(opts.state_version_dir),
+        positive_pdbs(opts.state_version_dir),
+    )
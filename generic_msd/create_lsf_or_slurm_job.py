@@ -33,8 +33,56 @@ class SubmissionOptions:
         self.job_name = ""
         self.logfilename = ""
         self.timelimit = (1, 0, 0)
+        self.submission_dir = ""
         self.submission_script_fname = ""
         self.mpi_job = False
+        # job arrays: when array_size is non-zero, the script is submitted
+        # as a single array job of array_size tasks, at most
+        # array_max_concurrent of which (if non-zero) run at once; task i
+        # runs in the directory named in the first column of line i of the
+        # array_task_file and writes its output to <directory>.log there
+        self.array_size = 0
+        self.array_max_concurrent = 0
+        self.array_task_file = ""
+        # job dependencies: when job_id_file is given, the submission command
+        # appends the id of the submitted job to that file, and when
+        # dependency_id_file is given, the job will not start until every
+        # job whose id is listed in that file has completed successfully.
+        # Both paths are relative to the directory the command is run from
+        self.job_id_file = ""
+        self.dependency_id_file = ""
+        # when walltime_file is given, the script writes the number of
+        # seconds the command took to that file (relative to the directory
+        # the command runs in) if the command succeeds
+        self.walltime_file = ""
+        # a packed job is one allocation shared by several MPI commands,
+        # each launched with its own ranks (see
+        # command_and_submission_script_for_packed_job)
+        self.packed = False
+
+
+def cores_per_node(server: KnownComputers) -> int:
+    """The number of cores on a single compute node of the given cluster"""
+    if server == KnownComputers.DOGWOOD:
+        return 44
+    elif server == KnownComputers.LONGLEAF:
+        return 24
+    else:
+        return 12
+
+
+def max_seconds_for_allocation(job_options: SubmissionOptions):
+    """The longest wall time (in seconds) that the partition the job would
+    be sent to allows, or None if it imposes no limit we know of; this
+    mirrors the partition choice in resolve_slurm_partition"""
+    if job_options.server == KnownComputers.DOGWOOD:
+        if job_options.queue in ("debug", "debug_queue", "cleanup_queue") or (
+            job_options.queue == "auto"
+            and job_options.num_nodes < 45
+            and not job_options.packed
+        ):
+            return 4 * 3600
+    return None
 
 
 def resolve_slurm_partition(job_options: SubmissionOptions):
@@ -54,6 +102,12 @@ def resolve_slurm_partition(job_options: SubmissionOptions):
             job_options.queue == "auto"
         ):  # Figure out what queue to use based on the number of nodes
             # that have been requested for this job.
+            if job_options.packed and job_options.num_nodes < 45:
+                # a pack is meant to run for the full time limit, which
+                # the cleanup queue does not allow; request the smallest
+                # allocation the 528 queue accepts and leave the extra
+                # tasks idle
+                job_options.num_nodes = 45
             if job_options.num_nodes < 45:
                 job_options.queue = "cleanup_queue"
                 job_options.timelimit = (0,4,0)
@@ -67,12 +121,140 @@ def resolve_slurm_partition(job_options: SubmissionOptions):
     elif job_options.server == KnownComputers.LONGLEAF:
         if job_options.mpi_job:
             job_options.queue = "SNP"
-            if job_options.num_nodes > 24:
+            # the job steps of a packed allocation ask for all of its
+            # tasks, so it cannot be shrunk
+            if job_options.num_nodes > 24 and not job_options.packed:
                 job_options.num_nodes = 24
         elif job_options.queue == "auto":
             job_options.queue = "general"
 
 
+def array_task_id_variable(scheduler: SchedulerType) -> str:
+    """The environment variable holding the (1-based) index of an array task"""
+    if scheduler == SchedulerType.LSF_SCHEDULER:
+        return "LSB_JOBINDEX"
+    else:
+        return "SLURM_ARRAY_TASK_ID"
+
+
+def array_range(job_options: SubmissionOptions) -> str:
+    """The task range of an array job, e.g. "1-12%4" for twelve tasks
+    with at most four running at once"""
+    task_range = "1-%d" % job_options.array_size
+    if job_options.array_max_concurrent > 0:
+        task_range += "%%%d" % job_options.array_max_concurrent
+    return task_range
+
+
+def array_logfilename(job_options: SubmissionOptions) -> str:
+    """Give each task of an array job its own scheduler log file"""
+    base, ext = os.path.splitext(job_options.logfilename)
+    index = "%I" if job_options.scheduler == SchedulerType.LSF_SCHEDULER else "%a"
+    return base + "_" + index + ext
+
+
+def array_task_preamble(job_options: SubmissionOptions):
+    """Lines (without newlines) that look up this task's line in the array
+    task file and move into the directory it names"""
+    task = "${%s}" % array_task_id_variable(job_options.scheduler)
+    return [
+        'ARRAY_TASK=$(sed -n "%sp" %s)' % (task, job_options.array_task_file),
+        'echo "array task %s: $ARRAY_TASK"' % task,
+        "SUBJOB_DIR=$(echo $ARRAY_TASK | awk '{print $1}')",
+        "cd $SUBJOB_DIR",
+    ]
+
+
+def lsf_header_lines(job_options: SubmissionOptions, logfilename: str):
+    """The #BSUB lines (each ending in a newline) for an LSF submission script"""
+    queue = job_options.queue if job_options.queue != "auto" else "week"
+    script_lines = ["#!/bin/bash\n"]
+    if job_options.array_size > 0:
+        script_lines.append(
+            '#BSUB -J "%s[%s]"\n' % (job_options.job_name, array_range(job_options))
+        )
+    script_lines.append("#BSUB -n %d\n" % job_options.num_nodes)
+    script_lines.append("#BSUB -q %s\n" % queue)
+    script_lines.append("#BSUB -o %s\n" % logfilename)
+    if job_options.mpi_job:
+        script_lines.append("#BSUB -a mvapich\n")
+    return script_lines
+
+
+def slurm_header_lines(job_options: SubmissionOptions, logfilename: str):
+    """The #SBATCH lines (without newlines) for a SLURM submission script;
+    this resolves the partition for the job"""
+    resolve_slurm_partition(job_options)
+
+    script_lines = ["#!/bin/bash"]
+    # as of 8/16, this line causes problems script_lines.append("#SBATCH --tasks-per-node=44")
+    script_lines.append("#SBATCH --job-name=%s" % job_options.job_name)
+    script_lines.append("#SBATCH --distribution=cyclic:cyclic")
+    script_lines.append("#SBATCH --ntasks=%d" % job_options.num_nodes)
+    script_lines.append("#SBATCH --output=%s" % logfilename)
+    script_lines.append("#SBATCH --partition=%s" % job_options.queue)
+
+    script_lines.append( "#SBATCH --time=%02d-%02d:%02d" % job_options.timelimit )
+    if job_options.array_size > 0:
+        script_lines.append("#SBATCH --array=%s" % array_range(job_options))
+    return script_lines
+
+
+def submission_command_for_script(job_options: SubmissionOptions) -> str:
+    """The command that submits the job's script, including the clauses
+    that make it wait for the jobs in the dependency_id_file and that
+    record its id in the job_id_file, if either is given. A missing or
+    empty dependency_id_file means that the jobs it was to list were never
+    submitted, so rather than submit the job with nothing to wait for, the
+    command then stops the script it is run from"""
+    fname = job_options.submission_script_fname
+    command = ""
+    if job_options.dependency_id_file:
+        command = '[ -s %s ] || { echo "no job ids in %s" >&2; exit 1; }; ' % (
+            job_options.dependency_id_file,
+            job_options.dependency_id_file,
+        )
+    if job_options.scheduler == SchedulerType.LSF_SCHEDULER:
+        command += "bsub"
+        if job_options.dependency_id_file:
+            command += (
+                ' -w "$(awk \'{printf "%%s%%s", (NR > 1 ? "&&" : ""), "done(" $1 ")"}\' %s)"'
+                % job_options.dependency_id_file
+            )
+        command += " < %s" % fname
+        if job_options.job_id_file:
+            command += (
+                " | sed -n 's/^Job <\\([0-9]*\\)>.*/\\1/p' >> %s"
+                % job_options.job_id_file
+            )
+    else:
+        command += "sbatch"
+        if job_options.dependency_id_file:
+            command += (
+                " --dependency=afterok:$(paste -sd: %s)" % job_options.dependency_id_file
+            )
+        if job_options.job_id_file:
+            command += " --parsable %s | cut -d';' -f1 >> %s" % (
+                fname,
+                job_options.job_id_file,
+            )
+        else:
+            command += " " + fname
+    return command
+
+
+def walltime_lines(job_options: SubmissionOptions):
+    """Lines (without newlines) to put before and after a command so that its
+    wall time is written to job_options.walltime_file when it succeeds"""
+    return (
+        ["START_TIME=$(date +%s)"],
+        [
+            "if [ $? -eq 0 ]; then echo $(( $(date +%%s) - START_TIME )) > %s; fi"
+            % job_options.walltime_file
+        ],
+    )
+
+
 def command_and_submission_script_for_job(
     job_options: SubmissionOptions, command_line: str
 ) -> str:
@@ -83,51 +265,114 @@ def command_and_submission_script_for_job(
     and return the command for submitting the job.
 
     NOTE: This command may include an input redirect operator
-    ("<") so if you pass this command to another command,
+    ("<") or a pipe, so if you pass this command to another command,
     make sure to wrap it in quotes!
+
+    The submission script is written into job_options.submission_dir
+    (the current directory if it is empty), but the returned command
+    refers to it by its bare name, so it must be run from that directory.
     """
 
+    script_path = os.path.join(
+        job_options.submission_dir, job_options.submission_script_fname
+    )
+    is_array = job_options.array_size > 0
+    logfilename = (
+        array_logfilename(job_options) if is_array else job_options.logfilename
+    )
+    preamble = []
+    postscript = []
+    if is_array:
+        preamble = array_task_preamble(job_options)
+        command_line = command_line.rstrip("\n") + " > $SUBJOB_DIR.log 2>&1"
+    if job_options.walltime_file:
+        before, postscript = walltime_lines(job_options)
+        preamble = preamble + before
+
     if job_options.scheduler == SchedulerType.LSF_SCHEDULER:
-        queue = job_options.queue if job_options.queue != "auto" else "week"
-        script_lines = ["#!/bin/bash\n"]
-        script_lines.append("#BSUB -n %d\n" % job_options.num_nodes)
-        script_lines.append("#BSUB -q %s\n" % queue)
-        script_lines.append("#BSUB -o %s\n" % job_options.logfilename)
+        script_lines = lsf_header_lines(job_options, logfilename)
         #subcmd_list = ["bsub -n"]
         #subcmd_list.append(str(job_options.num_nodes))
         #subcmd_list.append("-q " + job_options.queue)
         #subcmd_list.append("-o " + job_options.logfilename)
+        script_lines.extend(line + "\n" for line in preamble)
         if job_options.mpi_job:
-            script_lines.append("#BSUB -a mvapich\n")
             script_lines.append("mpirun %s\n" % command_line)
             #subcmd_list.append("-a mvapich mpirun " + command_line)
         else:
             script_lines.append(command_line)
             #subcmd_list.append(command_line)
-        with open(job_options.submission_script_fname, "w") as fid:
+        if postscript:
+            if not script_lines[-1].endswith("\n"):
+                script_lines.append("\n")
+            script_lines.extend(line + "\n" for line in postscript)
+        with open(script_path, "w") as fid:
             fid.writelines(script_lines)
-        return "bsub < %s" % job_options.submission_script_fname
+        return submission_command_for_script(job_options)
 
     else:
         assert job_options.scheduler == SchedulerType.SLURM_SCHEDULER
 
-        resolve_slurm_partition(job_options)
-
-        script_lines = ["#!/bin/bash"]
-        # as of 8/16, this line causes problems script_lines.append("#SBATCH --tasks-per-node=44")
-        script_lines.append("#SBATCH --job-name=%s" % job_options.job_name)
-        script_lines.append("#SBATCH --distribution=cyclic:cyclic")
-        script_lines.append("#SBATCH --ntasks=%d" % job_options.num_nodes)
-        script_lines.append("#SBATCH --output=%s" % job_options.logfilename)
-        script_lines.append("#SBATCH --partition=%s" % job_options.queue)
-
-        script_lines.append( "#SBATCH --time=%02d-%02d:%02d" % job_options.timelimit )
+        script_lines = slurm_header_lines(job_options, logfilename)
         script_lines.append("\n")
+        script_lines.extend(preamble)
         if job_options.mpi_job:
             script_lines.append("$MPI_HOME/bin/mpirun  %s\n" % command_line)
         else:
             script_lines.append(command_line + "\n")
-        with open(job_options.submission_script_fname, "w") as fid:
+        script_lines.extend(line + "\n" for line in postscript)
+        with open(script_path, "w") as fid:
             fid.writelines("\n".join(script_lines))
-        return "sbatch " + job_options.submission_script_fname
+        return submission_command_for_script(job_options)
+
+
+
+def command_and_submission_script_for_packed_job(
+    job_options: SubmissionOptions, tasks, ntasks=0
+) -> str:
+    """Create an LSF or SLURM script that runs several MPI commands at
+    once inside a single allocation and return the command for submitting it.
+
+    tasks is a list of (directory, nranks, command_line) triples; each
+    command is launched in the background from its directory with its
+    own number of ranks (mpirun -np under LSF, srun --exclusive -n under
+    SLURM, so that the job steps do not share cores), writes its output
+    to <directory>.log in that directory, and the script waits for all
+    of them to finish. The allocation requests ntasks tasks (e.g. those of
+    a number of full nodes), or the sum of the ranks of the tasks if that
+    is more; job_options.num_nodes is set accordingly (on dogwood, to at
+    least the 45 tasks that keep the pack out of the 4-hour cleanup queue).
+    """
+    job_options.packed = True
+    job_options.num_nodes = max(ntasks, sum(nranks for _, nranks, _ in tasks))
+    script_path = os.path.join(
+        job_options.submission_dir, job_options.submission_script_fname
+    )
+    if job_options.scheduler == SchedulerType.LSF_SCHEDULER:
+        script_lines = lsf_header_lines(job_options, job_options.logfilename)
+        launcher = "mpirun -np %d"
+    else:
+        assert job_options.scheduler == SchedulerType.SLURM_SCHEDULER
+        script_lines = [
+            line + "\n"
+            for line in slurm_header_lines(job_options, job_options.logfilename)
+        ]
+        launcher = "srun --exclusive -n %d"
 
+    script_lines.append("\n")
+    for dirname, nranks, command_line in tasks:
+        command = "%s %s > %s.log 2>&1" % (
+            launcher % nranks,
+            command_line.rstrip("\n"),
+            dirname,
+        )
+        if job_options.walltime_file:
+            command = (
+                "START_TIME=$(date +%%s) && %s && echo $(( $(date +%%s) - START_TIME )) > %s"
+                % (command, job_options.walltime_file)
+            )
+        script_lines.append("(cd %s && %s) &\n" % (dirname, command))
+    script_lines.append("wait\n")
+    with open(script_path, "w") as fid:
+        fid.writelines(script_lines)
+    return submission_command_for_script(job_options)
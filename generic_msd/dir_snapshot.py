@@ -0,0 +1,53 @@
+import os
+
+
+class DirectorySnapshot:
+    """Answer "does this file exist?" for the files of one directory from a
+    single listing of it, rather than asking the file system about each
+    file (on a network file system, every such question is a round trip
+    to the server).
+
+    The listing is taken the first time it is needed and is not refreshed
+    on its own: whoever writes a file into the directory should either
+    add its name to the snapshot or invalidate the snapshot so that the
+    directory is listed again. Questions about paths outside of the
+    directory are passed on to os.path.isfile.
+    """
+
+    def __init__(self, dirname):
+        self.dirname = os.path.abspath(dirname)
+        self._names = None
+
+    def names(self):
+        """The set of names of the files (or symlinks to files) in the
+        directory"""
+        if self._names is None:
+            names = set([])
+            if os.path.isdir(self.dirname):
+                with os.scandir(self.dirname) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            names.add(entry.name)
+            self._names = names
+        return self._names
+
+    def has(self, name):
+        """Whether a file of the given name exists in the directory"""
+        return name in self.names()
+
+    def isfile(self, path):
+        """A stand-in for os.path.isfile"""
+        dirname, name = os.path.split(os.path.abspath(path))
+        if dirname != self.dirname:
+            return os.path.isfile(path)
+        return name in self.names()
+
+    def add(self, path):
+        """Note that a file has been written to the directory"""
+        if self._names is not None:
+            self._names.add(os.path.basename(path))
+
+    def invalidate(self):
+        """Forget the listing; the directory will be listed again when next
+        asked about"""
+        self._names = None
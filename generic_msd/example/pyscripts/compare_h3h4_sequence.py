@@ -1,5 +1,9 @@
 from pdb_structure import pdbstructure_from_file
 from setup_h3h4_job import base_dir
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import os
+import numpy
 import blargs
 import amino_acids
 
@@ -10,8 +14,15 @@ def h3h4_pdb():
 
 
 def compare_h3h4_seq_against_design(design, compact, chAonly=False, chBonly=False):
-    return compare_h3h4_original_against_design(
-        h3h4_pdb(), design, compact, chAonly, chBonly
+    # the reference is indexed once per process rather than parsed per call
+    ref_index = reference_index(h3h4_pdb())
+    design_index = read_ca_resnames(design)
+    return mutations_line(
+        find_mutations_against_index(ref_index, design_index, "A"),
+        find_mutations_against_index(ref_index, design_index, "B"),
+        compact,
+        chAonly,
+        chBonly,
     )
 
 def find_mutations_for_chain(orig_struct, design_struct, chain):
@@ -54,6 +65,10 @@ def compare_h3h4_original_against_design(
     #                 chAmuts.append(mut)
     #             else:
     #                 chBmuts.append(mut)
+    return mutations_line(chAmuts, chBmuts, compact, chAonly, chBonly)
+
+
+def mutations_line(chAmuts, chBmuts, compact, chAonly=False, chBonly=False):
     chAmuts = sorted(chAmuts, key=lambda mut: int(mut[1]))
     chBmuts = sorted(chBmuts, key=lambda mut: int(mut[1]))
     line = ""
@@ -85,15 +100,146 @@ def compare_h3h4_original_against_design(
     return line
 
 
+def read_ca_resnames(pdb, chains=("A", "B")):
+    """Map chain -> residue id -> residue name from only the CA records of a
+    PDB file; much faster than building the full structure when only the
+    sequence is wanted"""
+    index = {chain: {} for chain in chains}
+    with open(pdb) as fid:
+        for line in fid:
+            if (
+                line.startswith("ATOM  ")
+                and line[12:16] == " CA "
+                and line[21] in index
+            ):
+                index[line[21]][line[22:27].strip()] = line[17:20]
+    return index
+
+
+@functools.lru_cache(maxsize=None)
+def reference_index(reference_pdb):
+    return read_ca_resnames(reference_pdb)
+
+
+def find_mutations_against_index(ref_index, design_index, chain):
+    """The same mutations as find_mutations_for_chain, from CA indices"""
+    des_ch = design_index[chain]
+    return [
+        (resname, resid, des_ch[resid])
+        for resid, resname in ref_index[chain].items()
+        if resid in des_ch and des_ch[resid] != resname
+    ]
+
+
+# the reference index a worker process compares designs against; set once
+# per worker, so the reference is read only once, by the parent process
+_worker_ref_index = None
+
+
+def _init_comparison_worker(ref_index):
+    global _worker_ref_index
+    _worker_ref_index = ref_index
+
+
+def _design_mutations(design):
+    design_index = read_ca_resnames(design)
+    return (
+        find_mutations_against_index(_worker_ref_index, design_index, "A"),
+        find_mutations_against_index(_worker_ref_index, design_index, "B"),
+    )
+
+
+def mutations_for_designs(ref_index, designs, nprocs=1):
+    """The (chain A, chain B) mutation lists for each of a list of designs,
+    computed on a pool of nprocs processes"""
+    if nprocs <= 1:
+        _init_comparison_worker(ref_index)
+        return [_design_mutations(design) for design in designs]
+    with ProcessPoolExecutor(
+        max_workers=nprocs,
+        initializer=_init_comparison_worker,
+        initargs=(ref_index,),
+    ) as pool:
+        return list(pool.map(_design_mutations, designs, chunksize=16))
+
+
+def compare_designs_against_reference(
+    reference_pdb, designs, compact, chAonly=False, chBonly=False, nprocs=1
+):
+    """The line compare_h3h4_original_against_design would give for each
+    of a list of designs, reading the reference only once"""
+    return [
+        mutations_line(chAmuts, chBmuts, compact, chAonly, chBonly)
+        for chAmuts, chBmuts in mutations_for_designs(
+            reference_index(reference_pdb), designs, nprocs
+        )
+    ]
+
+
+def mutation_matrix(reference_pdb, designs, nprocs=1):
+    """Encode the mutations of a list of designs as an integer matrix with a
+    row for each design and a column for each residue of chains A and B
+    of the reference. An entry is 0 where the design keeps the reference
+    residue, and otherwise the index into the returned list of residue
+    names (whose first element is "") of the residue it was mutated to.
+    Returns (matrix, positions, resnames) where positions holds the
+    "<chain><resid>" name of each column"""
+    ref_index = reference_index(reference_pdb)
+    positions = [
+        (chain, resid) for chain in ("A", "B") for resid in ref_index[chain]
+    ]
+    column = {position: j for j, position in enumerate(positions)}
+    muts_for_designs = mutations_for_designs(ref_index, designs, nprocs)
+    resnames = [""] + sorted(
+        set(
+            mut[2]
+            for chain_muts in muts_for_designs
+            for muts in chain_muts
+            for mut in muts
+        )
+    )
+    code = {resname: k for k, resname in enumerate(resnames)}
+    matrix = numpy.zeros((len(designs), len(positions)), dtype=numpy.int8)
+    for i, chain_muts in enumerate(muts_for_designs):
+        for chain, muts in zip(("A", "B"), chain_muts):
+            for _, resid, resname in muts:
+                matrix[i, column[(chain, resid)]] = code[resname]
+    return matrix, [chain + resid for chain, resid in positions], resnames
+
 if __name__ == "__main__":
     with blargs.Parser(locals()) as p:
-        p.str("design").shorthand("d").required()
+        des = p.str("design").shorthand("d")
+        p.str("design_list").conflicts(des)
         p.str("reference_pdb").default(h3h4_pdb())
         p.flag("compact").shorthand("c")
         chao = p.flag("chH3only").shorthand("a")
         p.flag("chH4only").shorthand("b").conflicts(chao)
+        p.int("nprocs").default(len(os.sched_getaffinity(0)))
+        p.str("npz")
 
-    line = compare_h3h4_original_against_design(
-        reference_pdb, design, compact, chH3only, chH4only
-    )
-    print(line, end=" ")
+    if not design and not design_list:
+        raise ValueError("Either --design or --design_list must be given")
+    if design_list:
+        # compare every design in the list, one per line, in one process
+        designs = [line.strip() for line in open(design_list) if line.strip()]
+        if npz:
+            matrix, positions, resnames = mutation_matrix(
+                reference_pdb, designs, nprocs
+            )
+            numpy.savez_compressed(
+                npz,
+                matrix=matrix,
+                designs=numpy.array(designs),
+                positions=numpy.array(positions),
+                resnames=numpy.array(resnames),
+            )
+        else:
+            for line in compare_designs_against_reference(
+                reference_pdb, designs, compact, chH3only, chH4only, nprocs
+            ):
+                print(line)
+    else:
+        line = compare_h3h4_original_against_design(
+            reference_pdb, design, compact, chH3only, chH4only
+        )
+        print(line, end=" ")
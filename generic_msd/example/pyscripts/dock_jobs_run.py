@@ -8,7 +8,7 @@ from generic_msd.msd_interface_design import PostProcessingOpts
 from generic_msd.server_identification import ServerIdentifier
 from generic_msd.msd_job_management import rosetta_scripts_jd3_exe
 from setup_h3h4_job import base_dir
-from replace_design_in_h3h4ctxt import place_design_into_xtal_context
+from replace_design_in_h3h4ctxt import place_designs_into_xtal_context
 
 import blargs
 
@@ -53,6 +53,8 @@ if __name__ == "__main__":
     with blargs.Parser(options) as p:
         PostProcessingOpts.add_options(p)
         p.str("pdb-complexes").required()
+        p.int("nprocs").default(len(os.sched_getaffinity(0)))
+        p.flag("splice-context")
 
     pdb_complexes = open(options.pdb_complexes).readlines()
 
@@ -60,6 +62,7 @@ if __name__ == "__main__":
 
     ctxt_pdb = os.path.join(base_dir(), "input_files/starting_structures/1kx5/1KX5_h3h4ctxt.pdb")
     pdbs = []
+    placements = []
     new_pdb_complexes = []
     for pdb_tuple in pdb_complexes:
         cols = pdb_tuple.split()
@@ -68,10 +71,14 @@ if __name__ == "__main__":
             print(pdb)
             if pdb != "\n":
                 newpdbname = pdb.replace(".pdb", "_ctxt.pdb")
-                place_design_into_xtal_context(ctxt_pdb, pdb, newpdbname)
+                placements.append((pdb, newpdbname))
                 pdbs.append(newpdbname)
                 line.append(newpdbname)
         new_pdb_complexes.append(" ".join(line) + "\n")
+    # the context is read once and the designs are placed into it in parallel
+    place_designs_into_xtal_context(
+        ctxt_pdb, placements, options.nprocs, options.splice_context
+    )
     filename_parts = os.path.splitext(options.pdb_complexes)
     new_complex_filename = filename_parts[0] + "_in_ctxt" + filename_parts[1]
     with open(new_complex_filename, "w") as fid:
@@ -110,6 +117,8 @@ if __name__ == "__main__":
     dock_submit_opts.job_name = "docking"
     dock_submit_opts.logfilename = "docking.log"
     dock_submit_opts.submission_script_fname = "docking.sh"
+    # the dock_jobs_view job waits on the id recorded here
+    dock_submit_opts.job_id_file = "dock_job_ids.txt"
     dock_submit_opts.mpi_job = True
 
     dock_command = "".join(
@@ -128,5 +137,8 @@ if __name__ == "__main__":
         dock_submit_opts, dock_command
     )
 
+    # the id is appended to dock_job_ids.txt; clear out the ids of any
+    # earlier run, which the analysis would otherwise wait on
+    os.system("rm -f " + dock_submit_opts.job_id_file)
     print(submission_command)
-    os.system(submission_command + " >> dock_submission.log")
+    os.system(submission_command)
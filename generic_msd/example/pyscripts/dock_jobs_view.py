@@ -1,6 +1,11 @@
 import os
 import sys
 import math
+import glob
+import shutil
+import functools
+import numpy
+from concurrent.futures import ProcessPoolExecutor
 from read_IntAnalyzer_log import *
 from optparse import OptionParser
 from compare_h3h4_sequence import compare_h3h4_seq_against_design
@@ -9,82 +14,163 @@ from generic_msd.opt_holder import OptHolder
 import blargs
 
 
-class IAResult:
-    def __init__(self):
-        self.fname = ""
-        self.job_index = 0
-        self.dGbind = 0
-        self.dSASA = 0
-        self.eDens = 0
-        self.pack = 0
-        self.uns = 0
-        self.total_score = 0
-
-def scorefile_column_ranges_from_lines( line ):
-    """Compute the column ranges
-    
-    The column ranges are taken as the beginning of the space characters
-    ahead of the first non-whitespace character to the last character
-    of the column header. The last column, however, is considered to
-    go all the way to the end of the line"""
-    
-    col_ranges = []
-    found_non_ws = False
-    start = 0
-    for i in range(len(line)):
-        c = line[i]
-        if " " == c:
-            if found_non_ws:
-                col_ranges.append((start,i))
-                found_non_ws = False
-                start = i+1
-        elif "\n" == c and found_non_ws and i == len(line)-1:
-            col_ranges.append((start,-1))
-        else:
-            found_non_ws = True
-    if line[-1] != "\n":
-        col_ranges.append((start,-1))
-    else:
-        start,stop = col_ranges.pop()
-        col_ranges.append((start,-1))
-    print("col ranges:", col_ranges)
-    return col_ranges
-
-
-def read_iaresults_from_score_file(sc_fname, ia_prefix=""):
-    with open(sc_fname) as fid:
-        lines = fid.readlines()
-    score_line = lines[1]
-    assert score_line.startswith("SCORE:")
-    col_ranges = scorefile_column_ranges_from_lines(lines[1])
-    headers = {lines[1][x[0]:x[1]].strip(): x for x in col_ranges}
-    results = []
-    for i in range(2,len(lines)):
-
-        if lines[i].startswith("SEQUENCE"):
-            continue
-
-        # unpack the score line as pairs of descriptions and values
-        line_params = {h: lines[i][r[0]:r[1]] for h,r in headers.items()}
-        if line_params["total_score"] == "total_score":
-            continue
-
-        res = IAResult()
-        res.fname = line_params["description"]
-        print("result:", res.fname)
-        pref = "" if ia_prefix == "" else (ia_prefix + "_")
-        res.job_index = line_params["description"][:-4]
-        res.dGbind = float(line_params[pref + "dG_separated"])
-        res.dSASA = float(line_params[pref + "dSASA_int"])
-        res.uns = float(line_params[pref + "delta_unsatHbonds"])
-        res.total_score = float(line_params["total_score"])
-        results.append(res)
-    return results
-
-def avg_binding_energy_from_top10(results1, results2):
-    top10_by_total = sorted(range(len(results1), key=lambda ind: results1[ind].total_score)[0:10]
-
-    return sum((results1[ind].dGbind + results2[ind].dGbind) for ind in top10_by_total) / 10
+# the InterfaceAnalyzer columns of a score file that are read for each prefix
+ia_columns = ("dG_separated", "dSASA_int", "delta_unsatHbonds")
+
+
+def score_file_shards(dirname="."):
+    """The score files written by the docking job in a directory: the
+    score.sc.* shards written by the MPI ranks, or score.sc if there are none"""
+    shards = sorted(glob.glob(os.path.join(dirname, "score.sc.*")))
+    if not shards:
+        shards = [os.path.join(dirname, "score.sc")]
+    return shards
+
+
+def read_score_columns(sc_fnames, ia_prefixes):
+    """Read the total scores, descriptions and InterfaceAnalyzer columns for
+    every requested prefix from a set of score files in a single pass.
+
+    Fields are found by the names in the SCORE: header line of each file
+    (so the files need not agree on the order of their columns) rather
+    than by their character ranges. Returns a dictionary with the
+    "description" column as a list, the "total_score" column as a NumPy
+    array, and, for each prefix, a dictionary of NumPy arrays keyed by
+    the names in ia_columns. A ValueError is raised for a file with a
+    SCORE: line ahead of its header"""
+    wanted = ["total_score"] + [
+        (prefix + "_" if prefix else "") + col
+        for prefix in ia_prefixes
+        for col in ia_columns
+    ]
+    descriptions = []
+    values = {name: [] for name in wanted}
+    for sc_fname in sc_fnames:
+        with open(sc_fname) as fid:
+            indices = None
+            for line in fid:
+                if not line.startswith("SCORE:"):
+                    continue
+                fields = line.split()
+                if "total_score" in fields:
+                    # a header line; there may be one per shard
+                    indices = [fields.index(name) for name in wanted]
+                    desc_index = fields.index("description")
+                    continue
+                if indices is None:
+                    raise ValueError(
+                        "%s has a SCORE: line before its SCORE: header line" % sc_fname
+                    )
+                descriptions.append(fields[desc_index])
+                for name, index in zip(wanted, indices):
+                    values[name].append(fields[index])
+
+    columns = {
+        "description": descriptions,
+        "total_score": numpy.array(values["total_score"], dtype=float),
+    }
+    for prefix in ia_prefixes:
+        pref = prefix + "_" if prefix else ""
+        columns[prefix] = {
+            col: numpy.array(values[pref + col], dtype=float) for col in ia_columns
+        }
+    return columns
+
+
+def top_k_by_total_score(columns, k=10):
+    """The indices of the (at most) k results with the lowest total scores"""
+    total = columns["total_score"]
+    if len(total) <= k:
+        return numpy.arange(len(total))
+    return numpy.argpartition(total, k - 1)[:k]
+
+
+def avg_binding_energy_from_top10(columns, prefix1, prefix2):
+    top10_by_total = top_k_by_total_score(columns, 10)
+    return float(
+        numpy.sum(
+            columns[prefix1]["dG_separated"][top10_by_total]
+            + columns[prefix2]["dG_separated"][top10_by_total]
+        )
+        / 10
+    )
+
+
+def best_result_by_total_score(columns):
+    return columns["description"][int(numpy.argmin(columns["total_score"]))]
+
+
+def link_best_model(src, dest):
+    """Hard link the best docked model into place, falling back on a copy
+    if the two directories are on different file systems"""
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def summarize_dock_directory(dock_dir, col, best_dir=None):
+    """Return the average binding energy of the top 10 docked models for one
+    design (read from the absolute path of its dock_<design> directory),
+    and, if best_dir is given, link its best model there"""
+    dirname = "dock_" + col[0:-4]
+    path = os.path.join(dock_dir, dirname)
+    columns = read_score_columns(
+        score_file_shards(path), ["h3h4_vs_nuc", "h3_vs_h4"]
+    )
+    avgtop10 = avg_binding_energy_from_top10(columns, "h3h4_vs_nuc", "h3_vs_h4")
+    best_result = best_result_by_total_score(columns)
+    print(dirname, avgtop10, best_result)
+    if best_dir is not None:
+        link_best_model(
+            os.path.join(path, best_result + ".pdb"),
+            os.path.join(best_dir, dirname + ".pdb"),
+        )
+    return avgtop10
+
+
+def report_line_for_tuple(dock_dir, best_dir, cols):
+    """The line of the report for one 8-tuple of designs; run in a worker
+    process, and independent of the current working directory"""
+    ia_dat = [summarize_dock_directory(dock_dir, col, best_dir) for col in cols]
+    worst_on_target_dGbind = max(ia_dat[0], ia_dat[1])
+    line = "%s, %f, %f, %f, %f, %f, %f, %f, %f ( %f, %f ) ( %f, %f, %f, %f ) " % (
+        cols[0],
+        ia_dat[0],  # on target mutant pairs
+        ia_dat[1],
+        ia_dat[2],  # off target mutant / mutant pairs
+        ia_dat[3],
+        ia_dat[4],  # off target mutant / wt pairs
+        ia_dat[5],
+        ia_dat[6],  # off target wt / mutant pairs
+        ia_dat[7],
+        worst_on_target_dGbind - ia_dat[2], # dGbind on-target/off-target
+        worst_on_target_dGbind - ia_dat[3],
+        ia_dat[ 0 ] - ia_dat[4], ia_dat[1] - ia_dat[5], # dGbind mut/wt
+        ia_dat[ 0 ] - ia_dat[6], ia_dat[1] - ia_dat[7] ) # dGbind wt/mut
+    line += " AH3_AH4: " + compare_h3h4_seq_against_design(
+        os.path.join(dock_dir, cols[0]), True
+    )
+    line += " BH3_BH4: " + compare_h3h4_seq_against_design(
+        os.path.join(dock_dir, cols[1]), True
+    )
+
+    line += "\n"
+    return line
+
+
+def report_lines(dock_dir, best_dir, tuples, nprocs):
+    """The lines of the report for a list of 8-tuples of designs, in order,
+    computed on a pool of nprocs processes"""
+    with ProcessPoolExecutor(max_workers=nprocs) as pool:
+        return list(
+            pool.map(
+                functools.partial(report_line_for_tuple, dock_dir, best_dir),
+                tuples,
+            )
+        )
 
 
 if __name__ == "__main__":
@@ -97,6 +183,7 @@ if __name__ == "__main__":
         p.str("output-file").shorthand("o").required()
         p.flag("repeat-run").shorthand("r")
         p.flag("no_delete").shorthand("n")
+        p.int("nprocs").default(len(os.sched_getaffinity(0)))
 
     filename_parts = os.path.splitext(options.pdb_triples) # "triples" = 8-tuples
     new_complex_filename = filename_parts[0] + "_in_ctxt" + filename_parts[1]
@@ -104,65 +191,22 @@ if __name__ == "__main__":
 
     if not options.repeat_run:
         os.mkdir("best_docked")
-    os.chdir("dock")
+    dock_dir = os.path.abspath("dock")
+    best_dir = os.path.abspath("best_docked")
     #os.system("rm out.*") # cleanup delayed for debugging
-    lines = []
-    for triple in triples_list:
-        if triple == "\n":
-            continue
-        cols = triple.split()
-        ia_dat = []
-        for col in cols:
-            dirname = "dock_" + col[0:-4]
-            os.chdir(dirname)
-            #avgtop10 = find_avgtop10_dGbind_from_fname(dirname + ".logIA")
-            if not os.path.isfile("score.sc"):
-                os.system("cat score.sc.* > score.sc")
-            iaresults_h3h4_vs_nuc = read_iaresults_from_score_file("score.sc", "h3h4_vs_nuc")
-            iaresults_h3_vs_h4 = read_iaresults_from_score_file("score.sc", "h3_vs_h4")
-            avgtop10 = avg_binding_energy_from_top10(iaresults_h3h4_vs_nuc, iaresults_h3_vs_h4)
-            best_result = min(iaresults, key=lambda x: x.total_score)
-            print(dirname, avgtop10, best_result)
-            if not options.repeat_run:
-                os.system(
-                    "cp "
-                    + best_result.fname
-                    + ".pdb"
-                    + " ../../best_docked/"
-                    + dirname
-                    + ".pdb"
-                )
-            ia_dat.append(avgtop10)
-            os.chdir("..")
-        worst_on_target_dGbind = max(ia_dat[0], ia_dat[1])
-        line = "%s, %f, %f, %f, %f, %f, %f, %f, %f ( %f, %f ) ( %f, %f, %f, %f ) " % (
-            cols[0],
-            ia_dat[0],  # on target mutant pairs
-            ia_dat[1],
-            ia_dat[2],  # off target mutant / mutant pairs
-            ia_dat[3],
-            ia_dat[4],  # off target mutant / wt pairs
-            ia_dat[5],
-            ia_dat[6],  # off target wt / mutant pairs
-            ia_dat[7],
-            worst_on_target_dGbind - ia_dat[2], # dGbind on-target/off-target
-            worst_on_target_dGbind - ia_dat[3],
-            ia_dat[ 0 ] - ia_dat[4], ia_dat[1] - ia_dat[5], # dGbind mut/wt
-            ia_dat[ 0 ] - ia_dat[6], ia_dat[1] - ia_dat[7] ) # dGbind wt/mut
-        line += " AH3_AH4: " + compare_h3h4_seq_against_design( cols[0], True )
-        line += " BH3_BH4: " + compare_h3h4_seq_against_design( cols[1], True )
-
-        line += "\n"
-        lines.append(line)
-
-    os.chdir("..")
-    os.chdir("best_docked")
+    tuples = [triple.split() for triple in triples_list if triple != "\n"]
+    lines = report_lines(
+        dock_dir,
+        best_dir if not options.repeat_run else None,
+        tuples,
+        options.nprocs,
+    )
+
     if options.output_file:
-        open(options.output_file, "w").writelines(lines)
+        open(os.path.join(best_dir, options.output_file), "w").writelines(lines)
     else:
         for line in lines:
             print(line, end=" ")
-    os.chdir("..")
     if not options.no_delete:
         print("TEMP NOT Deleting docked PDBs")
         # TEMP! os.system("find dock | grep -e '.pdb$' | xargs rm")
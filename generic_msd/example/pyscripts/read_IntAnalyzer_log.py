@@ -1,8 +1,25 @@
 import os
 import sys
+import numpy
+
+# the first line of each report the InterfaceAnalyzer writes to the log
+ia_report_marker = b"protocols.analysis.InterfaceAnalyzerMover.interface_selection"
+
+# the labels of the lines of an InterfaceAnalyzer report, and the
+# IA_Result attribute that the value following each label is read into
+ia_labels = (
+    (b"SEPARATED INTERFACE ENERGY DIFFERENCE:", "dGbind"),
+    (b"INTERFACE DELTA SASA/SEPARATED INTERFACE ENERGY:", "eDens"),
+    (b"INTERFACE DELTA SASA:", "dSASA"),
+    (b"INTERFACE PACK STAT:", "pack"),
+    (b"DELTA UNSTAT HBONDS:", "uns"),
+)
 
 
 class IA_Result:
+    # there is one of these for every docked model, so no per-instance dict
+    __slots__ = ("fname", "job_index", "dGbind", "dSASA", "eDens", "pack", "uns")
+
     def __init__(self):
         self.fname = ""
         self.job_index = 0
@@ -13,138 +30,118 @@ class IA_Result:
         self.uns = 0
         # print "instantiating new IA_Result"
 
-    def read_resultline(self, line):
-        cols = line.split()
-        first = False
-        if self.fname == "":
-            self.fname = cols[0][:-1] + ".pdb"
-            # print "setting fname:", self.fname, "cols[0]", cols[0], cols[0][:-1]
-            first = True
-        if not first and cols[0][:-1] != self.fname[:-4]:
-            return False
-        if (
-            len(cols) >= 6
-            and " ".join(cols[1:5]) == "SEPARATED INTERFACE ENERGY DIFFERENCE:"
-        ):
-            # print "setting dGbind"
-            self.dGbind = float(cols[5])
-        if len(cols) >= 5 and " ".join(cols[1:4]) == "INTERFACE DELTA SASA:":
-            # print "setting dSASA"
-            self.dSASA = float(cols[4])
-        if (
-            len(cols) >= 7
-            and " ".join(cols[1:6])
-            == "INTERFACE DELTA SASA/SEPARATED INTERFACE ENERGY:"
-        ):
-            # print "setting eDens"
-            self.eDens = float(cols[6])
-        if len(cols) >= 4 and " ".join(cols[1:4]) == "INTERFACE PACK STAT:":
-            # print "seting pack"
-            self.pack = float(cols[4])
-        if len(cols) >= 4 and " ".join(cols[1:4]) == "DELTA UNSTAT HBONDS:":
-            # print "setting uns"
-            self.uns = float(cols[4])
-
-        return True
-
-    def read_resultline_from_mpi_silent_logfile(self, line):
-        cols = line.split()
-        if cols[0] != ":":
-            return False
-
-        if (
-            len(cols) >= 6
-            and " ".join(cols[2:6]) == "SEPARATED INTERFACE ENERGY DIFFERENCE:"
-        ):
-            # print "setting dGbind"
-            self.dGbind = float(cols[6])
-        if len(cols) >= 5 and " ".join(cols[2:5]) == "INTERFACE DELTA SASA:":
-            self.dSASA = float(cols[5])
-            # print "setting dSASA", self.dSASA
-        if (
-            len(cols) >= 8
-            and " ".join(cols[2:7])
-            == "INTERFACE DELTA SASA/SEPARATED INTERFACE ENERGY:"
-        ):
-            # print "setting eDens"
-            self.eDens = float(cols[7])
-        if len(cols) >= 4 and " ".join(cols[2:5]) == "INTERFACE PACK STAT:":
-            # print "seting pack"
-            self.pack = float(cols[5])
-        if len(cols) >= 4 and " ".join(cols[2:5]) == "DELTA UNSTAT HBONDS:":
-            # print "setting uns"
-            self.uns = float(cols[5])
-
-        return True
-
-
-def read_IA_file(fname):
-    results = []
-    lines = open(fname).readlines()
+    def read_labelled_value(self, text):
+        """Set the attribute for the label that the text starts with from the
+        value that follows the label; returns False if it starts with none"""
+        for label, attr in ia_labels:
+            if text.startswith(label):
+                setattr(self, attr, float(text[len(label) :].split()[0]))
+                return True
+        return False
+
+
+def iter_IA_results(fname):
+    """Yield the IA_Results of the InterfaceAnalyzer reports in a log one
+    at a time, reading the log as a stream of byte lines; the results are
+    those of read_IA_file, without holding the log or the list of results
+    in memory. A report starts two lines after the interface_selection
+    line and continues while its lines begin with the name of its model"""
     new_IAresult1 = False
     new_IAresult2 = False
     dat = None
-    for line in lines:
-        # print "--", new_IAresult1, "--", line,
-        if (
-            line.find("protocols.analysis.InterfaceAnalyzerMover.interface_selection")
-            != -1
-        ):
-            new_IAresult1 = True
-            # print "found new_IAresult"
-            continue
-        elif new_IAresult1:
-            new_IAresult1 = False
-            new_IAresult2 = True
-        elif new_IAresult2:
-            new_IAresult2 = False
-            dat = IA_Result()
-            dat.read_resultline(line)
-        elif dat:
-            good = dat.read_resultline(line)
-            if not good:
-                # print "pushing back completed IA_Result", dat.fname
-                results.append(dat)
+    model = None
+    with open(fname, "rb") as fid:
+        for line in fid:
+            if ia_report_marker in line:
+                new_IAresult1 = True
+                continue
+            elif new_IAresult1:
+                new_IAresult1 = False
+                new_IAresult2 = True
+                continue
+            elif not new_IAresult2 and dat is None:
+                continue
+            head, _, text = line.lstrip().partition(b" ")
+            if new_IAresult2:
+                new_IAresult2 = False
+                dat = IA_Result()
+                model = head[:-1]
+                dat.fname = model.decode() + ".pdb"
+            elif head[:-1] != model:
+                yield dat
                 dat = None
+                continue
+            dat.read_labelled_value(text.lstrip())
     if dat:
-        results.append(dat)
-    return results
+        yield dat
 
 
-def read_IA_log_from_silent_file(fname):
-    results = []
-    lines = open(fname).readlines()
+def read_IA_file(fname):
+    return list(iter_IA_results(fname))
+
+
+def iter_IA_results_from_silent_log(fname):
+    """Yield the IA_Results of the InterfaceAnalyzer reports in the log of
+    an MPI job that wrote a silent file, one at a time; the results are
+    those of read_IA_log_from_silent_file"""
     ready1 = False
     ready2 = False
     dat = None
-    for line in lines:
-        # print "--", ready1, ready2, "--", line,
-        if line.find("Received job id") != -1:
-            dat = IA_Result()
-            dat.job_index = int(line.split()[8])
-            # print "read job index ", dat.job_index, "on line", line.strip()
-            if dat.job_index == 0:
-                dat = None
-            continue
-        if (
-            line.find("protocols.analysis.InterfaceAnalyzerMover.interface_selection")
-            != -1
-        ):
-            ready1 = True
-        elif ready1:
-            ready1 = False
-            ready2 = True
-        elif ready2:
-            # print line
-            good = dat.read_resultline_from_mpi_silent_logfile(line)
-            if not good:
-                # print "pushing back completed IA_Result", dat.fname
-                results.append(dat)
-                dat = None
-                ready2 = False
+    with open(fname, "rb") as fid:
+        for line in fid:
+            if b"Received job id" in line:
+                dat = IA_Result()
+                dat.job_index = int(line.split()[8])
+                if dat.job_index == 0:
+                    dat = None
+                continue
+            if ia_report_marker in line:
+                ready1 = True
+            elif ready1:
+                ready1 = False
+                ready2 = True
+            elif ready2:
+                # the report lines are ": <tracer> <label> <value>"
+                colon, _, text = line.lstrip().partition(b" ")
+                if colon != b":":
+                    yield dat
+                    dat = None
+                    ready2 = False
+                    continue
+                dat.read_labelled_value(text.lstrip().partition(b" ")[2].lstrip())
     if dat:
-        results.append(dat)
-    return results
+        yield dat
+
+
+def read_IA_log_from_silent_file(fname):
+    return list(iter_IA_results_from_silent_log(fname))
+
+
+def lowest_k_by_dGbind(results, k):
+    """The (up to) k results of a list with the lowest dGbind, in order"""
+    dGbind = numpy.fromiter(
+        (result.dGbind for result in results), dtype=float, count=len(results)
+    )
+    if len(results) > k:
+        keep = numpy.argpartition(dGbind, k - 1)[:k]
+    else:
+        keep = numpy.arange(len(results))
+    keep = keep[numpy.argsort(dGbind[keep], kind="stable")]
+    return [results[i] for i in keep]
+
+
+def top_k_by_dGbind(results, k=10, chunk_size=65536):
+    """The k results with the lowest dGbind from an iterable of IA_Results
+    (e.g. the generators above), in order of increasing dGbind, holding
+    no more than k + chunk_size results in memory at once"""
+    best = []
+    chunk = []
+    for result in results:
+        chunk.append(result)
+        if len(chunk) == chunk_size:
+            best = lowest_k_by_dGbind(best + chunk, k)
+            chunk = []
+    return lowest_k_by_dGbind(best + chunk, k)
 
 
 def find_best_interface_by_dGbind(result_list):
@@ -157,8 +154,7 @@ def find_best_interface_by_dGbind(result_list):
 
 
 def find_best_dGbind_from_fname(fname):
-    results = read_IA_file(fname)
-    best = find_best_interface_by_dGbind(results)
+    best = find_best_interface_by_dGbind(iter_IA_results(fname))
     if not best:
         print("Trouble encountered with dGbind from file ", fname)
     return best
@@ -166,11 +162,10 @@ def find_best_dGbind_from_fname(fname):
 
 # take the lowest energy structure by dGbind, but return the average of the best 10
 def find_avgtop10_dGbind_from_fname(fname):
-    results = read_IA_file(fname)
-    if len(results) == 0:
+    sresults = top_k_by_dGbind(iter_IA_results(fname), 10)
+    if len(sresults) == 0:
         print("Failed to read any interface-analyzer results from", fname)
-        assert len(results) > 0
-    sresults = sorted(results, lambda x, y: x.dGbind < y.dGbind)
+        assert len(sresults) > 0
     best = sresults[0]
-    best.dGbind = sum([x.dGbind for x in sresults[:10]]) / 10
+    best.dGbind = sum([x.dGbind for x in sresults]) / 10
     return best
@@ -1,50 +1,87 @@
+import os
+import sys
+import csv
+import glob
+import numpy
 import blargs
-import re
+from generic_msd.msd_log import read_top_set, values_from_logs
+
+
+def write_csv(fid, header, rows):
+    writer = csv.writer(fid)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(["undefined" if val is None else val for val in row])
+
+
+def write_npz(fname, header, rows):
+    values = numpy.array(
+        [
+            [numpy.nan if val is None else float(val) for val in row[2:]]
+            for row in rows
+        ],
+        dtype=float,
+    ).reshape(len(rows), len(header) - 2)
+    numpy.savez_compressed(
+        fname,
+        logfiles=numpy.array([row[0] for row in rows]),
+        output_indices=numpy.array([row[1] for row in rows], dtype=int),
+        names=numpy.array(header[2:]),
+        values=values,
+    )
 
 
 if __name__ == "__main__":
     with blargs.Parser(locals()) as p:
-        p.str("logfile").required()
-        p.int("output_index").required()
+        lf = p.str("logfile")
+        p.multiword("logfiles").cast(lambda x: x.split()).conflicts(lf)
+        p.int("output_index")
+        p.multiword("output_indices").cast(lambda x: [int(y) for y in x.split()])
         p.multiword("requested_vals").cast(lambda x: x.split())
-        p.multiword("energies_by_match").cast(lambda x: x.split())
-
-    start_re = re.compile("apps.public.design.mpi_msd: \(0\) Top set")
-    outputs_re = re.compile("apps.public.design.mpi_msd: \(0\) Writing structure")
-    subexp_re = re.compile(
-        "protocols.pack_daemon.DynamicAggregateFunction: \(0\) sub expression"
-    )
+        p.multiword("energies_by_match").cast(lambda x: x.split()).described_as(
+            "Report the energies of the structures whose output tags contain "
+            "each of these partial names. With --logfile, the energy of every "
+            "matching structure is printed; with --logfiles, each name is one "
+            "column of the table, holding the energy of the first matching "
+            "structure (or undefined if none matches)"
+        )
+        p.int("nprocs").default(len(os.sched_getaffinity(0)))
+        p.str("output_csv")
+        p.str("output_npz")
 
     if energies_by_match is None:
         energies_by_match = []
+    if requested_vals is None:
+        requested_vals = []
 
-    lines = open(logfile).readlines()
-    outputs = []
-    num = -1
-    for line in lines:
-        if start_re.match(line):
-            if num != -1:
-                outputs.append(out)
-            out = {}
-            out["output_tags"] = []
-            num = line.split()[4][1:-1]
-        elif outputs_re.match(line):
-            output_file = line.split()[4]
-            out["output_tags"].append(output_file)
-            out[output_file] = line.split()[7]
-        elif subexp_re.match(line):
-            cols = line.split()
-            out[cols[4]] = cols[7]
-    outputs.append(out)
-
-    out = outputs[output_index - 1]
-    for partial_name in energies_by_match:
-        for tag in out["output_tags"]:
-            if tag.find(partial_name) != -1:
-                print(out[tag], end=" ")
-    for key in requested_vals:
-        if key not in out:
-            print("undefined", end=" ")
-        else:
-            print(out[key], end=" ")
-    print()
+    if logfiles:
+        # batch mode: every requested output of every log (given as paths or
+        # globs), read in parallel and written as one table
+        fnames = sorted(set(fname for pattern in logfiles for fname in glob.glob(pattern)))
+        indices = output_indices if output_indices else [output_index]
+        if indices == [None]:
+            raise ValueError("Batch mode needs --output_indices or --output_index")
+        header = ["logfile", "output_index"] + energies_by_match + requested_vals
+        rows = values_from_logs(
+            fnames, indices, requested_vals, energies_by_match, nprocs
+        )
+        if output_npz:
+            write_npz(output_npz, header, rows)
+        if output_csv:
+            with open(output_csv, "w", newline="") as fid:
+                write_csv(fid, header, rows)
+        elif not output_npz:
+            write_csv(sys.stdout, header, rows)
+    else:
+        # only the requested block is read, found through the log's index
+        out = read_top_set(logfile, output_index)
+        for partial_name in energies_by_match:
+            for tag in out["output_tags"]:
+                if tag.find(partial_name) != -1:
+                    print(out[tag], end=" ")
+        for key in requested_vals:
+            if key not in out:
+                print("undefined", end=" ")
+            else:
+                print(out[key], end=" ")
+        print()
@@ -1,19 +1,128 @@
 import pdb_structure
 import blargs
+from concurrent.futures import ProcessPoolExecutor
+
+design_chains = ("A", "B")
+
 
 def place_design_into_xtal_context(ctxt_pdb, design, output):
     ctxt = pdb_structure.pdbstructure_from_file(ctxt_pdb)
+    place_design_into_parsed_context(ctxt, design, output)
+
+
+def place_design_into_parsed_context(ctxt, design, output):
     des = pdb_structure.pdbstructure_from_file(design)
 
     newstruct = pdb_structure.PDBStructure()
     for chain in ctxt.chains:
         ch = chain
-        if chain.chain_name == "A" or chain.chain_name == "B":
+        if chain.chain_name in design_chains:
             ch = des.chainmap[chain.chain_name]
         newstruct.add_chain(ch)
     with open(output,"w") as fid:
         fid.writelines(newstruct.pdb_lines())
 
+
+def chain_of_record(line):
+    """The chain of an ATOM, HETATM, ANISOU or TER record, or None for any
+    other line"""
+    if line.startswith(("ATOM  ", "HETATM", "ANISOU", "TER")) and len(line) > 21:
+        return line[21]
+    return None
+
+
+def context_template(ctxt_pdb):
+    """Read the context structure as a template for splicing: a list whose
+    elements are either a line of the context to be written as is, or the
+    name of a design chain whose records (which were contiguous in the
+    context) are to be replaced by those of the design"""
+    template = []
+    placed = set([])
+    last_chain = None
+    with open(ctxt_pdb) as fid:
+        for line in fid:
+            chain = chain_of_record(line)
+            if chain is None and line.startswith("TER"):
+                # a bare TER record ends the chain before it
+                chain = last_chain
+            last_chain = chain
+            if chain in design_chains:
+                if chain not in placed:
+                    placed.add(chain)
+                    template.append(chain)
+            else:
+                template.append(line)
+    return template
+
+
+def splice_design_into_context(template, design, output):
+    """Write the context with the ATOM and HETATM records of the design
+    chains taken from the design, without building structure objects.
+    Atom serial numbers are copied as they are from either file. A
+    ValueError is raised if the design has no records for a design chain
+    of the context"""
+    records = {chain: [] for chain in design_chains}
+    with open(design) as fid:
+        for line in fid:
+            if line.startswith(("ATOM  ", "HETATM")) and line[21] in records:
+                records[line[21]].append(line)
+    for element in template:
+        if element in records and not records[element]:
+            raise ValueError(
+                "%s has no ATOM or HETATM records for chain %s" % (design, element)
+            )
+    lines = []
+    for element in template:
+        if element in records:
+            lines.extend(records[element])
+            lines.append("TER\n")
+        else:
+            lines.append(element)
+    with open(output, "w") as fid:
+        fid.writelines(lines)
+
+
+# the context a worker process places designs into; it is set once per
+# worker, so the context file is parsed only once, by the parent process
+_worker_context = None
+_worker_splice = False
+
+
+def _init_placement_worker(context, splice):
+    global _worker_context, _worker_splice
+    _worker_context = context
+    _worker_splice = splice
+
+
+def _place_design(design_and_output):
+    design, output = design_and_output
+    if _worker_splice:
+        splice_design_into_context(_worker_context, design, output)
+    else:
+        place_design_into_parsed_context(_worker_context, design, output)
+    return output
+
+
+def place_designs_into_xtal_context(ctxt_pdb, designs_and_outputs, nprocs=1, splice=False):
+    """Place each design of a list of (design, output) pairs into the
+    context structure, on a pool of nprocs processes. With splice, the
+    records of the design chains are spliced into the context's lines
+    instead of going through pdb_structure"""
+    if splice:
+        context = context_template(ctxt_pdb)
+    else:
+        context = pdb_structure.pdbstructure_from_file(ctxt_pdb)
+    if nprocs <= 1:
+        _init_placement_worker(context, splice)
+        return [_place_design(pair) for pair in designs_and_outputs]
+    with ProcessPoolExecutor(
+        max_workers=nprocs,
+        initializer=_init_placement_worker,
+        initargs=(context, splice),
+    ) as pool:
+        return list(pool.map(_place_design, designs_and_outputs, chunksize=16))
+
+
 if __name__ == "__main__":
     with blargs.Parser(locals()) as p:
         p.str("ctxt_pdb").required()
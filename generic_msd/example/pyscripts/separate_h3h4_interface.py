@@ -1,16 +1,17 @@
 import blargs
-import pdb_structure
-from dup_h2o_and_separate import translation_vector_for_h3h4
+from generic_msd.pdb_coordinates import separate_chains
 
 
 def separate_h3h4_int(input_pdbname, output_pdbname):
-    pose = pdb_structure.pdbstructure_from_file(input_pdbname)
-    trans = translation_vector_for_h3h4(pose)
-    for res in pose.chainmap["B"].residues:
-        for atom in res.atoms:
-            atom.xyz += trans
-    with open(output_pdbname, "w") as fid:
-        fid.writelines(pose.pdb_lines())
+    # chain B moves 50 A along the vector from the CA of A96 to the CA of B58
+    separate_chains(
+        input_pdbname,
+        output_pdbname,
+        ["B"],
+        ("A", "96", " CA "),
+        ("B", "58", " CA "),
+        50,
+    )
 
 if __name__ == "__main__":
     with blargs.Parser(locals()) as p:
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from .dir_snapshot import DirectorySnapshot
+
+
+class SubjobFileLinker:
+    """Create the links from the input files for a job into the
+    directories of its subjobs.
+
+    Rather than starting a shell for every "ln -s", the links are created
+    in-process with os.symlink (or os.link, if hard links are requested),
+    and rather than asking the file system about each source file
+    separately for each subjob, the existence of the source files is
+    checked against a single listing (a DirectorySnapshot) of each
+    directory they live in. The listings are kept for the life of the
+    linker, so a job whose
+    subjobs all share the same inputs pays for them once.
+
+    The linker keeps a tally of what it has done so the MSDJobManager
+    can report it; it is safe to use from several threads at once.
+    """
+
+    def __init__(self, hardlink=False):
+        self.hardlink = hardlink
+        self._listings = {}
+        self._lock = threading.Lock()
+        self.n_sources_checked = 0
+        self.n_links_created = 0
+        self.n_dirs_linked = 0
+        self.seconds_checking = 0.0
+        self.seconds_linking = 0.0
+
+    def directory_snapshot(self, dirname):
+        """Return the DirectorySnapshot of a directory, which lists it only
+        the first time it is asked about"""
+        with self._lock:
+            if dirname not in self._listings:
+                self._listings[dirname] = DirectorySnapshot(dirname)
+            return self._listings[dirname]
+
+    def checked_links(self, filename_pairs, context=""):
+        """Verify that every source file in the list of (source, destination)
+        pairs exists, and return the list of (absolute source, link name) pairs
+        where a destination of "." has been replaced by the source's
+        own name. Raises a ValueError naming every missing file."""
+        start = time.time()
+        links = []
+        missing = []
+        for src_fname, dest_fname in filename_pairs:
+            # the link is made to the path that was checked: a relative
+            # source would dangle once linked into a subjob directory
+            abs_fname = os.path.abspath(src_fname)
+            dirname, basename = os.path.split(abs_fname)
+            if not self.directory_snapshot(dirname).has(basename):
+                missing.append(src_fname)
+            links.append((abs_fname, basename if dest_fname == "." else dest_fname))
+        with self._lock:
+            self.n_sources_checked += len(links)
+            self.seconds_checking += time.time() - start
+        if missing:
+            raise ValueError(
+                "Could not locate file"
+                + ("s " if len(missing) > 1 else " ")
+                + ", ".join(missing)
+                + context
+            )
+        return links
+
+    def link_into(self, dirname, links):
+        """Create the (already checked) links in the given directory"""
+        start = time.time()
+        for src_fname, link_name in links:
+            dest = os.path.join(dirname, link_name)
+            if self.hardlink:
+                try:
+                    os.link(src_fname, dest)
+                    continue
+                except OSError:
+                    # e.g. the source lives on a different file system
+                    pass
+            os.symlink(src_fname, dest)
+        with self._lock:
+            self.n_links_created += len(links)
+            self.n_dirs_linked += 1
+            self.seconds_linking += time.time() - start
+
+    def report(self):
+        return (
+            "Linked %d files into %d subjob directories in %.2f s;"
+            " checked %d source files against %d directory listings in %.2f s"
+            % (
+                self.n_links_created,
+                self.n_dirs_linked,
+                self.seconds_linking,
+                self.n_sources_checked,
+                len(self._listings),
+                self.seconds_checking,
+            )
+        )
@@ -0,0 +1,142 @@
+"""Collect the structures written by the MSD subjobs of a job into its
+results directory.
+
+The MSDJobManager writes a gather_plan.json into the job directory that
+says, for each subjob, which structures to save under which names, and
+which lines to write to results/complex_sets.list:
+
+    {"subjobs": [{"subjob": <dir>,
+                  "outputs": [[<prefix>, <name in results>], ...]}, ...],
+     "complex_sets": [<line>, ...]}
+
+The structure saved for a prefix is the (non-symlink) file in the subjob
+directory whose name starts with that prefix; if several do, the last
+in sorted order, as the "for i in `ls prefix*`" loops this module
+replaces would have done. Each subjob directory is listed only once,
+and the files are copied (or hard linked) on a pool of threads. A
+manifest of what has been gathered, results/gather_manifest.json,
+records the size and modification time of the source of every saved
+structure, so that running the gather again only copies the structures
+that are new or have changed.
+
+Run from the job directory:
+
+    python3 -m generic_msd.gather_msd_output
+"""
+
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+import blargs
+from .opt_holder import OptHolder
+
+plan_fname = "gather_plan.json"
+manifest_fname = "gather_manifest.json"
+complex_sets_fname = "complex_sets.list"
+
+
+def regular_files_in_directory(dirname):
+    """The sorted names of the regular files (not symlinks) in a directory"""
+    with os.scandir(dirname) as entries:
+        return sorted(
+            entry.name
+            for entry in entries
+            if entry.is_file(follow_symlinks=False)
+        )
+
+
+def select_outputs(dirname, outputs):
+    """Return the (source path, name in results) pairs for a subjob,
+    listing its directory once; prefixes with no matching file are
+    reported and skipped"""
+    fnames = regular_files_in_directory(dirname)
+    selected = []
+    for prefix, dest_name in outputs:
+        matches = [fname for fname in fnames if fname.startswith(prefix)]
+        if not matches:
+            print("No output starting with", prefix, "in", dirname)
+            continue
+        selected.append((os.path.join(dirname, matches[-1]), dest_name))
+    return selected
+
+
+def source_signature(src):
+    st = os.stat(src)
+    return {"source": src, "size": st.st_size, "mtime": st.st_mtime}
+
+
+def gather_file(src, dest, hardlink):
+    if os.path.lexists(dest):
+        os.remove(dest)
+    if hardlink:
+        try:
+            os.link(src, dest)
+            return
+        except OSError:
+            # e.g. the results directory is on a different file system
+            pass
+    shutil.copyfile(src, dest)
+
+
+def gather_job_output(job_dir=".", nthreads=8, hardlink=False):
+    """Carry out the gather plan of the job in job_dir; returns the
+    manifest of the gathered structures"""
+    start = time.time()
+    with open(os.path.join(job_dir, plan_fname)) as fid:
+        plan = json.load(fid)
+    results_dir = os.path.join(job_dir, "results")
+    if not os.path.isdir(results_dir):
+        os.makedirs(results_dir)
+    manifest_path = os.path.join(results_dir, manifest_fname)
+    old_manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path) as fid:
+            old_manifest = json.load(fid)
+
+    def select(subjob_plan):
+        return select_outputs(
+            os.path.join(job_dir, subjob_plan["subjob"]), subjob_plan["outputs"]
+        )
+
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+        selected = [
+            pair for pairs in pool.map(select, plan["subjobs"]) for pair in pairs
+        ]
+
+        manifest = {}
+        to_copy = []
+        for src, dest_name in selected:
+            signature = source_signature(src)
+            manifest[dest_name] = signature
+            dest = os.path.join(results_dir, dest_name)
+            if old_manifest.get(dest_name) != signature or not os.path.isfile(dest):
+                to_copy.append((src, dest))
+        list(pool.map(lambda pair: gather_file(pair[0], pair[1], hardlink), to_copy))
+
+    with open(os.path.join(results_dir, complex_sets_fname), "w") as fid:
+        fid.writelines(line + "\n" for line in plan["complex_sets"])
+    with open(manifest_path, "w") as fid:
+        json.dump(manifest, fid, indent=1, sort_keys=True)
+
+    print(
+        "Gathered %d of %d structures from %d subjobs in %.2f s; %d were already up to date"
+        % (
+            len(to_copy),
+            len(selected),
+            len(plan["subjobs"]),
+            time.time() - start,
+            len(selected) - len(to_copy),
+        )
+    )
+    return manifest
+
+
+if __name__ == "__main__":
+    opts = OptHolder()
+    with blargs.Parser(opts) as p:
+        p.str("job_dir").default(".")
+        p.int("threads").default(8)
+        p.flag("hardlink")
+    gather_job_output(opts.job_dir, opts.threads, opts.hardlink)
@@ -1,9 +1,20 @@
 import blargs
 import os
+import sys
 import math
+import pickle
 import traceback
+import json
 import yaml
 import itertools
+from concurrent.futures import ProcessPoolExecutor
+from .dir_snapshot import DirectorySnapshot
+from .pdb_coordinates import duplicate_pdbs
+
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
 
 # The goal of the functionality provided in these classes is to make the work
 # requried to write the script for preparing and launching a set of multistate
@@ -105,16 +116,31 @@ class StateVersionOpts:
 
     @classmethod
     def add_non_required_options(cls, blargs_parser: blargs.Parser):
-        pass
+        blargs_parser.int("separation_workers").default(1)
+        blargs_parser.flag("rebuild_state_version_cache")
+        blargs_parser.flag("dedupe_pdbs")
 
     def __init__(self, opts):
         self.state_version_dir = opts.state_version
         self.base_dir = opts.base_dir
+        # option holders assembled by hand (e.g. in the tests) may not have these
+        self.separation_workers = getattr(opts, "separation_workers", 1)
+        self.rebuild_state_version_cache = getattr(
+            opts, "rebuild_state_version_cache", False
+        )
+        self.dedupe_pdbs = getattr(opts, "dedupe_pdbs", False)
 
     def to_command_line(self):
         args = []
         args.append("--state_version")
         args.append(self.state_version_dir)
+        if self.separation_workers != 1:
+            args.append("--separation_workers")
+            args.append(str(self.separation_workers))
+        if self.rebuild_state_version_cache:
+            args.append("--rebuild_state_version_cache")
+        if self.dedupe_pdbs:
+            args.append("--dedupe_pdbs")
         return " ".join(args)
 
 
@@ -172,6 +198,9 @@ class DesDefFnames:
             "input_files/design_definitions/",
             opts.des_def,
         )
+        # the existence of the files of the design definition is checked
+        # against a single listing of its directory
+        self.desdef_files = DirectorySnapshot(self.desdef_dir)
         self.corr = {}
         self.secresfiles = {}
         self.entfunc = ""
@@ -185,11 +214,36 @@ class DesDefFnames:
 
 
 class StateVersion:
+    """Base class for the state versions. Reading a state version (parsing
+    its list files, checking its pdbs and writing its .states files) is
+    done once; what was read is then saved in the state version directory
+    as a snapshot, and later jobs set up against the same state version
+    load the snapshot instead, for as long as none of the input files it
+    was read from has changed (by modification time and size) and the
+    .states files and pdbs it names are all still there. The derived
+    classes decide what goes into the snapshot.
+
+    Given dedupe_pdbs, the derived classes that support it replace the pdbs
+    whose atom records are identical to those of another pdb of the state
+    version by that pdb, so that the same structure does not become two
+    states of a species; the number of states this removes is kept in
+    states_deduped."""
+
+    snapshot_fname = ".state_version_cache.pkl"
+
     def __init__(self, opts: StateVersionOpts, design_species: DesignSpecies):
         self.state_version_dir = os.path.join(
             opts.base_dir, "input_files/state_versions/", opts.state_version_dir
         )
+        # the existence of the files of the state version is checked against
+        # a single listing of its directory; whatever writes new files into
+        # it (.states files, separated pdbs) records them here
+        self.state_version_files = DirectorySnapshot(self.state_version_dir)
         self.design_species = design_species
+        self.rebuild_snapshot = getattr(opts, "rebuild_state_version_cache", False)
+        self.dedupe_pdbs = getattr(opts, "dedupe_pdbs", False)
+        self.separation_workers = getattr(opts, "separation_workers", 1)
+        self.states_deduped = 0
 
     def nstates_total(self):
         """Return the (integer) number of individual states that will be
@@ -210,6 +264,98 @@ class StateVersion:
         not be used in design"""
         raise NotImplementedError()
 
+    ####################################################################
+    # The snapshot of a state version that has been read
+    ####################################################################
+    def snapshot_path(self):
+        return os.path.join(self.state_version_dir, self.snapshot_fname)
+
+    def input_signature(self, input_fnames):
+        """The modification time and size of each of the given files, or
+        None for those that do not exist. The files are named relative to
+        the state version directory, so that a copy of the directory is
+        checked against its own files"""
+        signature = {}
+        for fname in input_fnames:
+            try:
+                st = os.stat(os.path.join(self.state_version_dir, fname))
+                signature[fname] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                signature[fname] = None
+        return signature
+
+    def class_signature(self):
+        """The derived class, and the signature of the file defining it:
+        what the derived class does with the input files is part of what
+        the snapshot records"""
+        module = sys.modules.get(type(self).__module__)
+        class_file = getattr(module, "__file__", None)
+        return (
+            type(self).__qualname__,
+            self.input_signature([class_file] if class_file else []),
+        )
+
+    def load_snapshot(self):
+        """Return the contents saved by save_snapshot if the snapshot is
+        current, and None otherwise"""
+        if self.rebuild_snapshot or not self.state_version_files.has(
+            self.snapshot_fname
+        ):
+            return None
+        try:
+            with open(self.snapshot_path(), "rb") as fid:
+                snapshot = pickle.load(fid)
+        except Exception:
+            # unreadable, e.g. written by another version of this code
+            return None
+        if snapshot["class"] != self.class_signature():
+            return None
+        if snapshot["dedupe_pdbs"] != self.dedupe_pdbs:
+            return None
+        if self.input_signature(snapshot["inputs"]) != snapshot["inputs"]:
+            return None
+        if not all(self.state_version_files.has(fname) for fname in snapshot["files"]):
+            return None
+        return snapshot["contents"]
+
+    def save_snapshot(self, signature, files, contents):
+        """Save what was read from the input files, given the signature of
+        those files taken before they were read, and the names of the files
+        in the state version directory (.states files and pdbs) that must
+        still exist for the snapshot to be used"""
+        snapshot = {
+            "class": self.class_signature(),
+            "dedupe_pdbs": self.dedupe_pdbs,
+            "inputs": signature,
+            "files": sorted(files),
+            "contents": contents,
+        }
+        tmp_fname = self.snapshot_path() + ".tmp%d" % os.getpid()
+        try:
+            with open(tmp_fname, "wb") as fid:
+                pickle.dump(snapshot, fid, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_fname, self.snapshot_path())
+        except OSError as e:
+            # e.g. a state version directory we cannot write to; the state
+            # version will simply be read again next time
+            print("Could not save the state version snapshot:", e)
+            if os.path.isfile(tmp_fname):
+                os.remove(tmp_fname)
+            return
+        self.state_version_files.add(self.snapshot_path())
+
+    def find_duplicate_pdbs(self, pdbs):
+        """Return a dictionary mapping each of the given pdbs (named relative
+        to the state version directory) that duplicates an earlier one to
+        that earlier one; the pdbs are read with the separation workers"""
+        paths = [os.path.join(self.state_version_dir, pdb) for pdb in pdbs]
+        pdb_for_path = dict(zip(paths, pdbs))
+        duplicates = duplicate_pdbs(paths, self.separation_workers)
+        return {
+            pdb_for_path[path]: pdb_for_path[first]
+            for path, first in duplicates.items()
+        }
+
 # class DesignDefinition:
 #    """Base class from which particular design defintion classes will derive"""
 #
@@ -365,6 +511,13 @@ class InterfaceMSDJob:
     def files_to_symlink(self, subdir):
         raise NotImplementedError()
 
+    def files_to_symlink_shared_by_subjobs(self):
+        """Return whether files_to_symlink gives the same list for every subjob,
+        in which case the MSDJobManager asks for (and checks) that list only
+        once per job. Derived classes whose symlinked files depend on the
+        subjob should return False."""
+        return True
+
     def popsize(self):
         if self.single_round:
             return len(self.seeds())
@@ -408,7 +561,33 @@ class InterfaceMSDJob:
         return self.ntop_msd_results_to_dock
 
     def fitness_lines(self, subdir):
-        raise NotImplementedError()
+        """Return the lines of the fitness file for a subjob. By default,
+        the fitness template for the job is built once, and each subjob
+        only substitutes its own weights into it."""
+        return self.render_fitness_template(subdir).splitlines(True)
+
+    def runtime_features(self):
+        """Return the properties of the job that determine how long each
+        of its subjobs takes to run; see msd_runtime_model"""
+        return {
+            "state_version": os.path.basename(
+                os.path.normpath(self.state_version.state_version_dir)
+            ),
+            "des_def": os.path.basename(os.path.normpath(self.desdef_fnames.desdef_dir)),
+            "nstates": self.state_version.nstates_total(),
+            "n_entities": self.desdef_fnames.n_entities,
+            "pop_size": self.popsize(),
+            "ngen": self.ngen(),
+        }
+
+    def subjob_weights(self, subdir):
+        """Return the weights (as strings) that distinguish a subjob from the
+        others; they are listed next to the subjob in the task list of an
+        array submission"""
+        return [
+            "%.1f" % self.dG_bonus_weight_from_subdir_name(subdir),
+            "%.1f" % self.entfunc_weight_from_subdir_name(subdir),
+        ]
 
     def extra_post_processing_options(self):
         """Return a string containign additional options to be
@@ -434,6 +613,13 @@ class InterfaceMSDJob:
     def create_post_processing_options(self) -> PostProcessingOpts:
         raise NotImplementedError()
 
+    def fitness_template_lines(self):
+        """Return the lines of the fitness file shared by all subjobs, with
+        the dG-bonus weight and the entity-function weight left as the
+        "%(WSCAN)s" and "%(WENTFUNC)s" slots. Any other literal "%" must be
+        escaped as "%%". Invoked once per job by fitness_template"""
+        raise NotImplementedError()
+
     ################
 
     def __init__(self, msd_opts: MSDIntDesJobOptions):
@@ -459,6 +645,7 @@ class InterfaceMSDJob:
         self.single_round = msd_opts.single_round
         self.fill_gen1_from_seeds_ = msd_opts.fill_gen1_from_seeds
         self.pop_size_ = msd_opts.pop_size
+        self._fitness_template = None
 
     def entfunc_weights_from_file(self):
         if self.entfunc_weights_file != "":
@@ -500,14 +687,29 @@ class InterfaceMSDJob:
         cols = subdir.split("_")
         return float(cols[-1][:-3])
 
-    def replace_wscan_and_add_entfunc_to_fitness_func(self, subdir, orig_lines):
-        """Replace the "%(WSCAN)s" string and add in an ENTITY_FUNCTION line
-        ahead of the FITNESS line if the design definition files includes and
-        entity function."""
-
-        dG_bonus_weight = self.dG_bonus_weight_from_subdir_name(subdir)
-        w_ent_func = self.entfunc_weight_from_subdir_name(subdir)
-        replace_dict = {"WSCAN": "%f" % dG_bonus_weight}
+    def fitness_weights_for_subdir(self, subdir):
+        return {
+            "WSCAN": "%f" % self.dG_bonus_weight_from_subdir_name(subdir),
+            "WENTFUNC": "%f" % self.entfunc_weight_from_subdir_name(subdir),
+        }
+
+    def fitness_template(self):
+        """Return the fitness file as a single string with slots for the
+        subjob weights; it is built the first time it is requested"""
+        if self._fitness_template is None:
+            self._fitness_template = "".join(self.fitness_template_lines())
+        return self._fitness_template
+
+    def render_fitness_template(self, subdir):
+        return self.fitness_template() % self.fitness_weights_for_subdir(subdir)
+
+    def wscan_template_from_fitness_func(self, orig_lines):
+        """Turn the user-provided fitness function into a template: add in an
+        ENTITY_FUNCTION line ahead of the FITNESS line if the design definition
+        files include an entity function, and add the entity function, weighted
+        by the "%(WENTFUNC)s" slot, to the FITNESS line. The "%(WSCAN)s" slot
+        is left for the subjob to fill in. Comment lines are escaped so that
+        they are copied verbatim."""
 
         newlines = []
         for line in orig_lines:
@@ -517,14 +719,24 @@ class InterfaceMSDJob:
                     efunc_fname = self.desdef_fnames.entfunc
                     if efunc_fname.find("/") != -1:
                         efunc_fname = efunc_fname.rpartition("/")[2]
-                    newlines.append("ENTITY_FUNCTION entfunc " + efunc_fname + "\n")
+                    newlines.append(
+                        "ENTITY_FUNCTION entfunc " + efunc_fname.replace("%", "%%") + "\n"
+                    )
                     newlines.append("\n")
-                    line = line[:-1] + " + %f * entfunc\n" % w_ent_func
-                newlines.append(line % replace_dict)
-            else:
+                    line = line[:-1] + " + %(WENTFUNC)s * entfunc\n"
                 newlines.append(line)
+            else:
+                newlines.append(line.replace("%", "%%"))
         return newlines
 
+    def replace_wscan_and_add_entfunc_to_fitness_func(self, subdir, orig_lines):
+        """Replace the "%(WSCAN)s" string and add in an ENTITY_FUNCTION line
+        ahead of the FITNESS line if the design definition files includes and
+        entity function."""
+
+        template = "".join(self.wscan_template_from_fitness_func(orig_lines))
+        return (template % self.fitness_weights_for_subdir(subdir)).splitlines(True)
+
 
 ############################################################################################
 ############################################################################################
@@ -697,6 +909,20 @@ class IsolateBBStateVersion(StateVersion):
         self.backbone_names = set([])
         self.negbackbone_names = set([])
         self._pdbs_determined = False
+        self._missing_separations = []
+        self._pending_additions = []
+        # (species, backbone name) -> the number of states in its .states
+        # file, for every pair that has one; filled by create_state_file_lists
+        self.state_counts = None
+        # the add_* calls made by determine_pdbs, as (name, args) pairs
+        self._additions = []
+        if self.dedupe_pdbs:
+            # a copy of a pdb given for another backbone or another role is
+            # a state of its own, since the derived classes decide which
+            # species use each (backbone, pdb); there is nothing to collapse
+            raise ValueError(
+                "dedupe_pdbs is only supported by MergeBB state versions"
+            )
 
     ###############################################
     # Functions invoked by the base class which the
@@ -768,7 +994,12 @@ class IsolateBBStateVersion(StateVersion):
     def separate_pdb(self, complex_pdb, sep_pdb):
         """Write a new PDB file to disk representing the separated structure of a
         particular complex. The derived class must read in the complex pdb
-        and then separate the chains appropriately."""
+        and then separate the chains appropriately; e.g. with
+        generic_msd.pdb_coordinates.separate_chains, which translates the
+        chains of one partner without building a structure. When the
+        state version is given more than one separation worker, this
+        function is called in worker processes, so it should do nothing
+        but write the separated pdb"""
         raise NotImplementedError()
 
     def state_file_name(self, spec, bbname):
@@ -790,14 +1021,112 @@ class IsolateBBStateVersion(StateVersion):
     # class
     ####################################################################
     def determine_pdbs(self):
+        """Read the three list files, creating any separated pdbs that are
+        missing, and then report each pdb to the derived class through the
+        add_* functions. All of the missing separated pdbs are collected
+        first and created together (in parallel, given more than one
+        separation worker), so that the derived class is only told of pdbs
+        that exist. Nothing is kept from an attempt that failed, so running
+        this again after a failure starts over, and only separates the pdbs
+        that are still missing.
+
+        If the state version has been read before and its snapshot is
+        current, the backbones and the add_* calls are taken from the
+        snapshot instead of from the list files. Neither depends on the
+        design species, so the .states files are still written from them
+        by create_state_file_lists"""
         if self._pdbs_determined:
             return
+        self.backbone_names = set([])
+        self.negbackbone_names = set([])
+        self._missing_separations = []
+        self._pending_additions = []
+        if self.determine_pdbs_from_snapshot():
+            return
+        signature = self.input_signature(self.list_fnames())
         self.determine_pdbs_from_pos_backbones()
         self.determine_pdbs_from_neg_backbones()
         self.determine_pdbs_from_neg_complexes()
+        self.create_missing_separations()
+        self._additions = [(add.__name__, args) for add, args in self._pending_additions]
+        for add, args in self._pending_additions:
+            add(*args)
+        self._pending_additions = []
+        self._pdbs_determined = True
+        self.save_state_version_snapshot(signature)
+
+    def list_fnames(self):
+        return ["pos_backbones.list", "neg_backbones.list", "neg_complexes.list"]
+
+    def determine_pdbs_from_snapshot(self):
+        contents = self.load_snapshot()
+        if contents is None:
+            return False
+        self.backbone_names = set(contents["backbone_names"])
+        self.negbackbone_names = set(contents["negbackbone_names"])
+        self._additions = contents["additions"]
+        for add_name, args in self._additions:
+            getattr(self, add_name)(*args)
         self._pdbs_determined = True
+        return True
+
+    def save_state_version_snapshot(self, signature):
+        # every add_* call names a pdb as its last argument
+        files = set(args[-1] for _, args in self._additions)
+        contents = {
+            "backbone_names": sorted(self.backbone_names),
+            "negbackbone_names": sorted(self.negbackbone_names),
+            "additions": self._additions,
+        }
+        self.save_snapshot(signature, files, contents)
+
+    def create_missing_separations(self):
+        separations = self._missing_separations
+        self._missing_separations = []
+        if not separations:
+            return
+        # the separated pdbs are written by separate_pdb, perhaps in other
+        # processes, so the directory must be listed again afterwards
+        self.state_version_files.invalidate()
+        if self.separation_workers <= 1 or len(separations) == 1:
+            for complex_pdb, sep_pdb in separations:
+                try:
+                    self.separate_pdb(complex_pdb, sep_pdb)
+                except Exception:
+                    self.remove_partial_separation(sep_pdb)
+                    raise
+            return
+        print(
+            "Separating",
+            len(separations),
+            "pdbs with",
+            self.separation_workers,
+            "worker processes",
+        )
+        with ProcessPoolExecutor(max_workers=self.separation_workers) as pool:
+            futures = [
+                (sep_pdb, pool.submit(self.separate_pdb, complex_pdb, sep_pdb))
+                for complex_pdb, sep_pdb in separations
+            ]
+            errors = []
+            for sep_pdb, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    errors.append(e)
+                    self.remove_partial_separation(sep_pdb)
+        if errors:
+            raise errors[0]
+
+    def remove_partial_separation(self, sep_pdb):
+        # don't leave a partially written pdb that a later run would
+        # mistake for a finished one
+        sep_path = os.path.join(self.state_version_dir, sep_pdb)
+        if os.path.isfile(sep_path):
+            os.remove(sep_path)
 
     def create_state_file_lists(self):
+        self.state_counts = {}
         for spec in self.design_species.species():
             for bbname in self.backbone_names:
                 self.create_state_file_list_for_spec_and_bb(spec, bbname)
@@ -821,13 +1150,15 @@ class IsolateBBStateVersion(StateVersion):
         # print "create_state_file_list_for_spec_and_bb ", spec, bbname
         dirname = self.state_version_dir
         old_lines = None
-        if os.path.isfile(os.path.join(dirname, self.state_file_name(spec, bbname))):
+        if self.state_version_files.has(self.state_file_name(spec, bbname)):
             old_lines = open(
                 os.path.join(dirname, self.state_file_name(spec, bbname))
             ).readlines()
         else:
             old_lines = []  # perhaps the file doesn't exist because it shouldn't exist
         lines = self.state_file_lines_for_spec_and_bb(spec, bbname)
+        if len(lines) > 0:
+            self.state_counts[(spec, bbname)] = len(lines)
         if lines != old_lines and len(lines) > 0:
             print(
                 "Writing list file for", self.state_file_name(spec, bbname), "species"
@@ -835,6 +1166,20 @@ class IsolateBBStateVersion(StateVersion):
             open(
                 os.path.join(dirname, self.state_file_name(spec, bbname)), "w"
             ).writelines(lines)
+            self.state_version_files.add(self.state_file_name(spec, bbname))
+
+    def species_uses_backbone(self, spec, bbname):
+        """Whether there is a .states file for a species and backbone, i.e.
+        whether any of the species' states have that backbone. Answered
+        from memory; the .states files are created the first time this is
+        asked if they have not been already"""
+        return self.nstates_for_spec_and_bb(spec, bbname) > 0
+
+    def nstates_for_spec_and_bb(self, spec, bbname):
+        if self.state_counts is None:
+            self.determine_pdbs()
+            self.create_state_file_lists()
+        return self.state_counts.get((spec, bbname), 0)
 
     def state_file_lines_for_spec_and_bb(self, spec, bbname):
         """This function will be given a species and then asked to
@@ -851,8 +1196,12 @@ class IsolateBBStateVersion(StateVersion):
         If the separated pdb is absent, and if the name for the separated pdb
         is the name of the complex pdb ending with "_sep", then we'll ask
         the derived class to construct that pdb using the "separate_pdb"
-        function, which should write the new pdb to disk"""
-        if not os.path.isfile(os.path.join(self.state_version_dir, complex_name)):
+        function, which should write the new pdb to disk. The separated pdbs
+        are only recorded here, and created by determine_pdbs once all
+        three list files have been read"""
+        if not self.state_version_files.isfile(
+            os.path.join(self.state_version_dir, complex_name)
+        ):
             raise FileNotFoundError(
                 "Could not find file "
                 + os.path.join(self.state_version_dir, complex_name)
@@ -861,7 +1210,9 @@ class IsolateBBStateVersion(StateVersion):
                 + "On the line: "
                 + line
             )
-        if not os.path.isfile(os.path.join(self.state_version_dir, separated)):
+        if not self.state_version_files.isfile(
+            os.path.join(self.state_version_dir, separated)
+        ):
             if (
                 len(separated) > 8
                 and separated[-4:] == ".pdb"
@@ -869,7 +1220,8 @@ class IsolateBBStateVersion(StateVersion):
                 and len(complex_name) > 4
                 and separated[:-8] == complex_name[:-4]
             ):
-                self.separate_pdb(complex_name, separated)
+                if (complex_name, separated) not in self._missing_separations:
+                    self._missing_separations.append((complex_name, separated))
             else:
                 raise FileNotFoundError(
                     "Could not find file "
@@ -907,15 +1259,17 @@ class IsolateBBStateVersion(StateVersion):
             )
 
             self.backbone_names.add(bbname)
-            self.add_positive_complex(bbname, complex_name)
-            self.add_positive_sep(bbname, separated)
+            self._pending_additions.append(
+                (self.add_positive_complex, (bbname, complex_name))
+            )
+            self._pending_additions.append((self.add_positive_sep, (bbname, separated)))
 
     def determine_pdbs_from_neg_backbones(self):
         """TO DO: Document format of the "neg_backbones.list" file"""
         dir = self.state_version_dir
         valid_statuses = self.valid_mut_statuses()
         neg_backbones = os.path.join(dir, "neg_backbones.list")
-        if not os.path.isfile(neg_backbones):
+        if not self.state_version_files.isfile(neg_backbones):
             return
         lines = [x.strip() for x in open(neg_backbones).readlines()]
         for line in lines:
@@ -961,8 +1315,12 @@ class IsolateBBStateVersion(StateVersion):
             )
 
             self.negbackbone_names.add(bbname)
-            self.add_negative_complex(mut_status, bbname, complex_name)
-            self.add_negative_sep(mut_status, bbname, separated)
+            self._pending_additions.append(
+                (self.add_negative_complex, (mut_status, bbname, complex_name))
+            )
+            self._pending_additions.append(
+                (self.add_negative_sep, (mut_status, bbname, separated))
+            )
 
     def determine_pdbs_from_neg_complexes(self):
         """TO DO: Document the format of the "neg_complexes.list" file"""
@@ -990,8 +1348,10 @@ class IsolateBBStateVersion(StateVersion):
             bbname = cols[1]
             assert bbname in self.backbone_names or bbname in self.negbackbone_names
             complex_name = cols[2]
-            assert os.path.isfile(os.path.join(dir, complex_name))
-            self.add_negative_complex(mut_status, bbname, complex_name)
+            assert self.state_version_files.isfile(os.path.join(dir, complex_name))
+            self._pending_additions.append(
+                (self.add_negative_complex, (mut_status, bbname, complex_name))
+            )
 
 
 class IsolateBBInterfaceMSDJob(InterfaceMSDJob):
@@ -1043,11 +1403,7 @@ class IsolateBBInterfaceMSDJob(InterfaceMSDJob):
             input_files.append((os.path.join(stateverdir, pdb), "."))
         for spec in self.state_version.design_species.species():
             for bb in self.state_version.backbone_names:
-                if not os.path.isfile(
-                    os.path.join(
-                        stateverdir, self.state_version.state_file_name(spec, bb)
-                    )
-                ):
+                if not self.is_spec_and_bb_combo_valid(spec, bb):
                     continue
                 input_files.append(
                     (
@@ -1059,11 +1415,7 @@ class IsolateBBInterfaceMSDJob(InterfaceMSDJob):
                 )
             if self.design_species.is_negative_species(spec):
                 for bb in self.state_version.negbackbone_names:
-                    if not os.path.isfile(
-                        os.path.join(
-                            stateverdir, self.state_version.state_file_name(spec, bb)
-                        )
-                    ):
+                    if not self.is_spec_and_bb_combo_valid(spec, bb):
                         continue
                     input_files.append(
                         (
@@ -1098,30 +1450,26 @@ class IsolateBBInterfaceMSDJob(InterfaceMSDJob):
         return input_files
 
     def is_spec_and_bb_combo_valid(self, spec, bb):
-        """Derived class is welcome to implement a faster version; hacky
-        version just asks "does the state file for this species and backbone
-        exist on the file system?" which is not a terribly efficient way
-        of answering the question, and also requires that this be invoked
-        only after the StateVersion has create all .states files"""
-        state_file_name = self.state_version.state_file_name(spec, bb)
-        return os.path.isfile(
-            os.path.join(self.state_version.state_version_dir, state_file_name)
-        )
+        """Does the species use the backbone, i.e. is there a .states file
+        for the pair? Answered from the species x backbone table that the
+        state version builds as it creates the .states files"""
+        return self.state_version.species_uses_backbone(spec, bb)
 
-    def fitness_lines(self, subdir):
+    def fitness_template_lines(self):
         """Default fitness function definition that will, from the state version,
         construct the variables "v(spec)" for each of the species and
         vdGbind_(comp) for each of the complexes. It will paste the user-provided
         fitness function at the bottom of the state vector definitions that
         this function provides, and then it will edit the FITNESS function
-        to replace the word "%(WSCAN)s" with the dG_bonus_weight for this subdirectory
-        and also insert an ENTITY_FUNCTION line above the fitness line if
-        the design definition has one, and will insert the result of the
-        entity function into the FITNESS line, weighted with the entity-function
-        weight that this subdir requests.
-
-        This function is invoked by the MSDJobManager directly. Feel free to
-        override it in the derived class.
+        so that each subdirectory can replace the word "%(WSCAN)s" with its
+        dG_bonus_weight, and also insert an ENTITY_FUNCTION line above the fitness
+        line if the design definition has one, and will insert the result of the
+        entity function into the FITNESS line, to be weighted with the
+        entity-function weight that each subdir requests.
+
+        This function is invoked once per job through fitness_template; the
+        MSDJobManager then asks for each subjob's fitness_lines. Feel free to
+        override either in the derived class.
         """
         # def fitness_lines(orig_lines, desdefnames, statedef, opts, weight_bonus, w_ent_func):
 
@@ -1216,20 +1564,12 @@ class IsolateBBInterfaceMSDJob(InterfaceMSDJob):
         for spec in self.design_species.species():
             line = "VECTOR_VARIABLE v" + spec + " = "
             for bb in self.state_version.backbone_names:
-                state_file_name = self.state_version.state_file_name(spec, bb)
-                if not os.path.isfile(
-                    os.path.join(self.state_version.state_version_dir, state_file_name)
-                ):
+                if not self.is_spec_and_bb_combo_valid(spec, bb):
                     continue
                 line += "best_" + spec + "_" + bb + " "
             if self.design_species.is_negative_species(spec):
                 for bb in self.state_version.negbackbone_names:
-                    state_file_name = self.state_version.state_file_name(spec, bb)
-                    if not os.path.isfile(
-                        os.path.join(
-                            self.state_version.state_version_dir, state_file_name
-                        )
-                    ):
+                    if not self.is_spec_and_bb_combo_valid(spec, bb):
                         continue
                     line += "best_" + spec + "_" + bb + " "
             newlines.append(line[:-1] + "\n")
@@ -1254,9 +1594,10 @@ class IsolateBBInterfaceMSDJob(InterfaceMSDJob):
         # note: stale # vMH3_p_MH4, vMH3_p_WTH4, vWTH3_p_MH4
         # note: stale # vdGbind_MH3_MH4, vdGBind_MH3_WTH4, vdGBind_WTH3_MH4
 
-        remainder = self.replace_wscan_and_add_entfunc_to_fitness_func(subdir, orig_lines)
+        header = [line.replace("%", "%%") for line in newlines]
+        remainder = self.wscan_template_from_fitness_func(orig_lines)
 
-        return newlines + remainder
+        return header + remainder
 
 
 ###################################################################################
@@ -1287,7 +1628,7 @@ class MergeBBDesDefFnames(DesDefFnames):
 
     def _read_from_file(self, fname):
         with open(fname) as fid:
-            raw = yaml.load(fid, Loader=yaml.Loader)
+            raw = yaml.load(fid, Loader=YAMLLoader)
         for spec in raw["species"]:
             spec_name = spec["name"]
             if spec_name not in self.species.species():
@@ -1296,14 +1637,14 @@ class MergeBBDesDefFnames(DesDefFnames):
             spec_corr = spec["corr"]
             spec_2res = spec["2res"]
             print("species:", spec_name, spec_corr, spec_2res)
-            assert os.path.isfile(os.path.join(self.desdef_dir, spec_corr))
-            assert os.path.isfile(os.path.join(self.desdef_dir, spec_2res))
+            assert self.desdef_files.isfile(os.path.join(self.desdef_dir, spec_corr))
+            assert self.desdef_files.isfile(os.path.join(self.desdef_dir, spec_2res))
             self.corr[spec_name] = spec_corr
             self.secresfiles[spec_name] = spec_2res
         if "entfunc" in raw:
             self.entfunc = raw["entfunc"]
-            assert os.path.isfile(os.path.join(self.desdef_dir,self.entfunc))
-        assert os.path.isfile(os.path.join(self.desdef_dir,"entity.resfile"))
+            assert self.desdef_files.isfile(os.path.join(self.desdef_dir,self.entfunc))
+        assert self.desdef_files.has("entity.resfile")
 
 
 class MergeBBStateVersion(StateVersion):
@@ -1326,29 +1667,83 @@ class MergeBBStateVersion(StateVersion):
     def pose_energy_vector_lists(self):
         return self.pev_lists
 
+    def states_fnames(self):
+        return ["states.json", "states.yaml"]
+
+    def states_fname(self):
+        """The file listing the pdbs of each species: states.json, if the
+        state version has one, which is read much faster than the
+        equivalent states.yaml, and states.yaml otherwise. A states.yaml
+        edited after its states.json was written is an error: the json
+        would no longer say the same thing"""
+        json_fname, yaml_fname = self.states_fnames()
+        json_path = os.path.join(self.state_version_dir, json_fname)
+        yaml_path = os.path.join(self.state_version_dir, yaml_fname)
+        if not self.state_version_files.has(json_fname):
+            return yaml_path
+        if self.state_version_files.has(yaml_fname) and (
+            os.stat(yaml_path).st_mtime_ns > os.stat(json_path).st_mtime_ns
+        ):
+            raise ValueError(
+                yaml_path + " is newer than " + json_path
+                + "; write the states.json again from it, or remove the states.json"
+            )
+        return json_path
+
+    def read_states_file(self, fname):
+        with open(fname) as fid:
+            if fname.endswith(".json"):
+                return json.load(fid)
+            return yaml.load(fid, Loader=YAMLLoader)
+
     def determine_pdbs(self):
-        # read the "states.yaml" file
+        if self.determine_pdbs_from_snapshot():
+            return
+        # read the "states.yaml" (or "states.json") file
         # this will give the species for each PDB file
         # there may be more than one PDB file per species
         self.pdbs_for_spec = {}
         self.all_pdbs = set([])
-        fname = os.path.join(self.state_version_dir, "states.yaml")
-        with open(fname) as fid:
-            raw = yaml.load(fid, Loader=yaml.Loader)
+        # adding a states.json makes the snapshot of the states.yaml stale
+        signature = self.input_signature(self.states_fnames())
+        fname = self.states_fname()
+        raw = self.read_states_file(fname)
+        species = set(self.design_species.species())
         for entry in raw["pdbs"]:
             self.count_n_states += 1
             spec = entry["species"]
             pdb = entry["pdb"]
-            assert spec in self.design_species.species()
-            assert os.path.isfile(os.path.join(self.state_version_dir, pdb))
+            if spec not in species:
+                raise ValueError(
+                    "Species " + spec + " given for pdb " + pdb + " in " + fname
+                    + " is not one of the design species: " + ", ".join(sorted(species))
+                )
             if spec not in self.pdbs_for_spec:
                 self.pdbs_for_spec[spec] = []
             self.pdbs_for_spec[spec].append(pdb)
             self.all_pdbs.add(pdb)
 
-        for entry in raw["pose_energy_vector_lists"]:
-            fname = os.path.join(self.state_version_dir, entry)
-            with open(fname) as fid:
+        # every pdb is looked for in a single listing of the directory
+        missing = sorted(
+            pdb
+            for pdb in self.all_pdbs
+            if not self.state_version_files.isfile(
+                os.path.join(self.state_version_dir, pdb)
+            )
+        )
+        if missing:
+            raise FileNotFoundError(
+                "Could not find the files " + ", ".join(missing) + " which were given in "
+                + fname
+            )
+        if self.dedupe_pdbs:
+            self.collapse_duplicate_pdbs()
+
+        # the pose energy vector lists are kept by their names in the state
+        # version directory
+        for entry in raw.get("pose_energy_vector_lists", []):
+            signature.update(self.input_signature([entry]))
+            with open(os.path.join(self.state_version_dir, entry)) as fid:
                 lines = fid.readlines()
                 for line in lines:
                     if len(line) == 0:
@@ -1357,21 +1752,80 @@ class MergeBBStateVersion(StateVersion):
                         continue
                     pdb = line.strip()
                     self.all_pdbs.add(pdb)
-            self.pev_lists.append(fname)
+            self.pev_lists.append(entry)
 
-        # now, let's write the .states files if we haven't done so already
+        # now, let's write the .states files if we haven't done so already,
+        # or if they list other pdbs than they should (e.g. because
+        # dedupe_pdbs has been turned on or off since)
         for spec in self.design_species.species():
             states_fname = os.path.join(self.state_version_dir, spec + ".states")
-            if not os.path.isfile(states_fname):
-                lines = []
-                for pdb in self.pdbs_for_spec[spec]:
-                    lines.append("%s %s %s\n" % (pdb, spec + ".corr", spec + ".2resfile"))
-                with open(states_fname, "w") as fid:
-                    fid.writelines(lines)
+            lines = []
+            for pdb in self.pdbs_for_spec[spec]:
+                lines.append("%s %s %s\n" % (pdb, spec + ".corr", spec + ".2resfile"))
+            if self.state_version_files.isfile(states_fname):
+                with open(states_fname) as fid:
+                    if fid.readlines() == lines:
+                        continue
+            with open(states_fname, "w") as fid:
+                fid.writelines(lines)
+            self.state_version_files.add(states_fname)
 
         self.yaml_contents = raw
         self._determined_pdbs = True
 
+        files = set(spec + ".states" for spec in self.design_species.species())
+        for pdbs in self.pdbs_for_spec.values():
+            files.update(pdbs)
+        contents = {
+            "species": sorted(self.design_species.species()),
+            "pdbs_for_spec": self.pdbs_for_spec,
+            "all_pdbs": self.all_pdbs,
+            "count_n_states": self.count_n_states,
+            "pev_lists": self.pev_lists,
+            "yaml_contents": raw,
+            "states_deduped": self.states_deduped,
+        }
+        self.save_snapshot(signature, files, contents)
+
+    def collapse_duplicate_pdbs(self):
+        """Replace every pdb that duplicates another by that other pdb, so
+        that no species has two states with the same structure"""
+        pdbs = list(
+            dict.fromkeys(pdb for pdbs in self.pdbs_for_spec.values() for pdb in pdbs)
+        )
+        duplicates = self.find_duplicate_pdbs(pdbs)
+        ndropped = 0
+        for spec, spec_pdbs in self.pdbs_for_spec.items():
+            deduped = list(dict.fromkeys(duplicates.get(pdb, pdb) for pdb in spec_pdbs))
+            ndropped += len(spec_pdbs) - len(deduped)
+            self.pdbs_for_spec[spec] = deduped
+        self.all_pdbs = set(
+            pdb for spec_pdbs in self.pdbs_for_spec.values() for pdb in spec_pdbs
+        )
+        self.count_n_states -= ndropped
+        self.states_deduped = ndropped
+        print(
+            "Found", len(duplicates), "of the", len(pdbs),
+            "pdbs of the state version to be duplicates of others"
+        )
+
+    def determine_pdbs_from_snapshot(self):
+        contents = self.load_snapshot()
+        # the .states files that were written are those of the design
+        # species of the job that read the state version
+        if contents is None or contents["species"] != sorted(
+            self.design_species.species()
+        ):
+            return False
+        self.pdbs_for_spec = contents["pdbs_for_spec"]
+        self.all_pdbs = contents["all_pdbs"]
+        self.count_n_states = contents["count_n_states"]
+        self.pev_lists = contents["pev_lists"]
+        self.yaml_contents = contents["yaml_contents"]
+        self.states_deduped = contents["states_deduped"]
+        self._determined_pdbs = True
+        return True
+
 
 class MergeBBInterfaceMSDJob(InterfaceMSDJob):
     def __init__(self, msd_opts: MSDIntDesJobOptions):
@@ -1436,9 +1890,9 @@ class MergeBBInterfaceMSDJob(InterfaceMSDJob):
             if self.design_species.is_complex(spec)
         ]
 
-    def fitness_lines(self, subdir):
-        """Replace the WSCAN and add in an ENTITY_FUNCTION line ahead of the FITNESS line
-        if the design definition files includes and entity function.
+    def fitness_template_lines(self):
+        """Leave a slot for the WSCAN and add in an ENTITY_FUNCTION line ahead of the
+        FITNESS line if the design definition files includes and entity function.
 
         The MergeBBInterfaceMSDJob does a lot less fitness-function-boilerplate creation than
         the IsolateBBInterfaceMSDJob does; the input fitness funcion should be basically
@@ -1447,4 +1901,4 @@ class MergeBBInterfaceMSDJob(InterfaceMSDJob):
 
         with open(self.daf) as fid:
             orig_lines = fid.readlines()
-        return self.replace_wscan_and_add_entfunc_to_fitness_func(subdir, orig_lines)
+        return self.wscan_template_from_fitness_func(orig_lines)
@@ -1,10 +1,15 @@
 import blargs
 from enum import Enum
 import os
+from concurrent.futures import ThreadPoolExecutor
 from .server_identification import ServerIdentifier, KnownComputers
-from .create_lsf_or_slurm_job import (SubmissionOptions, command_and_submission_script_for_job, SchedulerType, scheduler_type_for_server)
+from .create_lsf_or_slurm_job import (SubmissionOptions, command_and_submission_script_for_job, command_and_submission_script_for_packed_job, cores_per_node, max_seconds_for_allocation, SchedulerType, scheduler_type_for_server)
+from .file_linker import SubjobFileLinker
+from . import gather_msd_output
+from . import msd_runtime_model
 from .msd_interface_design import add_required_opts_to_blargs_parser
 import typing
+import json
 import math
 import sys
 
@@ -20,13 +25,36 @@ def mkdir(dirname):
     return False
 
 
+def package_module_command(module):
+    """The command that runs a module of this package from a generated
+    script. The package is not installed, so the compute node is told
+    where to find it, and the python that set up the job runs it"""
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return "PYTHONPATH=%s${PYTHONPATH:+:$PYTHONPATH} %s -m generic_msd.%s" % (
+        package_root,
+        sys.executable,
+        module,
+    )
+
+
 class JobExecutionOptions:
     def __init__(self, opts, si: ServerIdentifier):
         self.num_cpu = opts.num_cpu
         self.num_states_per_cpu = opts.num_states_per_cpu
         self.launch = opts.launch
         self.queue = opts.queue
+        self.num_setup_threads = opts.num_setup_threads
+        self.hardlink_inputs = opts.hardlink_inputs
+        self.array_submission = opts.array_submission
+        self.array_max_concurrent = opts.array_max_concurrent
+        self.pack_nodes = opts.pack_nodes
+        self.runtime_history = opts.runtime_history
+        self.verbose = opts.verbose
         self.si = si
+        if self.array_submission and self.pack_nodes > 0:
+            raise ValueError(
+                "The --array_submission and --pack_nodes options cannot be used together"
+            )
 
     @classmethod
     def add_options(cls, blargs_parser: blargs.Parser, si: ServerIdentifier):
@@ -46,6 +74,13 @@ class JobExecutionOptions:
         blargs_parser.int("num_cpu").shorthand("n").default(-1)
         blargs_parser.int("num_states_per_cpu").default(1)
         blargs_parser.flag("launch")
+        blargs_parser.int("num_setup_threads").default(1)
+        blargs_parser.flag("hardlink_inputs")
+        blargs_parser.flag("array_submission")
+        blargs_parser.int("array_max_concurrent").default(0)
+        blargs_parser.int("pack_nodes").default(0)
+        blargs_parser.str("runtime_history").default("")
+        blargs_parser.flag("verbose")
         server = si.what_computer()
         if server == KnownComputers.KILLDEVIL:
             blargs_parser.str("queue").shorthand("q").default("week")
@@ -65,6 +100,24 @@ class JobExecutionOptions:
             args.append(str(self.num_states_per_cpu))
         if self.launch:
             args.append("--launch")
+        if self.num_setup_threads != 1:
+            args.append("--num_setup_threads")
+            args.append(str(self.num_setup_threads))
+        if self.hardlink_inputs:
+            args.append("--hardlink_inputs")
+        if self.array_submission:
+            args.append("--array_submission")
+        if self.array_max_concurrent != 0:
+            args.append("--array_max_concurrent")
+            args.append(str(self.array_max_concurrent))
+        if self.pack_nodes != 0:
+            args.append("--pack_nodes")
+            args.append(str(self.pack_nodes))
+        if self.runtime_history:
+            args.append("--runtime_history")
+            args.append(self.runtime_history)
+        if self.verbose:
+            args.append("--verbose")
         return " ".join(args)
 
 
@@ -125,12 +178,23 @@ class MSDJobManager:
         self.options = JobExecutionOptions(opts, si)
         self.msd_job = msd_job
         self.launch_script = []
-        self.gather_script = []
-
-        self.gather_script.append("mkdir results\n")
-        self.gather_script.append("\n")
+        # the ids of the MSD jobs are collected in msd_job_ids.txt so that
+        # the docking step can be made to wait for them; clear out the ids
+        # from any earlier submission
+        self.launch_script.append("rm -f " + self.msd_job_ids_fname + "\n")
+        self.launch_script.append("\n")
+        # the structures are collected into the results directory by
+        # gather_msd_output, following the plan in gather_plan.json
+        self.gather_script = [package_module_command("gather_msd_output") + "\n"]
+        self.gather_plan = {"subjobs": [], "complex_sets": []}
         self.si = si
         self.base_dir = opts.base_dir
+        self.linker = SubjobFileLinker(self.options.hardlink_inputs)
+        self.shared_links = None
+        self.planned_num_cpu = None
+        self.predicted_seconds = None
+
+    msd_job_ids_fname = "msd_job_ids.txt"
 
     @property
     def job_name(self):
@@ -143,61 +207,111 @@ class MSDJobManager:
             raise ValueError(
                 "ERROR: job directory", self.msd_job.job_name(), "already exists"
             )
-
-        os.chdir(self.job_name)
-        for subjob in self.msd_job.subjobs():
-            if not mkdir(subjob):
-                raise ValueError("Error creating subdirectory", subjob)
-            os.chdir(subjob)
-            self.create_symlinks(subjob)
-            self.write_fitness_file(subjob)
-            self.create_submission_command(subjob)
-            os.chdir("..")
+        self.job_dir = os.path.abspath(self.job_name)
+
+        self.report_deduped_states()
+        subjobs = self.msd_job.subjobs()
+        if subjobs and self.msd_job.files_to_symlink_shared_by_subjobs():
+            self.shared_links = self.links_for_subjob(subjobs[0])
+        if self.options.runtime_history:
+            self.plan_from_runtime_history(subjobs)
+        if self.options.num_setup_threads > 1:
+            fragments = self.materialize_subjobs_in_parallel(subjobs)
+        else:
+            fragments = [self.materialize_subjob(subjob) for subjob in subjobs]
+        for launch_lines, (subjob_plan, complex_sets) in fragments:
+            self.launch_script.extend(launch_lines)
+            self.gather_plan["subjobs"].append(subjob_plan)
+            self.gather_plan["complex_sets"].extend(complex_sets)
+        if self.options.verbose:
+            print(self.linker.report())
+        if self.options.array_submission:
+            self.launch_script.extend(self.create_array_submission_command(subjobs))
+        elif self.options.pack_nodes > 0:
+            self.launch_script.extend(self.create_packed_submission_commands(subjobs))
+        if self.options.runtime_history:
+            self.write_runtime_features(subjobs)
 
         self.prepare_postprocessing_step()
         self.write_submission_and_gather_files()
         self.save_creation_command()
         if self.options.launch:
             self.launch()
-        os.chdir("..")
+
+    def subjob_dir(self, subjob):
+        return os.path.join(self.job_dir, subjob)
+
+    def materialize_subjob(self, subjob):
+        """Create the directory for a single subjob and populate it.
+        Every path is absolute so that this function neither depends on
+        nor changes the current working directory; it returns the
+        subjob's fragments of the launch script and the gather plan"""
+        if not mkdir(self.subjob_dir(subjob)):
+            raise ValueError("Error creating subdirectory", subjob)
+        self.create_symlinks(subjob)
+        self.write_fitness_file(subjob)
+        return self.create_submission_command(subjob), self.gather_plan_for_subjob(subjob)
+
+    def materialize_subjobs_in_parallel(self, subjobs):
+        """Materialize the subjobs on a pool of threads. The work is
+        dominated by file-system calls, which release the GIL, and
+        threads spare the msd_job from having to be picklable. The
+        fragments are returned in the same order as the subjobs"""
+
+        # the msd_job reads its state version (and writes its .states files)
+        # the first time it is asked for the files to symlink; make sure
+        # that has happened before the workers start instead of letting
+        # them race to do it
+        if subjobs and self.shared_links is None:
+            self.msd_job.files_to_symlink(subjobs[0])
+        with ThreadPoolExecutor(max_workers=self.options.num_setup_threads) as pool:
+            return list(pool.map(self.materialize_subjob, subjobs))
+
+    def links_for_subjob(self, subdir):
+        """Return the checked list of (source, link name) pairs for a subjob;
+        when the msd_job uses the same files for every subjob, this list is
+        computed and checked only once for the whole job"""
+        if self.shared_links is not None:
+            return self.shared_links
+        return self.linker.checked_links(
+            self.msd_job.files_to_symlink(subdir),
+            " when creating symlinks for sub-job "
+            + subdir
+            + " for job "
+            + self.job_name
+            + ".",
+        )
 
     def create_symlinks(self, subdir):
-        filename_pairs = self.msd_job.files_to_symlink(subdir)
-        for src_fname, dest_fname in filename_pairs:
-            if not os.path.isfile(src_fname):
-                raise ValueError(
-                    "Could not locate file "
-                    + src_fname
-                    + " when creating symlinks for sub-job "
-                    + subdir
-                    + " for job "
-                    + self.jobname
-                    + "."
-                )
-            else:
-                os.system(" ".join(("ln -s", src_fname, dest_fname)))
+        self.linker.link_into(self.subjob_dir(subdir), self.links_for_subjob(subdir))
 
     def write_fitness_file(self, subdir):
         fitness_lines = self.msd_job.fitness_lines(subdir)
-        with open("fitness.daf", "w") as fid:
+        with open(os.path.join(self.subjob_dir(subdir), "fitness.daf"), "w") as fid:
             fid.writelines(fitness_lines)
 
-    def create_submission_command(self, subdir):
-        nprocs = self.nprocs_for_job()
-        queue_name = self.options.queue
-        popsize = self.msd_job.popsize()
-        ngen = self.msd_job.ngen()
-
+    def msd_submission_options(self, job_name):
         job_options = SubmissionOptions()
         job_options.server = self.si.what_computer()
         job_options.scheduler = scheduler_type_for_server(self.si)
-        job_options.num_nodes = nprocs
-        job_options.queue = queue_name
-        job_options.job_name = subdir
-        job_options.logfilename = subdir + ".log"
-        job_options.submission_script_fname = "submit.sh"
+        job_options.num_nodes = self.nprocs_for_job()
+        job_options.queue = self.options.queue
+        job_options.job_name = job_name
+        job_options.logfilename = job_name + ".log"
         job_options.mpi_job = True
+        if self.predicted_seconds is not None:
+            job_options.timelimit = msd_runtime_model.timelimit_for_seconds(
+                self.predicted_seconds
+            )
+        if self.options.runtime_history:
+            job_options.walltime_file = msd_runtime_model.walltime_fname
+        return job_options
 
+    def msd_command_line(self, subdir):
+        """The mpi_msd command line for a subjob; it refers to the subjob's
+        input files by their names in the subjob directory"""
+        popsize = self.msd_job.popsize()
+        ngen = self.msd_job.ngen()
         command_line = (
             mpi_msd_exe(self.si)
             + " -database "
@@ -216,41 +330,219 @@ class MSDJobManager:
             command_line += " -seed_sequences " + " ".join(self.msd_job.seeds())
         if self.msd_job.fill_gen1_from_seeds():
             command_line += " -fill_gen1_from_seed_sequences"
+        return command_line
 
-        submission_command = command_and_submission_script_for_job(
-            job_options, command_line
-        )
-        self.launch_script.append("cd " + subdir + "\n")
-        self.launch_script.append(submission_command + " >> ../msd_submission.log\n")
-        self.launch_script.append("cd ..\n")
-        self.launch_script.append("\n")
-
-        self.gather_script.append("cd " + subdir + "\n")
+    def create_submission_command(self, subdir):
+        """Write the submit.sh script for a subjob and return the
+        lines this subjob contributes to the launch script.
+        When the subjobs are submitted as a single array job, no submit.sh
+        is written and the subjob contributes nothing to the launch script"""
+        launch_lines = []
+        if self.submits_subjobs_individually():
+            job_options = self.msd_submission_options(subdir)
+            job_options.submission_dir = self.subjob_dir(subdir)
+            job_options.submission_script_fname = "submit.sh"
+            job_options.job_id_file = os.path.join("..", self.msd_job_ids_fname)
+            submission_command = command_and_submission_script_for_job(
+                job_options, self.msd_command_line(subdir)
+            )
+            launch_lines.append("cd " + subdir + "\n")
+            launch_lines.append(submission_command + "\n")
+            launch_lines.append("cd ..\n")
+            launch_lines.append("\n")
+        return launch_lines
+
+    def gather_plan_for_subjob(self, subdir):
+        """Return the subjob's entry in the gather plan -- which of its output
+        structures are saved under which names in the results directory --
+        and its lines of the complex_sets.list file"""
         species = self.msd_job.states_to_save()
         complexes = self.msd_job.complexes_to_postprocess()
         n_to_postprocess = self.msd_job.n_results_to_postprocess()
+        outputs = []
         for spec in species:
             for result_ind in range(1, n_to_postprocess + 1):
                 lzri = leading_zero_string(result_ind, n_to_postprocess)
-                self.gather_script.append(
-                    "for i in `ls msd_output_%d_%s*`; do if [ ! -h $i ];"
-                    " then cp $i ../results/%s_%s_%s.pdb; fi; done\n"
-                    % (result_ind, spec, subdir, lzri, spec)
+                outputs.append(
+                    [
+                        "msd_output_%d_%s" % (result_ind, spec),
+                        "%s_%s_%s.pdb" % (subdir, lzri, spec),
+                    ]
                 )
-        self.gather_script.append("cd ..\n")
 
+        complex_sets = []
         for result_ind in range(1, n_to_postprocess + 1):
             lzri = leading_zero_string(result_ind, n_to_postprocess)
             prefix = subdir + "_" + lzri + "_"
-            self.gather_script.append(
-                "echo "
-                + prefix
-                + (".pdb " + prefix).join(complexes)
-                + ".pdb >> results/complex_sets.list\n"
+            complex_sets.append(prefix + (".pdb " + prefix).join(complexes) + ".pdb")
+        return {"subjob": subdir, "outputs": outputs}, complex_sets
+
+    def submits_subjobs_individually(self):
+        return not self.options.array_submission and self.options.pack_nodes == 0
+
+    def create_array_submission_command(self, subjobs):
+        """Write the subjobs.list file and the submit_array.sh script that
+        runs every subjob as one task of a single array job, and return
+        the lines that submit it. Task i runs in the subjob directory named
+        on line i of subjobs.list; the rest of the line holds the weights
+        that distinguish that subjob from the others. Because every task
+        runs the same command, the subjobs must not differ in their
+        command lines (e.g. by using different seeds)"""
+        command_line = self.msd_command_line(subjobs[0])
+        for subdir in subjobs[1:]:
+            if self.msd_command_line(subdir) != command_line:
+                raise ValueError(
+                    "Cannot submit job " + self.job_name + " as an array job: the"
+                    " command line for sub-job " + subdir + " differs from the"
+                    " command line for sub-job " + subjobs[0]
+                )
+        with open(os.path.join(self.job_dir, "subjobs.list"), "w") as fid:
+            for subdir in subjobs:
+                fid.write(" ".join([subdir] + self.msd_job.subjob_weights(subdir)) + "\n")
+
+        job_options = self.msd_submission_options(self.job_name)
+        job_options.submission_dir = self.job_dir
+        job_options.submission_script_fname = "submit_array.sh"
+        job_options.array_size = len(subjobs)
+        job_options.array_max_concurrent = self.options.array_max_concurrent
+        job_options.array_task_file = "subjobs.list"
+        job_options.job_id_file = self.msd_job_ids_fname
+        submission_command = command_and_submission_script_for_job(
+            job_options, command_line
+        )
+        return [submission_command + "\n", "\n"]
+
+    def create_packed_submission_commands(self, subjobs):
+        """Pack the subjobs into allocations of --pack_nodes full nodes and
+        write a pack_<k>.sh script for each allocation that runs all of its
+        subjobs at once, each with its own ranks. Every subjob of a job
+        evaluates the same states and so needs the same number of ranks:
+        the packing is uniform, with as many subjobs in each allocation as
+        fit (and at least one), and the last allocation holds the rest.
+        Return the lines that submit the packs"""
+        capacity = self.options.pack_nodes * cores_per_node(self.si.what_computer())
+        nranks = self.nprocs_for_job()
+        per_pack = max(1, capacity // nranks)
+        packs = [subjobs[i : i + per_pack] for i in range(0, len(subjobs), per_pack)]
+
+        launch_lines = []
+        n_ranks_allocated = 0
+        for pack_ind, pack in enumerate(packs):
+            job_options = self.msd_submission_options(
+                "%s_pack_%d" % (self.job_name, pack_ind + 1)
+            )
+            job_options.submission_dir = self.job_dir
+            job_options.submission_script_fname = "pack_%d.sh" % (pack_ind + 1)
+            job_options.job_id_file = self.msd_job_ids_fname
+            tasks = [(subdir, nranks, self.msd_command_line(subdir)) for subdir in pack]
+            submission_command = command_and_submission_script_for_packed_job(
+                job_options, tasks, capacity
+            )
+            launch_lines.append(submission_command + "\n")
+            # what was requested, which the scheduler may have had to enlarge
+            n_ranks_allocated += job_options.num_nodes
+        launch_lines.append("\n")
+        print(
+            "Packed %d subjobs of %d ranks into %d allocations of %d cores; "
+            "%.1f%% of the %d cores requested are used"
+            % (
+                len(subjobs),
+                nranks,
+                len(packs),
+                capacity,
+                100.0 * nranks * len(subjobs) / n_ranks_allocated,
+                n_ranks_allocated,
+            )
+        )
+        return launch_lines
+
+    def plan_from_runtime_history(self, subjobs):
+        """Use the wall times of earlier runs to predict how long this job will
+        take and, unless the number of cpus was given on the command line,
+        to choose the number of cpus (and so the partition) for it"""
+
+        # the number of states is known only once the msd_job has read its
+        # state version, which it does the first time it is asked for the
+        # files to symlink
+        if subjobs and self.shared_links is None:
+            self.msd_job.files_to_symlink(subjobs[0])
+        history = msd_runtime_model.RuntimeHistory(self.options.runtime_history)
+        features = self.msd_job.runtime_features()
+        model = msd_runtime_model.fit_runtime_model(
+            history, features["state_version"], features["des_def"]
+        )
+        if model is None:
+            print(
+                "Too few runs in", self.options.runtime_history,
+                "to predict the run time of job", self.job_name
             )
-        self.gather_script.append("\n")
+            return
+
+        def time_limit_for(ncpu):
+            job_options = SubmissionOptions()
+            job_options.server = self.si.what_computer()
+            job_options.queue = self.options.queue
+            job_options.num_nodes = ncpu
+            return max_seconds_for_allocation(job_options)
+
+        if self.options.num_cpu == -1:
+            max_cpu = features["nstates"]
+            if self.si.what_computer() == KnownComputers.LONGLEAF:
+                # resolve_slurm_partition caps MPI jobs on longleaf at 24 cpus
+                max_cpu = min(max_cpu, 24)
+            choice = msd_runtime_model.choose_num_cpu(
+                model, features, max_cpu, time_limit_for
+            )
+            if choice is None:
+                print("No cpu count lets job", self.job_name, "finish within its time limit")
+                return
+            self.planned_num_cpu, self.predicted_seconds = choice
+        else:
+            self.predicted_seconds = model.predict(features, self.options.num_cpu)
+        print(
+            "Predicted wall time for each sub-job of %s on %d cpus: %.1f hours (fit to %d runs)"
+            % (self.job_name, self.nprocs_for_job(), self.predicted_seconds / 3600, model.nrecords)
+        )
+
+    def write_runtime_features(self, subjobs):
+        """Record what the runtime model needs to know about this job, and
+        have gather_output.sh add the subjobs' wall times to the history"""
+        features = self.msd_job.runtime_features()
+        features["num_cpu"] = self.nprocs_for_job()
+        features["subjobs"] = subjobs
+        with open(os.path.join(self.job_dir, msd_runtime_model.features_fname), "w") as fid:
+            json.dump(features, fid, indent=1)
+        self.gather_script.append(
+            package_module_command("msd_runtime_model")
+            + " --job_dir . --history "
+            + os.path.abspath(self.options.runtime_history)
+            + "\n"
+        )
+
+    def report_deduped_states(self):
+        """Report how many states (and cpus per subjob) replacing the
+        duplicate pdbs of the state version saved, whether the state
+        version was just read or loaded from its snapshot"""
+        state_version = self.msd_job.state_version
+        if not state_version.dedupe_pdbs:
+            return
+        nstates = state_version.nstates_total()
+        nstates_before = nstates + state_version.states_deduped
+        nspc = self.options.num_states_per_cpu
+        message = "Replacing duplicate pdbs removed %d of the %d states" % (
+            state_version.states_deduped,
+            nstates_before,
+        )
+        if self.options.num_cpu == -1:
+            message += ", which saves %d cpus per subjob at %d states per cpu" % (
+                math.ceil(nstates_before / nspc) - math.ceil(nstates / nspc),
+                nspc,
+            )
+        print(message)
 
     def nprocs_for_job(self):
+        if self.planned_num_cpu is not None:
+            return self.planned_num_cpu
         if self.options.num_cpu == -1:
             nstates = self.msd_job.state_version.nstates_total()
             return int(math.ceil(nstates / self.options.num_states_per_cpu))
@@ -289,7 +581,11 @@ class MSDJobManager:
         dock_jobs_view_job_opts.queue = "debug_queue"
         dock_jobs_view_job_opts.job_name = self.msd_job.job_name() + "_dock_jobs_view"
         dock_jobs_view_job_opts.logfilename = self.msd_job.job_name() + "_djv.log"
+        dock_jobs_view_job_opts.submission_dir = self.job_dir
         dock_jobs_view_job_opts.submission_script_fname = "djv_submit.sh"
+        # dock_jobs_run.py records the id of the docking job it submits in
+        # dock/dock_job_ids.txt, and the analysis waits for that job
+        dock_jobs_view_job_opts.dependency_id_file = "dock/dock_job_ids.txt"
 
         dock_jobs_view_command_line = " ".join([
             "python3",
@@ -299,24 +595,16 @@ class MSDJobManager:
             self.msd_job.extra_post_processing_options(),
             "\n"
             ])
-        command_and_submission_script_for_job(
+        dock_jobs_view_submission_command = command_and_submission_script_for_job(
            dock_jobs_view_job_opts, dock_jobs_view_command_line
         )
 
-        dock_jobs_view_submission_command = [
-            "python3",
-            os.path.join(pyscripts_path(self.si), "submit_dependent_script.py"),
-            "dock/dock_submission.log",
-            dock_jobs_view_job_opts.submission_script_fname,
-            "\n",
-        ]
-
         # if options.relax :
         #    dock_jobs_view_command += " --relax"
         #    # if options.relax_protocol != "" :
         #    #     dock_jobs_view_command += " --relax-protocol " + options.relax_protocol
 
-        launch_docking_script.append(" ".join(dock_jobs_view_submission_command))
+        launch_docking_script.append(dock_jobs_view_submission_command + "\n")
 
         launch_docking_job_opts = SubmissionOptions()
         launch_docking_job_opts.server = self.si.what_computer()
@@ -327,33 +615,31 @@ class MSDJobManager:
         launch_docking_job_opts.logfilename = (
             self.msd_job.job_name() + "_launch_docking.log"
         )
+        launch_docking_job_opts.submission_dir = self.job_dir
         launch_docking_job_opts.submission_script_fname = "launch_docking.sh"
-        
-        command_and_submission_script_for_job(
+        launch_docking_job_opts.dependency_id_file = self.msd_job_ids_fname
+
+        launch_docking_submission_command = command_and_submission_script_for_job(
             launch_docking_job_opts, "".join(launch_docking_script)
         )
-            
-        with open("prepare_for_docking.sh", "w") as fid:
-            fid.writelines(
-                " ".join(
-                    [
-                        "python3",
-                        os.path.join(pyscripts_path(self.si), "submit_dependent_script.py"),
-                        "msd_submission.log launch_docking.sh\n",
-                    ]
-                )
-            )
+
+        # the docking step is submitted right away and the scheduler holds it
+        # until every MSD job has finished successfully
+        with open(os.path.join(self.job_dir, "prepare_for_docking.sh"), "w") as fid:
+            fid.write(launch_docking_submission_command + "\n")
 
     def write_submission_and_gather_files(self):
-        with open("submit_all_jobs.sh", "w") as fid:
+        with open(os.path.join(self.job_dir, "submit_all_jobs.sh"), "w") as fid:
             fid.writelines(self.launch_script)
-        with open("gather_output.sh", "w") as fid:
+        with open(os.path.join(self.job_dir, "gather_output.sh"), "w") as fid:
             fid.writelines(self.gather_script)
+        with open(os.path.join(self.job_dir, gather_msd_output.plan_fname), "w") as fid:
+            json.dump(self.gather_plan, fid, indent=1)
 
     def save_creation_command(self):
-        with open("creation_command.txt", "w") as fid:
+        with open(os.path.join(self.job_dir, "creation_command.txt"), "w") as fid:
             fid.writelines( " ".join(sys.argv) + "\n")
         
     def launch(self):
-        os.system("bash submit_all_jobs.sh")
-        os.system("bash prepare_for_docking.sh")
+        os.system("cd " + self.job_dir + " && bash submit_all_jobs.sh")
+        os.system("cd " + self.job_dir + " && bash prepare_for_docking.sh")
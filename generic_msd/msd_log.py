@@ -0,0 +1,186 @@
+"""Read the results that mpi_msd reports at the end of its log.
+
+After the last generation, mpi_msd reports each of the top sequences it
+found as a "Top set" block: it writes one structure for each of the
+states it saves, with the state's energy, and it reports the value of
+every sub expression of the fitness function. read_msd_log returns one
+dictionary per block, in the order they appear in the log, holding
+
+    "top_set":     the number of the block
+    "output_tags": the names of the structures written for the block
+    <output tag>:  the energy of the structure (as a string)
+    <sub expression name>: its value (as a string)
+
+The logs of long MPI runs are large, and the Top set blocks are only at
+their end, so the byte offset of each block is recorded in a sidecar
+index file next to the log, <log>.topsets.json, found with a single
+pass over the memory-mapped log. The index is rebuilt whenever the
+modification time or size of the log no longer match those it recorded.
+Reading one block (read_top_set) then seeks straight to it, and reading
+all of them (read_msd_log) skips the generations that precede them.
+"""
+
+import functools
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+start_re = re.compile(r"apps.public.design.mpi_msd: \(0\) Top set")
+outputs_re = re.compile(r"apps.public.design.mpi_msd: \(0\) Writing structure")
+subexp_re = re.compile(
+    r"protocols.pack_daemon.DynamicAggregateFunction: \(0\) sub expression"
+)
+
+
+def parse_msd_log_lines(lines):
+    """Return the list of top-set dictionaries for the lines of a log"""
+    outputs = []
+    out = None
+    for line in lines:
+        if start_re.match(line):
+            if out is not None:
+                outputs.append(out)
+            out = {}
+            out["top_set"] = line.split()[4][1:-1]
+            out["output_tags"] = []
+        elif out is None:
+            continue
+        elif outputs_re.match(line):
+            cols = line.split()
+            out["output_tags"].append(cols[4])
+            out[cols[4]] = cols[7]
+        elif subexp_re.match(line):
+            cols = line.split()
+            out[cols[4]] = cols[7]
+    if out is not None:
+        outputs.append(out)
+    return outputs
+
+
+top_set_marker = b"apps.public.design.mpi_msd: (0) Top set"
+
+
+def index_fname(logfile):
+    return logfile + ".topsets.json"
+
+
+def find_top_set_offsets(logfile):
+    """The byte offsets of the lines that begin Top set blocks, from one
+    pass over the memory-mapped log"""
+    offsets = []
+    if os.path.getsize(logfile) == 0:
+        return offsets
+    with open(logfile, "rb") as fid:
+        with mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = mm.find(top_set_marker)
+            while pos != -1:
+                if pos == 0 or mm[pos - 1 : pos] == b"\n":
+                    offsets.append(pos)
+                pos = mm.find(top_set_marker, pos + len(top_set_marker))
+    return offsets
+
+
+def top_set_offsets(logfile):
+    """The offsets of the Top set blocks, from the sidecar index if it is
+    up to date, otherwise found anew and saved to the index"""
+    st = os.stat(logfile)
+    try:
+        with open(index_fname(logfile)) as fid:
+            index = json.load(fid)
+        if index["mtime"] == st.st_mtime and index["size"] == st.st_size:
+            return index["offsets"]
+    except (OSError, ValueError, KeyError):
+        pass
+    offsets = find_top_set_offsets(logfile)
+    try:
+        with open(index_fname(logfile), "w") as fid:
+            json.dump(
+                {"mtime": st.st_mtime, "size": st.st_size, "offsets": offsets}, fid
+            )
+    except OSError:
+        # e.g. someone else's log in a read-only directory; just don't save
+        pass
+    return offsets
+
+
+def read_log_range(logfile, start, end=None):
+    with open(logfile, "rb") as fid:
+        fid.seek(start)
+        data = fid.read() if end is None else fid.read(end - start)
+    return data.decode(errors="replace").splitlines(True)
+
+
+def read_top_set(logfile, output_index):
+    """The dictionary for the output_index-th (from 1) Top set block of a log"""
+    offsets = top_set_offsets(logfile)
+    if output_index < 1 or output_index > len(offsets):
+        raise ValueError(
+            "Requested output %d from %s, which reports %d top sets"
+            % (output_index, logfile, len(offsets))
+        )
+    return read_indexed_top_set(logfile, offsets, output_index)
+
+
+def read_indexed_top_set(logfile, offsets, output_index):
+    end = offsets[output_index] if output_index < len(offsets) else None
+    return parse_msd_log_lines(
+        read_log_range(logfile, offsets[output_index - 1], end)
+    )[0]
+
+
+def read_msd_log(logfile):
+    """The dictionaries for all of the Top set blocks of a log"""
+    offsets = top_set_offsets(logfile)
+    if not offsets:
+        return []
+    return parse_msd_log_lines(read_log_range(logfile, offsets[0]))
+
+
+def values_from_top_set(out, requested_vals, energies_by_match=()):
+    """The energies of the first structure whose tag contains each partial
+    name, then the values of the requested sub expressions; None for any
+    that the block does not report"""
+    values = []
+    for partial_name in energies_by_match:
+        matches = [tag for tag in out["output_tags"] if partial_name in tag]
+        values.append(out[matches[0]] if matches else None)
+    for key in requested_vals:
+        values.append(out.get(key))
+    return values
+
+
+def _values_from_log(logfile, output_indices, requested_vals, energies_by_match):
+    offsets = top_set_offsets(logfile)
+    rows = []
+    for output_index in output_indices:
+        if output_index < 1 or output_index > len(offsets):
+            out = {"output_tags": []}
+        else:
+            out = read_indexed_top_set(logfile, offsets, output_index)
+        rows.append(
+            [logfile, output_index]
+            + values_from_top_set(out, requested_vals, energies_by_match)
+        )
+    return rows
+
+
+def values_from_logs(
+    logfiles, output_indices, requested_vals, energies_by_match=(), nprocs=1
+):
+    """A table with a row for each output index of each log: the log, the
+    output index, and the values_from_top_set for that block. The logs
+    are read on a pool of nprocs processes"""
+    work = functools.partial(
+        _values_from_log,
+        output_indices=output_indices,
+        requested_vals=requested_vals,
+        energies_by_match=energies_by_match,
+    )
+    if nprocs <= 1:
+        tables = [work(logfile) for logfile in logfiles]
+    else:
+        with ProcessPoolExecutor(max_workers=nprocs) as pool:
+            tables = list(pool.map(work, logfiles))
+    return [row for table in tables for row in table]
@@ -0,0 +1,228 @@
+"""Follow the logs of the MSD subjobs of a running job and report how the
+genetic algorithm of each is converging.
+
+Each subjob writes its log to <subjob>/<subjob>.log; the subjobs of a job
+are listed in the gather_plan.json the MSDJobManager writes. Every time
+the monitor polls, it reads only the bytes that have been appended to
+each log since the last poll, and from them tracks, for each generation,
+the best fitness reported and the most recently reported value of every
+sub expression of the fitness function. The lines that report the
+generation and the fitness are found with regular expressions (the
+first group of each capturing the generation number and the fitness)
+that can be given on the command line should mpi_msd's output differ
+from the defaults.
+
+A subjob whose best fitness has not improved by more than a tolerance
+over the last K generations is flagged as having plateaued: it is a
+candidate to be cancelled early. A subjob whose log reports its Top
+sets has finished.
+
+Run from the job directory:
+
+    python3 -m generic_msd.msd_log_monitor --plateau_generations 20
+"""
+
+import json
+import os
+import re
+import time
+import blargs
+from .opt_holder import OptHolder
+from .msd_log import start_re, subexp_re
+from . import gather_msd_output
+
+default_generation_regex = r".*\bGeneration\s+(\d+)"
+default_fitness_regex = r".*\b[Bb]est fitness[:=\s]+(-?[0-9.]+(?:[eE][-+]?\d+)?)"
+
+
+class LogFollower:
+    """Read the complete lines appended to a file since the last read"""
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.offset = 0
+        self.partial = b""
+
+    def new_lines(self):
+        if not os.path.isfile(self.fname):
+            return []
+        size = os.path.getsize(self.fname)
+        if size < self.offset:
+            # the file was truncated or replaced; start over
+            self.offset = 0
+            self.partial = b""
+        if size == self.offset:
+            return []
+        with open(self.fname, "rb") as fid:
+            fid.seek(self.offset)
+            data = fid.read(size - self.offset)
+        self.offset += len(data)
+        lines = (self.partial + data).split(b"\n")
+        # the last element is the (possibly empty) line still being written
+        self.partial = lines.pop()
+        return [line.decode(errors="replace") for line in lines]
+
+
+class ConvergenceTracker:
+    """The best fitness and the sub expression values of each generation of
+    one subjob, from the lines of its log"""
+
+    def __init__(self, generation_re, fitness_re):
+        self.generation_re = generation_re
+        self.fitness_re = fitness_re
+        self.generation = 0
+        self.best_fitness = {}
+        self.subexpressions = {}
+        self.finished = False
+
+    def read_line(self, line):
+        if start_re.match(line):
+            self.finished = True
+            return
+        match = self.generation_re.match(line)
+        if match:
+            self.generation = int(match.group(1))
+        match = self.fitness_re.match(line)
+        if match:
+            fitness = float(match.group(1))
+            best = self.best_fitness.get(self.generation)
+            if best is None or fitness < best:
+                self.best_fitness[self.generation] = fitness
+        elif subexp_re.match(line):
+            cols = line.split()
+            self.subexpressions.setdefault(self.generation, {})[cols[4]] = cols[7]
+
+    def best_so_far(self):
+        """The best fitness found by the end of each generation, in order of
+        generation"""
+        trace = []
+        for generation in sorted(self.best_fitness):
+            fitness = self.best_fitness[generation]
+            if trace and trace[-1] < fitness:
+                fitness = trace[-1]
+            trace.append(fitness)
+        return trace
+
+    def improvement_over(self, ngenerations):
+        """How much the best fitness has improved over the last ngenerations
+        generations, or None if fewer generations have been reported"""
+        trace = self.best_so_far()
+        if len(trace) <= ngenerations:
+            return None
+        return trace[-ngenerations - 1] - trace[-1]
+
+    def plateaued(self, ngenerations, tolerance):
+        improvement = self.improvement_over(ngenerations)
+        return improvement is not None and improvement <= tolerance
+
+
+class MSDLogMonitor:
+    def __init__(
+        self,
+        job_dir=".",
+        generation_regex=default_generation_regex,
+        fitness_regex=default_fitness_regex,
+    ):
+        with open(os.path.join(job_dir, gather_msd_output.plan_fname)) as fid:
+            plan = json.load(fid)
+        self.subjobs = [subjob_plan["subjob"] for subjob_plan in plan["subjobs"]]
+        generation_re = re.compile(generation_regex)
+        fitness_re = re.compile(fitness_regex)
+        self.followers = {}
+        self.trackers = {}
+        for subjob in self.subjobs:
+            self.followers[subjob] = LogFollower(
+                os.path.join(job_dir, subjob, subjob + ".log")
+            )
+            self.trackers[subjob] = ConvergenceTracker(generation_re, fitness_re)
+
+    def poll(self):
+        for subjob in self.subjobs:
+            tracker = self.trackers[subjob]
+            for line in self.followers[subjob].new_lines():
+                tracker.read_line(line)
+
+    def all_finished(self):
+        return all(self.trackers[subjob].finished for subjob in self.subjobs)
+
+    def plateaued_subjobs(self, ngenerations, tolerance=0.0):
+        return [
+            subjob
+            for subjob in self.subjobs
+            if not self.trackers[subjob].finished
+            and self.trackers[subjob].plateaued(ngenerations, tolerance)
+        ]
+
+    def convergence_table(self, ngenerations=0, tolerance=0.0, subexpressions=()):
+        """The lines of a table with a row per subjob: its latest generation,
+        best fitness, the improvement over the last ngenerations (if
+        ngenerations > 0), the latest values of the given sub expressions,
+        and whether it is running, has plateaued or has finished"""
+        header = ["subjob", "gen", "best"]
+        if ngenerations > 0:
+            header.append("improv/%d" % ngenerations)
+        header.extend(subexpressions)
+        header.append("status")
+        rows = [header]
+        for subjob in self.subjobs:
+            tracker = self.trackers[subjob]
+            trace = tracker.best_so_far()
+            row = [
+                subjob,
+                str(tracker.generation),
+                "%.3f" % trace[-1] if trace else "-",
+            ]
+            if ngenerations > 0:
+                improvement = tracker.improvement_over(ngenerations)
+                row.append("-" if improvement is None else "%.3f" % improvement)
+            latest = {}
+            for generation in sorted(tracker.subexpressions):
+                latest.update(tracker.subexpressions[generation])
+            row.extend(latest.get(name, "-") for name in subexpressions)
+            if tracker.finished:
+                row.append("finished")
+            elif ngenerations > 0 and tracker.plateaued(ngenerations, tolerance):
+                row.append("PLATEAU")
+            else:
+                row.append("running")
+            rows.append(row)
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        return [
+            "  ".join(col.ljust(width) for col, width in zip(row, widths)).rstrip()
+            + "\n"
+            for row in rows
+        ]
+
+
+if __name__ == "__main__":
+    opts = OptHolder()
+    with blargs.Parser(opts) as p:
+        p.str("job_dir").default(".")
+        p.float("interval").default(60.0)
+        p.int("plateau_generations").default(0)
+        p.float("tolerance").default(0.0)
+        p.multiword("subexpressions").default("").cast(lambda x: x.split())
+        p.str("generation_regex").default(default_generation_regex)
+        p.str("fitness_regex").default(default_fitness_regex)
+        p.flag("once")
+
+    monitor = MSDLogMonitor(opts.job_dir, opts.generation_regex, opts.fitness_regex)
+    while True:
+        monitor.poll()
+        print("".join(
+            monitor.convergence_table(
+                opts.plateau_generations, opts.tolerance, opts.subexpressions
+            )
+        ))
+        if opts.plateau_generations > 0:
+            plateaued = monitor.plateaued_subjobs(
+                opts.plateau_generations, opts.tolerance
+            )
+            if plateaued:
+                print(
+                    "No improvement over the last %d generations:" % opts.plateau_generations,
+                    " ".join(plateaued),
+                )
+        if opts.once or monitor.all_finished():
+            break
+        time.sleep(opts.interval)
@@ -0,0 +1,199 @@
+"""A model of how long an MSD job takes to run, fitted to the wall times
+of earlier jobs.
+
+Each processor in an MSD job packs its share of the states once per
+sequence in every generation, so the wall time of a job ought to be
+roughly linear in
+
+    work = ngen * pop_size * ceil(nstates / num_cpu)
+
+with a fixed start-up cost on top. The model fits t = a + b * work by
+least squares to the earlier runs that used the same state version and
+design definition; if there are too few of those, it falls back on a
+fit to all earlier runs in which the work is also scaled by the number
+of designable positions (the entities), since the cost of packing a
+state grows with the number of positions being designed.
+
+The history is a JSON file holding a list of records, one per completed
+subjob. The MSDJobManager writes the features of the job it creates into
+the job directory (runtime_features.json), the submission script for
+each subjob writes the wall time of the MSD run into msd_walltime.txt in
+the subjob directory, and once the jobs have finished, gather_output.sh
+runs this module to add the subjobs' records to the history:
+
+    python3 -m generic_msd.msd_runtime_model --job_dir . --history <file>
+"""
+
+import json
+import math
+import os
+import blargs
+from .opt_holder import OptHolder
+
+features_fname = "runtime_features.json"
+walltime_fname = "msd_walltime.txt"
+
+
+def work_units(features, num_cpu, scale_by_entities=False):
+    work = features["ngen"] * features["pop_size"] * math.ceil(
+        features["nstates"] / num_cpu
+    )
+    if scale_by_entities:
+        work *= features["n_entities"]
+    return work
+
+
+class RuntimeHistory:
+    """The records of the wall times of completed MSD subjobs"""
+
+    def __init__(self, fname):
+        self.fname = fname
+        self.records = []
+        if os.path.isfile(fname):
+            with open(fname) as fid:
+                self.records = json.load(fid)
+
+    def add(self, record):
+        self.records.append(record)
+
+    def save(self):
+        with open(self.fname, "w") as fid:
+            json.dump(self.records, fid, indent=1)
+
+    def records_for(self, state_version, des_def):
+        return [
+            record
+            for record in self.records
+            if record["state_version"] == state_version
+            and record["des_def"] == des_def
+        ]
+
+
+class RuntimeModel:
+    """Predicted wall time (in seconds) as a linear function of the work
+    of a job"""
+
+    def __init__(self, intercept, slope, scale_by_entities, nrecords):
+        self.intercept = intercept
+        self.slope = slope
+        self.scale_by_entities = scale_by_entities
+        self.nrecords = nrecords
+
+    @classmethod
+    def fit(cls, records, scale_by_entities=False):
+        """Least-squares fit to the records; returns None if the records do
+        not cover at least two different amounts of work"""
+        xs = [
+            work_units(record, record["num_cpu"], scale_by_entities)
+            for record in records
+        ]
+        ts = [record["seconds"] for record in records]
+        if len(set(xs)) < 2:
+            return None
+        n = len(xs)
+        xbar = sum(xs) / n
+        tbar = sum(ts) / n
+        sxx = sum((x - xbar) ** 2 for x in xs)
+        sxt = sum((x - xbar) * (t - tbar) for x, t in zip(xs, ts))
+        slope = sxt / sxx
+        if slope <= 0:
+            # more work never makes a job faster; such a fit would only
+            # ever recommend the fewest cpus possible
+            return None
+        return cls(tbar - slope * xbar, slope, scale_by_entities, n)
+
+    def predict(self, features, num_cpu):
+        return max(
+            0.0,
+            self.intercept
+            + self.slope * work_units(features, num_cpu, self.scale_by_entities),
+        )
+
+
+def fit_runtime_model(history: RuntimeHistory, state_version, des_def):
+    """Fit the model to the earlier runs of this state version and design
+    definition if possible, or to all earlier runs if not. Returns None if
+    neither has enough data"""
+    model = RuntimeModel.fit(history.records_for(state_version, des_def))
+    if model is None:
+        model = RuntimeModel.fit(history.records, scale_by_entities=True)
+    return model
+
+
+def candidate_cpu_counts(nstates, max_cpu):
+    """The cpu counts worth considering: for each number of states per cpu,
+    the fewest cpus that achieve it"""
+    counts = set([])
+    for states_per_cpu in range(1, nstates + 1):
+        ncpu = int(math.ceil(nstates / states_per_cpu))
+        if ncpu <= max_cpu:
+            counts.add(ncpu)
+    return sorted(counts)
+
+
+def choose_num_cpu(
+    model: RuntimeModel, features, max_cpu, time_limit_for, margin=1.5, tolerance=0.1
+):
+    """Choose the number of cpus for a job.
+
+    time_limit_for(ncpu) gives the longest wall time (in seconds) that the
+    scheduler allows a job with that many cpus, or None if there is no
+    limit; a cpu count is feasible if the predicted wall time times the
+    safety margin fits within it. Larger jobs wait longer in the queue,
+    so rather than the fastest feasible cpu count, the smallest one whose
+    predicted wall time is within the given tolerance of the fastest is
+    chosen. Returns the pair (num_cpu, predicted seconds), or None if no
+    cpu count is feasible"""
+    feasible = []
+    for ncpu in candidate_cpu_counts(features["nstates"], max_cpu):
+        seconds = model.predict(features, ncpu)
+        limit = time_limit_for(ncpu)
+        if limit is None or seconds * margin <= limit:
+            feasible.append((ncpu, seconds))
+    if not feasible:
+        return None
+    fastest = min(seconds for _, seconds in feasible)
+    return min(
+        (ncpu, seconds)
+        for ncpu, seconds in feasible
+        if seconds <= fastest * (1 + tolerance)
+    )
+
+
+def timelimit_for_seconds(seconds, margin=1.5):
+    """The (days, hours, minutes) time limit to request for a job predicted
+    to take the given number of seconds: the prediction times the safety
+    margin, rounded up to the hour"""
+    hours = max(1, int(math.ceil(seconds * margin / 3600)))
+    return (hours // 24, hours % 24, 0)
+
+
+def record_job_runtimes(job_dir, history_fname):
+    """Add a record to the history for every subjob of the job in job_dir
+    that wrote its wall time"""
+    with open(os.path.join(job_dir, features_fname)) as fid:
+        features = json.load(fid)
+    history = RuntimeHistory(history_fname)
+    nrecorded = 0
+    for subjob in features["subjobs"]:
+        fname = os.path.join(job_dir, subjob, walltime_fname)
+        if not os.path.isfile(fname):
+            print("No wall time recorded for sub-job", subjob)
+            continue
+        with open(fname) as fid:
+            seconds = float(fid.read().strip())
+        record = {k: v for k, v in features.items() if k != "subjobs"}
+        record["subjob"] = subjob
+        record["seconds"] = seconds
+        history.add(record)
+        nrecorded += 1
+    history.save()
+    print("Recorded the wall times of", nrecorded, "sub-jobs in", history_fname)
+
+
+if __name__ == "__main__":
+    opts = OptHolder()
+    with blargs.Parser(opts) as p:
+        p.str("job_dir").default(".")
+        p.str("history").required()
+    record_job_runtimes(opts.job_dir, opts.history)
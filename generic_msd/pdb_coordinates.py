@@ -0,0 +1,146 @@
+"""Move chains of a PDB file with NumPy, without building a structure.
+
+The coordinates of the ATOM and HETATM records are read into an (N,3)
+array, the atoms of the chains to be moved are translated with a single
+masked add, and the file is written back out by patching the coordinate
+columns of the records; every other column and every other line of the
+file is written as it was read. This is what is needed to create the
+separated states of an interface from its complexes, and is fast enough
+to do for large ensembles of them.
+
+The atom records are also what decides whether two PDB files hold the
+same structure: see duplicate_pdbs.
+"""
+
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy
+
+
+def is_atom_record(line):
+    return line.startswith(("ATOM  ", "HETATM"))
+
+
+class PDBCoordinates:
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.atom_rows = numpy.array(
+            [i for i, line in enumerate(self.lines) if is_atom_record(line)],
+            dtype=int,
+        )
+        atom_lines = [self.lines[i] for i in self.atom_rows]
+        self.chains = numpy.array([line[21] for line in atom_lines], dtype="U1")
+        self.coords = numpy.array(
+            [(line[30:38], line[38:46], line[46:54]) for line in atom_lines],
+            dtype=float,
+        ).reshape(len(atom_lines), 3)
+
+    def atom_index(self, chain, resid, atom_name):
+        """The index in coords of an atom, given its chain, residue id (e.g.
+        "96") and four-column atom name (e.g. " CA ")"""
+        for k, i in enumerate(self.atom_rows):
+            line = self.lines[i]
+            if (
+                line[21] == chain
+                and line[22:27].strip() == resid
+                and line[12:16] == atom_name
+            ):
+                return k
+        raise ValueError(
+            "Could not find atom '%s' of residue %s%s" % (atom_name, chain, resid)
+        )
+
+    def xyz(self, chain, resid, atom_name):
+        return self.coords[self.atom_index(chain, resid, atom_name)]
+
+    def translate_chains(self, chains, trans):
+        mask = numpy.isin(self.chains, list(chains))
+        self.coords[mask] += trans
+
+    def duplicate_residues(self, from_chain, to_chain, resnames):
+        """Append copies of the records of the residues of one chain with the
+        given residue names as a new chain after the last ATOM or HETATM
+        record; atom serial numbers are copied as they are"""
+        copies = []
+        for i in self.atom_rows:
+            line = self.lines[i]
+            if line[21] == from_chain and line[17:20].strip() in resnames:
+                copies.append(line[:21] + to_chain + line[22:])
+        if not copies:
+            return
+        last = self.atom_rows[-1] + 1
+        if last < len(self.lines) and self.lines[last].startswith("TER"):
+            last += 1
+        self.lines[last:last] = copies + ["TER\n"]
+        self.__init__(self.lines)
+
+    def pdb_lines(self):
+        lines = list(self.lines)
+        for i, xyz in zip(self.atom_rows, self.coords):
+            line = lines[i]
+            lines[i] = line[:30] + "%8.3f%8.3f%8.3f" % tuple(xyz) + line[54:]
+        return lines
+
+
+def read_pdb_coordinates(pdb_fname):
+    with open(pdb_fname) as fid:
+        return PDBCoordinates(fid.readlines())
+
+
+def separation_vector(pdbc, from_atom, to_atom, distance):
+    """The vector of the given length pointing from one atom to another; each
+    atom is given as (chain, resid, atom name)"""
+    direction = pdbc.xyz(*to_atom) - pdbc.xyz(*from_atom)
+    return direction / numpy.linalg.norm(direction) * distance
+
+
+def separate_chains(
+    input_pdb, output_pdb, moving_chains, from_atom, to_atom, distance
+):
+    """Write a copy of a PDB with the moving chains translated by distance
+    along the vector from from_atom to to_atom"""
+    pdbc = read_pdb_coordinates(input_pdb)
+    pdbc.translate_chains(
+        moving_chains, separation_vector(pdbc, from_atom, to_atom, distance)
+    )
+    with open(output_pdb, "w") as fid:
+        fid.writelines(pdbc.pdb_lines())
+
+
+def atom_records_digest(pdb_fname):
+    """A digest of the atom name through the temperature factor (columns
+    13-66) of the ATOM and HETATM records of a PDB; files that differ only
+    in their atom serial numbers, element columns or other records have
+    the same digest"""
+    digest = hashlib.sha1()
+    with open(pdb_fname, "rb") as fid:
+        for line in fid:
+            if line.startswith((b"ATOM  ", b"HETATM")):
+                digest.update(line.rstrip(b"\r\n")[12:66])
+                digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def duplicate_pdbs(pdb_fnames, nworkers=1):
+    """Return a dictionary mapping each PDB whose atom records are identical
+    to those of a PDB earlier in the list to that earlier PDB; the files
+    are digested in parallel given more than one worker"""
+    if nworkers > 1 and len(pdb_fnames) > 1:
+        with ProcessPoolExecutor(max_workers=nworkers) as pool:
+            digests = list(
+                pool.map(
+                    atom_records_digest,
+                    pdb_fnames,
+                    chunksize=max(1, len(pdb_fnames) // (4 * nworkers)),
+                )
+            )
+    else:
+        digests = [atom_records_digest(fname) for fname in pdb_fnames]
+    first = {}
+    duplicates = {}
+    for fname, digest in zip(pdb_fnames, digests):
+        if digest in first:
+            duplicates[fname] = first[digest]
+        else:
+            first[digest] = fname
+    return duplicates
@@ -0,0 +1,289 @@
+"""An SQLite store of the results of MSD jobs and of the docking that
+follows them, so that reports need not re-parse the logs each time.
+
+Results are keyed by job, subjob, result index and species:
+
+    msd_values      one row per sub expression of the fitness function
+                    (e.g. dGbind_AA) of each top result of a subjob, read
+                    from the subjob's MSD log
+    msd_structures  the energy of each structure mpi_msd wrote for a top
+                    result, with the species it is a structure of
+    docking         the average top-10 binding energies that
+                    dock_jobs_view.py reports for each design it docked
+    mutations       the mutation strings that dock_jobs_view.py reports
+                    for each design
+
+Ingestion is incremental: the store records the modification time and
+size of every file it reads, and a file is read again only if either
+has changed, in which case the rows that came from it are replaced.
+
+    python3 -m generic_msd.results_store --db results.db --job_dirs job1 job2
+"""
+
+import json
+import os
+import re
+import sqlite3
+import time
+import blargs
+from .opt_holder import OptHolder
+from .msd_log import read_msd_log
+from . import gather_msd_output
+
+schema = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS msd_values (
+    job TEXT NOT NULL,
+    subjob TEXT NOT NULL,
+    result_index INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value REAL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (job, subjob, result_index, name)
+);
+CREATE TABLE IF NOT EXISTS msd_structures (
+    job TEXT NOT NULL,
+    subjob TEXT NOT NULL,
+    result_index INTEGER NOT NULL,
+    species TEXT NOT NULL,
+    output_tag TEXT NOT NULL,
+    energy REAL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (job, subjob, result_index, species)
+);
+CREATE TABLE IF NOT EXISTS docking (
+    job TEXT NOT NULL,
+    subjob TEXT NOT NULL,
+    result_index INTEGER NOT NULL,
+    species TEXT NOT NULL,
+    design TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    avg_top10_dGbind REAL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (job, subjob, result_index, species, position)
+);
+CREATE TABLE IF NOT EXISTS mutations (
+    job TEXT NOT NULL,
+    subjob TEXT NOT NULL,
+    result_index INTEGER NOT NULL,
+    species TEXT NOT NULL,
+    label TEXT NOT NULL,
+    mutations TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (job, subjob, result_index, species, label)
+);
+CREATE INDEX IF NOT EXISTS msd_values_by_name ON msd_values (name, job);
+CREATE INDEX IF NOT EXISTS docking_by_design ON docking (design);
+CREATE INDEX IF NOT EXISTS msd_values_by_source ON msd_values (source);
+CREATE INDEX IF NOT EXISTS msd_structures_by_source ON msd_structures (source);
+CREATE INDEX IF NOT EXISTS docking_by_source ON docking (source);
+CREATE INDEX IF NOT EXISTS mutations_by_source ON mutations (source);
+"""
+
+result_tables = ("msd_values", "msd_structures", "docking", "mutations")
+
+report_fname = os.path.join("results", "best_docked", "after_docking_dGbind.txt")
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class JobLayout:
+    """What the store needs to know about a job directory: its subjobs and,
+    from the gather plan the MSDJobManager wrote, which output prefix
+    holds the structure of which species for each result"""
+
+    def __init__(self, job_dir):
+        self.job_dir = os.path.abspath(job_dir)
+        self.job = os.path.basename(self.job_dir)
+        with open(os.path.join(self.job_dir, gather_msd_output.plan_fname)) as fid:
+            plan = json.load(fid)
+        self.subjobs = [subjob_plan["subjob"] for subjob_plan in plan["subjobs"]]
+        self.species = set([])
+        for subjob_plan in plan["subjobs"]:
+            for prefix, _ in subjob_plan["outputs"]:
+                # the prefixes are msd_output_<result index>_<species>
+                self.species.add(prefix.split("_", 3)[3])
+
+    def species_of_output_tag(self, tag, result_index):
+        """The species whose structure an output tag of mpi_msd names, if any;
+        the longest matching species wins"""
+        prefix = "msd_output_%d_" % result_index
+        base = os.path.basename(tag)
+        matches = [
+            spec for spec in self.species if base.startswith(prefix + spec)
+        ]
+        return max(matches, key=len) if matches else None
+
+    def key_of_design(self, design):
+        """Split the name of a design from the results directory,
+        <subjob>_<result index>_<species>[_ctxt].pdb, into its parts"""
+        name = os.path.basename(design)
+        if name.endswith(".pdb"):
+            name = name[:-4]
+        if name.endswith("_ctxt"):
+            name = name[:-5]
+        for subjob in self.subjobs:
+            if name.startswith(subjob + "_"):
+                index, _, species = name[len(subjob) + 1 :].partition("_")
+                return subjob, int(index), species
+        return None
+
+
+class ResultsStore:
+    def __init__(self, db_fname):
+        self.db_fname = db_fname
+        self.conn = sqlite3.connect(db_fname)
+        self.conn.executescript(schema)
+        self.n_files_read = 0
+        self.n_files_skipped = 0
+
+    def close(self):
+        self.conn.close()
+
+    def is_current(self, path):
+        """Whether the file has been ingested since it last changed"""
+        st = os.stat(path)
+        row = self.conn.execute(
+            "SELECT mtime, size FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        return row is not None and row[0] == st.st_mtime and row[1] == st.st_size
+
+    def start_ingesting(self, path):
+        """Forget the rows read from an earlier version of a file and note
+        the version being read now"""
+        for table in result_tables:
+            self.conn.execute("DELETE FROM %s WHERE source = ?" % table, (path,))
+        st = os.stat(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, mtime, size) VALUES (?, ?, ?)",
+            (path, st.st_mtime, st.st_size),
+        )
+        self.n_files_read += 1
+
+    def ingest_job(self, job_dir):
+        """Read whatever has changed in a job directory since it was last
+        ingested"""
+        layout = JobLayout(job_dir)
+        with self.conn:
+            for subjob in layout.subjobs:
+                logfile = os.path.join(layout.job_dir, subjob, subjob + ".log")
+                if os.path.isfile(logfile):
+                    if self.is_current(logfile):
+                        self.n_files_skipped += 1
+                    else:
+                        self.ingest_msd_log(layout, subjob, logfile)
+            report = os.path.join(layout.job_dir, report_fname)
+            if os.path.isfile(report):
+                if self.is_current(report):
+                    self.n_files_skipped += 1
+                else:
+                    self.ingest_docking_report(layout, report)
+
+    def ingest_msd_log(self, layout, subjob, logfile):
+        self.start_ingesting(logfile)
+        for result_index, out in enumerate(read_msd_log(logfile), 1):
+            for name, value in out.items():
+                if name in ("top_set", "output_tags") or name in out["output_tags"]:
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO msd_values VALUES (?, ?, ?, ?, ?, ?)",
+                    (layout.job, subjob, result_index, name, to_float(value), logfile),
+                )
+            for tag in out["output_tags"]:
+                species = layout.species_of_output_tag(tag, result_index)
+                if species is None:
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO msd_structures VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        layout.job,
+                        subjob,
+                        result_index,
+                        species,
+                        tag,
+                        to_float(out[tag]),
+                        logfile,
+                    ),
+                )
+
+    def ingest_docking_report(self, layout, report):
+        """Read the after_docking_dGbind.txt report of dock_jobs_view.py. Each
+        line starts with the first design of a docked tuple and the average
+        top-10 binding energies of each design in the tuple; the designs
+        themselves are listed, in the same order, in the complex_sets_in_ctxt.list
+        file the tuples were read from. The line ends with labelled mutation
+        strings (e.g. "AH3_AH4: chA ... chB ...") for the first design"""
+        self.start_ingesting(report)
+        tuples = {}
+        tuples_fname = os.path.join(layout.job_dir, "results", "complex_sets_in_ctxt.list")
+        if os.path.isfile(tuples_fname):
+            with open(tuples_fname) as fid:
+                for line in fid:
+                    cols = line.split()
+                    if cols:
+                        tuples[cols[0]] = cols
+        with open(report) as fid:
+            for line in fid:
+                head, _, tail = line.partition("(")
+                cols = [col.strip() for col in head.split(",")]
+                design = cols[0]
+                key = layout.key_of_design(design)
+                if key is None:
+                    continue
+                designs = tuples.get(design, [design])
+                for position, value in enumerate(cols[1:]):
+                    if position >= len(designs) or not value:
+                        continue
+                    design_key = layout.key_of_design(designs[position])
+                    if design_key is None:
+                        continue
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO docking VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (layout.job,) + design_key + (designs[position], position, to_float(value), report),
+                    )
+                labelled = re.split(r"\s(\w+):\s", " " + tail.rpartition(")")[2])
+                for label, mutations in zip(labelled[1::2], labelled[2::2]):
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO mutations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (layout.job,) + key + (label, mutations.strip(), report),
+                    )
+
+    def msd_value(self, job, subjob, result_index, name):
+        row = self.conn.execute(
+            "SELECT value FROM msd_values WHERE job = ? AND subjob = ?"
+            " AND result_index = ? AND name = ?",
+            (job, subjob, result_index, name),
+        ).fetchone()
+        return row[0] if row else None
+
+    def query(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchall()
+
+
+def ingest_jobs(db_fname, job_dirs):
+    start = time.time()
+    store = ResultsStore(db_fname)
+    for job_dir in job_dirs:
+        store.ingest_job(job_dir)
+    print(
+        "Read %d files and skipped %d unchanged files from %d jobs in %.2f s"
+        % (store.n_files_read, store.n_files_skipped, len(job_dirs), time.time() - start)
+    )
+    return store
+
+
+if __name__ == "__main__":
+    opts = OptHolder()
+    with blargs.Parser(opts) as p:
+        p.str("db").required()
+        p.multiword("job_dirs").cast(lambda x: x.split()).required()
+    ingest_jobs(opts.db, opts.job_dirs).close()
@@ -0,0 +1,16 @@
+import os
+import shutil
+
+
+def copy_test_inputs(tmpdir, dirname):
+    """A copy of one of the directories of test inputs (e.g. "dummy"), so
+    that reading its state versions writes nothing into the test
+    directory; the path of the copy ends in a slash"""
+    currpath = os.path.dirname(os.path.abspath(__file__))
+    basedir = os.path.join(str(tmpdir), dirname)
+    shutil.copytree(
+        os.path.join(currpath, dirname),
+        basedir,
+        ignore=shutil.ignore_patterns(".state_version_cache.pkl"),
+    )
+    return basedir + "/"
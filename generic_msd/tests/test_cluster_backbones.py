@@ -0,0 +1,95 @@
+from generic_msd.cluster_backbones import (
+    cluster_negative_entries,
+    pairwise_rmsd,
+    states_per_pdb,
+    write_reduced_state_version,
+)
+import numpy
+import os
+
+
+def kabsch_rmsd(x, y):
+    x = x - x.mean(axis=0)
+    y = y - y.mean(axis=0)
+    u, s, vt = numpy.linalg.svd(x.T @ y)
+    d = numpy.sign(numpy.linalg.det(u @ vt))
+    rotation = u @ numpy.diag([1, 1, d]) @ vt
+    return numpy.sqrt(((x @ rotation - y) ** 2).sum(axis=1).mean())
+
+
+def rotation_about_z(angle):
+    c, s = numpy.cos(angle), numpy.sin(angle)
+    return numpy.array([[c, -s, 0], [s, c, 0], [0, 0, 1]])
+
+
+def test_pairwise_rmsd():
+    rng = numpy.random.default_rng(7)
+    coords = rng.normal(scale=5.0, size=(5, 20, 3))
+    # a rotated and translated copy of the first structure, and its mirror image
+    coords[1] = coords[0] @ rotation_about_z(0.7) + 3.0
+    coords[2] = coords[0] * numpy.array([1, 1, -1])
+
+    rmsd = pairwise_rmsd(coords)
+    for i in range(5):
+        for j in range(5):
+            assert abs(rmsd[i, j] - kabsch_rmsd(coords[i], coords[j])) < 1e-6
+    assert rmsd[0, 1] < 1e-6
+    assert rmsd[0, 2] > 1.0
+
+
+def write_backbone(fname, xyz):
+    lines = []
+    for i, (x, y, z) in enumerate(xyz):
+        name = [" N  ", " CA ", " C  ", " O  "][i % 4]
+        lines.append(
+            "ATOM  %5d %-4s ALA A%4d    %8.3f%8.3f%8.3f  1.00  0.00\n"
+            % (i + 1, name, i // 4 + 1, x, y, z)
+        )
+    with open(fname, "w") as fid:
+        fid.writelines(lines)
+
+
+def test_cluster_negative_entries(tmpdir):
+    svdir = str(tmpdir.mkdir("sv"))
+    rng = numpy.random.default_rng(3)
+    base = rng.normal(scale=5.0, size=(40, 3))
+    other = rng.normal(scale=5.0, size=(40, 3))
+    structures = {
+        "pos.pdb": base,
+        "negA1.pdb": other,
+        # nearly the same as negA1, moved and rotated
+        "negA1_b.pdb": other @ rotation_about_z(1.1) + 0.01,
+        "negA2.pdb": other + rng.normal(scale=2.0, size=(40, 3)),
+        # the same as negA1, but for the other mut_status
+        "negB1.pdb": other,
+    }
+    for name, xyz in structures.items():
+        write_backbone(os.path.join(svdir, name), xyz)
+    with open(os.path.join(svdir, "pos_backbones.list"), "w") as fid:
+        fid.write("bb1 complex= pos.pdb separated= pos.pdb\n")
+    with open(os.path.join(svdir, "neg_backbones.list"), "w") as fid:
+        fid.write("chAwt wtA1 complex= negA1.pdb separated= negA1.pdb\n")
+        fid.write("chBwt wtB1 complex= negB1.pdb separated= negB1.pdb\n")
+    with open(os.path.join(svdir, "neg_complexes.list"), "w") as fid:
+        fid.write("# other conformations\n")
+        fid.write("chAwt wtA1 negA1_b.pdb\n")
+        fid.write("chAwt bb1 negA2.pdb\n")
+    with open(os.path.join(svdir, "WTH3_MH4_for_wtA1.states"), "w") as fid:
+        fid.write("negA1.pdb x.corr x.2resfile\nnegA1_b.pdb x.corr x.2resfile\n")
+
+    entries = cluster_negative_entries(svdir, 0.5)
+    dropped = [entry.complex_pdb for entry in entries if entry.representative]
+    assert dropped == ["negA1_b.pdb"]
+    assert entries[2].representative.complex_pdb == "negA1.pdb"
+    assert states_per_pdb(svdir)["negA1_b.pdb"] == 1
+
+    outdir = os.path.join(str(tmpdir), "sv_clustered")
+    write_reduced_state_version(svdir, outdir, entries)
+    with open(os.path.join(outdir, "neg_complexes.list")) as fid:
+        lines = fid.readlines()
+    assert lines[1].startswith("# clustered with negA1.pdb")
+    assert lines[2] == "chAwt bb1 negA2.pdb\n"
+    assert sorted(
+        fname for fname in os.listdir(outdir) if fname.endswith(".pdb")
+    ) == ["negA1.pdb", "negA2.pdb", "negB1.pdb", "pos.pdb"]
+    assert os.path.islink(os.path.join(outdir, "pos.pdb"))
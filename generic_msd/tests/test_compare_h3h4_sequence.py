@@ -0,0 +1,76 @@
+import os
+import sys
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "example",
+        "pyscripts",
+    ),
+)
+from compare_h3h4_sequence import (
+    read_ca_resnames,
+    find_mutations_against_index,
+    mutation_matrix,
+)
+
+
+def atom_line(serial, name, resname, chain, resid, xyz=(0, 0, 0)):
+    return "ATOM  %5d %-4s %3s %c%4d    %8.3f%8.3f%8.3f  1.00  0.00\n" % (
+        (serial, name, resname, chain, resid) + tuple(xyz)
+    )
+
+
+def write_h3h4(fname, resnames_A, resnames_B):
+    """Write a CA and a CB record for each residue of chains A and B,
+    numbered from 1, and a water"""
+    lines = []
+    for chain, resnames in (("A", resnames_A), ("B", resnames_B)):
+        for i, resname in enumerate(resnames):
+            lines.append(atom_line(len(lines) + 1, " CA ", resname, chain, i + 1))
+            lines.append(atom_line(len(lines) + 1, " CB ", resname, chain, i + 1))
+        lines.append("TER\n")
+    lines.append(atom_line(len(lines) + 1, " O  ", "HOH", "W", 1))
+    lines.append("END\n")
+    fname.write("".join(lines))
+
+
+def test_read_ca_resnames(tmpdir):
+    write_h3h4(tmpdir.join("ref.pdb"), ["ALA", "GLY"], ["LYS"])
+    assert read_ca_resnames(str(tmpdir.join("ref.pdb"))) == {
+        "A": {"1": "ALA", "2": "GLY"},
+        "B": {"1": "LYS"},
+    }
+
+
+def test_find_mutations_against_index(tmpdir):
+    write_h3h4(tmpdir.join("ref.pdb"), ["ALA", "GLY", "SER"], ["LYS", "ARG"])
+    # the design lacks residue 3 of chain A, which is not a mutation
+    write_h3h4(tmpdir.join("des.pdb"), ["VAL", "GLY"], ["LYS", "GLU"])
+    ref_index = read_ca_resnames(str(tmpdir.join("ref.pdb")))
+    des_index = read_ca_resnames(str(tmpdir.join("des.pdb")))
+    assert find_mutations_against_index(ref_index, des_index, "A") == [
+        ("ALA", "1", "VAL")
+    ]
+    assert find_mutations_against_index(ref_index, des_index, "B") == [
+        ("ARG", "2", "GLU")
+    ]
+
+
+def test_mutation_matrix(tmpdir):
+    ref = str(tmpdir.join("ref.pdb"))
+    write_h3h4(tmpdir.join("ref.pdb"), ["ALA", "GLY"], ["LYS", "ARG"])
+    write_h3h4(tmpdir.join("des1.pdb"), ["VAL", "GLY"], ["LYS", "GLU"])
+    write_h3h4(tmpdir.join("des2.pdb"), ["ALA", "GLY"], ["LYS", "ARG"])
+    write_h3h4(tmpdir.join("des3.pdb"), ["ALA", "VAL"], ["ASP", "ARG"])
+    designs = [str(tmpdir.join("des%d.pdb" % i)) for i in (1, 2, 3)]
+
+    matrix, positions, resnames = mutation_matrix(ref, designs)
+    assert positions == ["A1", "A2", "B1", "B2"]
+    assert resnames == ["", "ASP", "GLU", "VAL"]
+    assert matrix.tolist() == [[3, 0, 0, 2], [0, 0, 0, 0], [0, 3, 1, 0]]
+
+    parallel = mutation_matrix(ref, designs, nprocs=2)
+    assert parallel[0].tolist() == matrix.tolist()
+    assert parallel[1:] == (positions, resnames)
@@ -0,0 +1,202 @@
+from generic_msd.create_lsf_or_slurm_job import (
+    SubmissionOptions,
+    SchedulerType,
+    command_and_submission_script_for_job,
+    command_and_submission_script_for_packed_job,
+    max_seconds_for_allocation,
+    submission_command_for_script,
+)
+from generic_msd.server_identification import KnownComputers
+import subprocess
+
+
+def array_job_options(tmpdir, scheduler, server):
+    job_options = SubmissionOptions()
+    job_options.server = server
+    job_options.scheduler = scheduler
+    job_options.num_nodes = 20
+    job_options.job_name = "scan"
+    job_options.logfilename = "scan.log"
+    job_options.submission_dir = str(tmpdir)
+    job_options.submission_script_fname = "submit_array.sh"
+    job_options.mpi_job = True
+    job_options.array_size = 6
+    job_options.array_task_file = "subjobs.list"
+    return job_options
+
+
+def test_slurm_array_submission_script(tmpdir):
+    job_options = array_job_options(
+        tmpdir, SchedulerType.SLURM_SCHEDULER, KnownComputers.DOGWOOD
+    )
+    job_options.array_max_concurrent = 2
+    command = command_and_submission_script_for_job(job_options, "mpi_msd -foo")
+    assert command == "sbatch submit_array.sh"
+
+    lines = tmpdir.join("submit_array.sh").read().split("\n")
+    assert "#SBATCH --array=1-6%2" in lines
+    assert "#SBATCH --output=scan_%a.log" in lines
+    assert 'ARRAY_TASK=$(sed -n "${SLURM_ARRAY_TASK_ID}p" subjobs.list)' in lines
+    assert "cd $SUBJOB_DIR" in lines
+    assert "$MPI_HOME/bin/mpirun  mpi_msd -foo > $SUBJOB_DIR.log 2>&1" in lines
+
+
+def test_lsf_array_submission_script(tmpdir):
+    job_options = array_job_options(
+        tmpdir, SchedulerType.LSF_SCHEDULER, KnownComputers.KILLDEVIL
+    )
+    command = command_and_submission_script_for_job(job_options, "mpi_msd -foo")
+    assert command == "bsub < submit_array.sh"
+
+    lines = tmpdir.join("submit_array.sh").read().split("\n")
+    assert '#BSUB -J "scan[1-6]"' in lines
+    assert "#BSUB -o scan_%I.log" in lines
+    assert 'ARRAY_TASK=$(sed -n "${LSB_JOBINDEX}p" subjobs.list)' in lines
+    assert "mpirun mpi_msd -foo > $SUBJOB_DIR.log 2>&1" in lines
+    # the scheduler must see every #BSUB line before the first command
+    assert lines.index("#BSUB -a mvapich") < lines.index("cd $SUBJOB_DIR")
+
+
+def test_submission_script_without_array(tmpdir):
+    job_options = array_job_options(
+        tmpdir, SchedulerType.SLURM_SCHEDULER, KnownComputers.DOGWOOD
+    )
+    job_options.array_size = 0
+    command_and_submission_script_for_job(job_options, "mpi_msd -foo")
+    contents = tmpdir.join("submit_array.sh").read()
+    assert "--array" not in contents
+    assert "#SBATCH --output=scan.log" in contents
+    assert "SUBJOB_DIR" not in contents
+
+
+def test_slurm_packed_submission_script(tmpdir):
+    job_options = SubmissionOptions()
+    job_options.server = KnownComputers.DOGWOOD
+    job_options.scheduler = SchedulerType.SLURM_SCHEDULER
+    job_options.job_name = "scan_pack_1"
+    job_options.logfilename = "scan_pack_1.log"
+    job_options.submission_dir = str(tmpdir)
+    job_options.submission_script_fname = "pack_1.sh"
+    job_options.mpi_job = True
+    tasks = [("sub1", 30, "mpi_msd -foo"), ("sub2", 28, "mpi_msd -bar")]
+    command = command_and_submission_script_for_packed_job(job_options, tasks)
+    assert command == "sbatch pack_1.sh"
+    assert job_options.num_nodes == 58
+    assert job_options.queue == "528_queue"
+
+    lines = tmpdir.join("pack_1.sh").read().split("\n")
+    assert "#SBATCH --ntasks=58" in lines
+    assert "(cd sub1 && srun --exclusive -n 30 mpi_msd -foo > sub1.log 2>&1) &" in lines
+    assert "(cd sub2 && srun --exclusive -n 28 mpi_msd -bar > sub2.log 2>&1) &" in lines
+    assert lines[-2] == "wait"
+
+
+def packed_job_options(tmpdir, server):
+    job_options = SubmissionOptions()
+    job_options.server = server
+    job_options.scheduler = SchedulerType.SLURM_SCHEDULER
+    job_options.job_name = "scan_pack_1"
+    job_options.logfilename = "scan_pack_1.log"
+    job_options.submission_dir = str(tmpdir)
+    job_options.submission_script_fname = "pack_1.sh"
+    job_options.mpi_job = True
+    job_options.timelimit = (2, 0, 0)
+    return job_options
+
+
+def test_small_dogwood_pack_stays_out_of_the_cleanup_queue(tmpdir):
+    job_options = packed_job_options(tmpdir, KnownComputers.DOGWOOD)
+    tasks = [("sub1", 24, "mpi_msd -foo"), ("sub2", 20, "mpi_msd -bar")]
+    command_and_submission_script_for_packed_job(job_options, tasks)
+    assert job_options.num_nodes == 45
+    assert job_options.queue == "528_queue"
+    assert job_options.timelimit == (2, 0, 0)
+    assert max_seconds_for_allocation(job_options) is None
+
+    lines = tmpdir.join("pack_1.sh").read().split("\n")
+    assert "#SBATCH --ntasks=45" in lines
+    assert "#SBATCH --partition=528_queue" in lines
+    assert "(cd sub1 && srun --exclusive -n 24 mpi_msd -foo > sub1.log 2>&1) &" in lines
+
+
+def test_longleaf_pack_is_not_capped(tmpdir):
+    job_options = packed_job_options(tmpdir, KnownComputers.LONGLEAF)
+    tasks = [("sub1", 24, "mpi_msd -foo"), ("sub2", 24, "mpi_msd -bar")]
+    command_and_submission_script_for_packed_job(job_options, tasks)
+    assert job_options.num_nodes == 48
+    assert job_options.queue == "SNP"
+
+    lines = tmpdir.join("pack_1.sh").read().split("\n")
+    assert "#SBATCH --ntasks=48" in lines
+    assert "(cd sub2 && srun --exclusive -n 24 mpi_msd -bar > sub2.log 2>&1) &" in lines
+
+
+def test_submission_commands_with_dependencies():
+    job_options = SubmissionOptions()
+    job_options.submission_script_fname = "launch_docking.sh"
+
+    job_options.scheduler = SchedulerType.SLURM_SCHEDULER
+    assert submission_command_for_script(job_options) == "sbatch launch_docking.sh"
+    job_options.dependency_id_file = "msd_job_ids.txt"
+    job_options.job_id_file = "docking_ids.txt"
+    guard = (
+        '[ -s msd_job_ids.txt ] || { echo "no job ids in msd_job_ids.txt" >&2; exit 1; }; '
+    )
+    assert submission_command_for_script(job_options) == (
+        guard + "sbatch --dependency=afterok:$(paste -sd: msd_job_ids.txt)"
+        " --parsable launch_docking.sh | cut -d';' -f1 >> docking_ids.txt"
+    )
+
+    job_options.scheduler = SchedulerType.LSF_SCHEDULER
+    command = submission_command_for_script(job_options)
+    assert command.startswith(guard + 'bsub -w "$(awk ')
+    assert '"done(" $1 ")"' in command
+    assert "msd_job_ids.txt)\" < launch_docking.sh | sed -n" in command
+    assert command.endswith(" >> docking_ids.txt")
+    job_options.dependency_id_file = ""
+    job_options.job_id_file = ""
+    assert submission_command_for_script(job_options) == "bsub < launch_docking.sh"
+
+
+def test_submission_fails_for_an_empty_id_file(tmpdir):
+    job_options = SubmissionOptions()
+    job_options.submission_script_fname = "launch_docking.sh"
+    job_options.dependency_id_file = "msd_job_ids.txt"
+
+    def run_submission(scheduler):
+        # run the command with sbatch and bsub replaced by shell functions
+        # that print the arguments they are given, one per line
+        job_options.scheduler = scheduler
+        script = (
+            'sbatch() { printf "%s\\n" "$@"; }; bsub() { printf "%s\\n" "$@"; }; '
+            + submission_command_for_script(job_options)
+            + "; echo submitted"
+        )
+        return subprocess.run(
+            ["bash", "-c", script],
+            cwd=str(tmpdir),
+            universal_newlines=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+    tmpdir.join("launch_docking.sh").write("")
+    for scheduler in [SchedulerType.SLURM_SCHEDULER, SchedulerType.LSF_SCHEDULER]:
+        result = run_submission(scheduler)
+        assert result.returncode == 1
+        assert result.stdout == ""
+        assert "no job ids in msd_job_ids.txt" in result.stderr
+    tmpdir.join("msd_job_ids.txt").write("")
+    assert run_submission(SchedulerType.SLURM_SCHEDULER).returncode == 1
+
+    tmpdir.join("msd_job_ids.txt").write("11\n12\n")
+    assert run_submission(SchedulerType.SLURM_SCHEDULER).stdout.split() == [
+        "--dependency=afterok:11:12",
+        "launch_docking.sh",
+        "submitted",
+    ]
+    assert run_submission(SchedulerType.LSF_SCHEDULER).stdout.split() == [
+        "-w",
+        "done(11)&&done(12)",
+        "submitted",
+    ]
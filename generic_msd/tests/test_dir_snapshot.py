@@ -0,0 +1,24 @@
+from generic_msd.dir_snapshot import DirectorySnapshot
+import os
+
+
+def test_directory_snapshot(tmpdir):
+    tmpdir.join("a.pdb").write("")
+    tmpdir.mkdir("sub").join("b.pdb").write("")
+    snapshot = DirectorySnapshot(str(tmpdir))
+    assert snapshot.has("a.pdb")
+    assert snapshot.isfile(os.path.join(str(tmpdir), "a.pdb"))
+    # directories are not files, but files elsewhere are looked up directly
+    assert not snapshot.has("sub")
+    assert snapshot.isfile(str(tmpdir.join("sub").join("b.pdb")))
+
+    # files written after the listing are unknown until added ...
+    tmpdir.join("c.states").write("")
+    tmpdir.join("d.states").write("")
+    assert not snapshot.has("c.states")
+    snapshot.add(str(tmpdir.join("c.states")))
+    assert snapshot.has("c.states")
+    assert not snapshot.has("d.states")
+    # ... or until the snapshot is invalidated
+    snapshot.invalidate()
+    assert snapshot.has("d.states")
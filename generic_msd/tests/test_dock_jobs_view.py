@@ -0,0 +1,166 @@
+import os
+import sys
+import shutil
+import pytest
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "example",
+        "pyscripts",
+    ),
+)
+from dock_jobs_view import (
+    score_file_shards,
+    read_score_columns,
+    top_k_by_total_score,
+    avg_binding_energy_from_top10,
+    best_result_by_total_score,
+    report_lines,
+)
+
+
+def write_score_file(fname, header, rows):
+    """Write a Rosetta-style score file with the given column names and
+    rows of values (the description is the last entry of each row)"""
+    with open(fname, "w") as fid:
+        fid.write("SEQUENCE: \n")
+        fid.write("SCORE: " + " ".join(header) + "\n")
+        for row in rows:
+            fid.write("SCORE: " + " ".join(str(x) for x in row) + "\n")
+
+
+score_header = [
+    "total_score",
+    "h3h4_vs_nuc_dG_separated",
+    "h3h4_vs_nuc_dSASA_int",
+    "h3h4_vs_nuc_delta_unsatHbonds",
+    "h3_vs_h4_dG_separated",
+    "h3_vs_h4_dSASA_int",
+    "h3_vs_h4_delta_unsatHbonds",
+    "description",
+]
+
+
+def score_row(i):
+    # the total score falls with i, so the last rows are the best
+    return [
+        100.0 - i,
+        -1.0 * i,
+        10.0 * i,
+        i % 3,
+        -2.0 * i,
+        20.0 * i,
+        i % 2,
+        "model_%04d" % i,
+    ]
+
+
+def test_read_score_columns_across_shards(tmpdir):
+    dirname = str(tmpdir)
+    write_score_file(
+        os.path.join(dirname, "score.sc.0"),
+        score_header,
+        [score_row(i) for i in range(6)],
+    )
+    # the second shard lists its columns in another order
+    reordered = list(reversed(score_header))
+    write_score_file(
+        os.path.join(dirname, "score.sc.1"),
+        reordered,
+        [list(reversed(score_row(i))) for i in range(6, 12)],
+    )
+    shards = score_file_shards(dirname)
+    assert [os.path.basename(x) for x in shards] == ["score.sc.0", "score.sc.1"]
+
+    columns = read_score_columns(shards, ["h3h4_vs_nuc", "h3_vs_h4"])
+    assert columns["description"] == ["model_%04d" % i for i in range(12)]
+    assert list(columns["total_score"]) == [100.0 - i for i in range(12)]
+    assert list(columns["h3_vs_h4"]["dSASA_int"]) == [20.0 * i for i in range(12)]
+    assert list(columns["h3h4_vs_nuc"]["delta_unsatHbonds"]) == [
+        i % 3 for i in range(12)
+    ]
+
+
+def test_score_file_without_shards(tmpdir):
+    dirname = str(tmpdir)
+    write_score_file(
+        os.path.join(dirname, "score.sc"), score_header, [score_row(1)]
+    )
+    assert score_file_shards(dirname) == [os.path.join(dirname, "score.sc")]
+
+
+def test_top10_binding_energy(tmpdir):
+    sc_fname = os.path.join(str(tmpdir), "score.sc")
+    write_score_file(sc_fname, score_header, [score_row(i) for i in range(15)])
+    columns = read_score_columns([sc_fname], ["h3h4_vs_nuc", "h3_vs_h4"])
+
+    assert sorted(top_k_by_total_score(columns, 10)) == list(range(5, 15))
+    # models 5 through 14 have dG_separated sums of -3i
+    assert avg_binding_energy_from_top10(
+        columns, "h3h4_vs_nuc", "h3_vs_h4"
+    ) == pytest.approx(-3.0 * sum(range(5, 15)) / 10)
+    assert best_result_by_total_score(columns) == "model_0014"
+
+
+def test_top10_binding_energy_of_fewer_than_10_models(tmpdir):
+    sc_fname = os.path.join(str(tmpdir), "score.sc")
+    write_score_file(sc_fname, score_header, [score_row(i) for i in range(4)])
+    columns = read_score_columns([sc_fname], ["h3h4_vs_nuc", "h3_vs_h4"])
+
+    assert sorted(top_k_by_total_score(columns, 10)) == [0, 1, 2, 3]
+    # the sum is still divided by 10
+    assert avg_binding_energy_from_top10(
+        columns, "h3h4_vs_nuc", "h3_vs_h4"
+    ) == pytest.approx(-3.0 * 6 / 10)
+
+
+def test_score_line_before_header(tmpdir):
+    sc_fname = os.path.join(str(tmpdir), "score.sc")
+    with open(sc_fname, "w") as fid:
+        fid.write("SCORE: " + " ".join(str(x) for x in score_row(1)) + "\n")
+    with pytest.raises(ValueError):
+        read_score_columns([sc_fname], ["h3h4_vs_nuc", "h3_vs_h4"])
+
+
+def test_report_lines_in_parallel(tmpdir):
+    dock_dir = str(tmpdir.mkdir("dock"))
+    best_dir = str(tmpdir.mkdir("best_docked"))
+    reference = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "example",
+        "input_files",
+        "starting_structures",
+        "1kx5",
+        "1KX5_chAB.pdb",
+    )
+    tuples = []
+    for t in range(3):
+        cols = ["des_%d_%d.pdb" % (t, k) for k in range(8)]
+        for k, col in enumerate(cols):
+            # an unmutated design, so no mutations are listed for it
+            shutil.copyfile(reference, os.path.join(dock_dir, col))
+            path = os.path.join(dock_dir, "dock_" + col[0:-4])
+            os.mkdir(path)
+            rows = []
+            for i in range(3):
+                row = score_row(i)
+                row[1] = row[4] = -1.0 * (k + 1)
+                rows.append(row)
+                open(os.path.join(path, row[-1] + ".pdb"), "w").close()
+            write_score_file(os.path.join(path, "score.sc"), score_header, rows)
+        tuples.append(cols)
+
+    lines = report_lines(dock_dir, best_dir, tuples, 2)
+    assert len(lines) == 3
+    for cols, line in zip(tuples, lines):
+        assert line.startswith(cols[0] + ", ")
+        values = [float(x) for x in line.split("(")[0].split(",")[1:]]
+        # three models with a dG_separated sum of -2(k+1), over 10
+        assert values == pytest.approx([-0.6 * (k + 1) for k in range(8)])
+        assert line.endswith(" AH3_AH4: chA chB BH3_BH4: chA chB\n")
+    for cols in tuples:
+        for col in cols:
+            best = os.path.join(best_dir, "dock_" + col[0:-4] + ".pdb")
+            assert os.path.isfile(best)
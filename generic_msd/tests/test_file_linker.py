@@ -0,0 +1,63 @@
+from generic_msd.file_linker import SubjobFileLinker
+import os
+import pytest
+
+
+def test_linker_links_into_several_directories(tmpdir):
+    srcdir = tmpdir.mkdir("inputs")
+    for fname in ["a.pdb", "b.pdb", "MH3_MH4_1.corr"]:
+        srcdir.join(fname).write(fname)
+
+    pairs = [
+        (str(srcdir.join("a.pdb")), "."),
+        (str(srcdir.join("b.pdb")), "."),
+        (str(srcdir.join("MH3_MH4_1.corr")), "MH3_MH4.corr"),
+    ]
+    linker = SubjobFileLinker()
+    links = linker.checked_links(pairs)
+    assert links[0][1] == "a.pdb"
+    assert links[2][1] == "MH3_MH4.corr"
+
+    for subdir in ["sub1", "sub2"]:
+        dest = tmpdir.mkdir(subdir)
+        linker.link_into(str(dest), links)
+        assert os.path.islink(str(dest.join("a.pdb")))
+        assert dest.join("MH3_MH4.corr").read() == "MH3_MH4_1.corr"
+
+    assert linker.n_links_created == 6
+    assert linker.n_dirs_linked == 2
+    assert "Linked 6 files into 2 subjob directories" in linker.report()
+
+
+def test_linker_reports_missing_files(tmpdir):
+    srcdir = tmpdir.mkdir("inputs")
+    srcdir.join("a.pdb").write("a")
+    linker = SubjobFileLinker()
+    with pytest.raises(ValueError) as err:
+        linker.checked_links(
+            [(str(srcdir.join("a.pdb")), "."), (str(srcdir.join("c.pdb")), ".")],
+            " for job test",
+        )
+    assert "c.pdb for job test" in str(err.value)
+
+
+def test_linker_hardlinks(tmpdir):
+    srcdir = tmpdir.mkdir("inputs")
+    srcdir.join("a.pdb").write("a")
+    linker = SubjobFileLinker(hardlink=True)
+    links = linker.checked_links([(str(srcdir.join("a.pdb")), ".")])
+    dest = tmpdir.mkdir("sub1")
+    linker.link_into(str(dest), links)
+    assert not os.path.islink(str(dest.join("a.pdb")))
+    assert os.path.samefile(str(dest.join("a.pdb")), str(srcdir.join("a.pdb")))
+
+
+def test_linker_links_relative_sources_by_their_absolute_path(tmpdir):
+    tmpdir.mkdir("inputs").join("a.pdb").write("a")
+    dest = tmpdir.mkdir("job").mkdir("sub1")
+    with tmpdir.as_cwd():
+        linker = SubjobFileLinker()
+        links = linker.checked_links([(os.path.join("inputs", "a.pdb"), ".")])
+        linker.link_into(str(dest), links)
+    assert os.path.isabs(os.readlink(str(dest.join("a.pdb"))))
+    assert dest.join("a.pdb").read() == "a"
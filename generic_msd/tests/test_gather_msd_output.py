@@ -0,0 +1,66 @@
+from generic_msd.gather_msd_output import gather_job_output
+import json
+import os
+
+
+def write_gather_job(tmpdir):
+    plan = {"subjobs": [], "complex_sets": []}
+    for subjob in ["job_1.0w", "job_2.0w"]:
+        subdir = tmpdir.mkdir(subjob)
+        for result in ["1", "2"]:
+            subdir.join("msd_output_%s_AB_0001.pdb" % result).write(subjob + result)
+        # symlinks into the subjob directory are never gathered
+        os.symlink(
+            str(subdir.join("msd_output_1_AB_0001.pdb")),
+            str(subdir.join("msd_output_1_AB_0002.pdb")),
+        )
+        plan["subjobs"].append(
+            {
+                "subjob": subjob,
+                "outputs": [
+                    ["msd_output_1_AB", subjob + "_1_AB.pdb"],
+                    ["msd_output_2_AB", subjob + "_2_AB.pdb"],
+                    ["msd_output_3_AB", subjob + "_3_AB.pdb"],
+                ],
+            }
+        )
+        plan["complex_sets"].append(subjob + "_1_AB.pdb")
+    tmpdir.join("gather_plan.json").write(json.dumps(plan))
+
+
+def test_gather_job_output(tmpdir):
+    write_gather_job(tmpdir)
+    manifest = gather_job_output(str(tmpdir), nthreads=2)
+
+    results = tmpdir.join("results")
+    assert results.join("job_1.0w_1_AB.pdb").read() == "job_1.0w1"
+    assert results.join("job_2.0w_2_AB.pdb").read() == "job_2.0w2"
+    # no output was written for the third result
+    assert not results.join("job_1.0w_3_AB.pdb").check()
+    assert sorted(manifest) == [
+        "job_1.0w_1_AB.pdb",
+        "job_1.0w_2_AB.pdb",
+        "job_2.0w_1_AB.pdb",
+        "job_2.0w_2_AB.pdb",
+    ]
+    assert results.join("complex_sets.list").readlines() == [
+        "job_1.0w_1_AB.pdb\n",
+        "job_2.0w_1_AB.pdb\n",
+    ]
+    assert results.join("gather_manifest.json").check()
+
+
+def test_gather_job_output_skips_gathered_structures(tmpdir):
+    write_gather_job(tmpdir)
+    gather_job_output(str(tmpdir))
+    results = tmpdir.join("results")
+
+    # an output that has not changed is not copied again ...
+    results.join("job_1.0w_1_AB.pdb").write("untouched")
+    # ... but one that has is
+    tmpdir.join("job_2.0w", "msd_output_2_AB_0001.pdb").write("rerun")
+    gather_job_output(str(tmpdir), hardlink=True)
+    assert results.join("job_1.0w_1_AB.pdb").read() == "untouched"
+    assert results.join("job_2.0w_2_AB.pdb").read() == "rerun"
+    # the complex sets are rewritten, not appended to
+    assert len(results.join("complex_sets.list").readlines()) == 2
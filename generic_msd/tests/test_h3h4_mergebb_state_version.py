@@ -7,29 +7,33 @@ from generic_msd.msd_interface_design import (
 )
 from generic_msd.tests.mergebb_design_species import MergeH3H4DesignSpecies
 
+import json
 import os
+import shutil
+import pytest
 
 
 class mock_opts:
     pass
 
-def test_create_state_version():
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = os.path.join(currpath, "merge_bb_inputs")
 
+def copy_state_version(tmpdir):
+    currpath = os.path.dirname(os.path.abspath(__file__))
+    stateverdir = os.path.join(str(tmpdir), "input_files", "state_versions", "sv")
+    shutil.copytree(
+        os.path.join(currpath, "merge_bb_inputs", "input_files", "state_versions", "frwt_v1mock_dd1"),
+        stateverdir,
+        # neither the .states files nor a snapshot left by an earlier run
+        ignore=shutil.ignore_patterns("*.states", ".state_version_cache.pkl"),
+    )
     opts = mock_opts()
-    setattr(opts, "base_dir", basedir)
-    setattr(opts, "state_version", "frwt_v1mock_dd1")
-    state_ver_opts = StateVersionOpts(opts)
-    stateverdir = os.path.join(basedir,"input_files","state_versions","frwt_v1mock_dd1")
-
-    # let's delete all of the .states files in this directory
-    # if they are already present so that we can regenerate them
-    # and make sure that the regenerated files are what we want
-    states_files =  [fname for fname in os.listdir(stateverdir) if fname.endswith(".states")]
-    for fname in states_files:
-        #print("deleting", os.path.join(stateverdir,fname))
-        os.system("rm " + os.path.join(stateverdir,fname))
+    setattr(opts, "base_dir", str(tmpdir))
+    setattr(opts, "state_version", "sv")
+    return stateverdir, StateVersionOpts(opts)
+
+
+def test_create_state_version(tmpdir):
+    stateverdir, state_ver_opts = copy_state_version(tmpdir)
 
     spec = MergeH3H4DesignSpecies()
     states = MergeBBStateVersion(state_ver_opts, spec)
@@ -43,7 +47,66 @@ def test_create_state_version():
     assert len(lines) == 4
     assert lines[0] == "1KX5_chAB_0331.pdb MH3_WTH4.corr MH3_WTH4.2resfile\n"
 
-    for fname in states_files:
-        #print("deleting", os.path.join(stateverdir,fname))
-        os.system("rm " + os.path.join(stateverdir,fname))
 
+def test_state_version_prefers_states_json(tmpdir):
+    stateverdir, state_ver_opts = copy_state_version(tmpdir)
+    states = MergeBBStateVersion(state_ver_opts, MergeH3H4DesignSpecies())
+    assert states.nstates_total() == 14
+    yaml_entries = states.yaml_contents["pdbs"]
+
+    # the json equivalent of states.yaml, less its last state; a state
+    # version that gains one is read again
+    with open(os.path.join(stateverdir, "states.json"), "w") as fid:
+        json.dump({"pdbs": yaml_entries[:-1]}, fid)
+    states = MergeBBStateVersion(state_ver_opts, MergeH3H4DesignSpecies())
+    assert states.nstates_total() == 13
+    assert states.pdbs_for_spec["MH4"] == ["1KX5_chAB_0331.pdb"]
+    with open(os.path.join(stateverdir, "MH4.states")) as fid:
+        assert len(fid.readlines()) == 1
+
+def test_state_version_refuses_a_stale_states_json(tmpdir):
+    stateverdir, state_ver_opts = copy_state_version(tmpdir)
+    states = MergeBBStateVersion(state_ver_opts, MergeH3H4DesignSpecies())
+    states.determine_pdbs()
+    json_fname = os.path.join(stateverdir, "states.json")
+    with open(json_fname, "w") as fid:
+        json.dump(states.yaml_contents, fid)
+    # states.yaml is edited after the states.json was written
+    yaml_fname = os.path.join(stateverdir, "states.yaml")
+    mtime = os.stat(json_fname).st_mtime
+    os.utime(yaml_fname, (mtime + 10, mtime + 10))
+    states = MergeBBStateVersion(state_ver_opts, MergeH3H4DesignSpecies())
+    with pytest.raises(ValueError, match="is newer than"):
+        states.determine_pdbs()
+
+
+def test_state_version_reports_missing_pdbs(tmpdir):
+    stateverdir, state_ver_opts = copy_state_version(tmpdir)
+    os.remove(os.path.join(stateverdir, "1KX5_chAB_0331.pdb"))
+    states = MergeBBStateVersion(state_ver_opts, MergeH3H4DesignSpecies())
+    with pytest.raises(FileNotFoundError, match="1KX5_chAB_0331.pdb"):
+        states.determine_pdbs()
+
+
+def test_state_version_dedupe_pdbs(tmpdir):
+    stateverdir, state_ver_opts = copy_state_version(tmpdir)
+    shutil.copyfile(
+        os.path.join(stateverdir, "1KX5_chAB_0331.pdb"),
+        os.path.join(stateverdir, "copy.pdb"),
+    )
+    with open(os.path.join(stateverdir, "states.yaml"), "a") as fid:
+        fid.write("  - {species: MH3, pdb: copy.pdb}\n  - {species: MH4, pdb: copy.pdb}\n")
+    states = MergeBBStateVersion(state_ver_opts, MergeH3H4DesignSpecies())
+    assert states.nstates_total() == 16
+
+    state_ver_opts.dedupe_pdbs = True
+    states = MergeBBStateVersion(state_ver_opts, MergeH3H4DesignSpecies())
+    assert states.nstates_total() == 14
+    assert states.states_deduped == 2
+    assert "copy.pdb" not in states.pdbs()
+    # the number of states removed is kept in the snapshot
+    states = MergeBBStateVersion(state_ver_opts, MergeH3H4DesignSpecies())
+    assert states.determine_pdbs_from_snapshot()
+    assert states.states_deduped == 2
+    with open(os.path.join(stateverdir, "MH3.states")) as fid:
+        assert [line.split()[0] for line in fid] == ["1KX5_chAB_0331.pdb", "1KX5_chAB_0982.pdb"]
@@ -8,14 +8,14 @@ from generic_msd.tests.dummy_desdef import dummy_design_species
 from generic_msd.tests.dummy_state_version import dummy_state_version
 from generic_msd.tests.dummy_interface_job import H3H4InterfaceMSDJob
 from generic_msd.opt_holder import OptHolder
+from generic_msd.tests.copied_inputs import copy_test_inputs
 import blargs
 import os
 
 
-def test_create_h3h4_msd_job():
+def test_create_h3h4_msd_job(tmpdir):
     opts = OptHolder()
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = currpath + "/dummy/"
+    basedir = copy_test_inputs(tmpdir, "dummy")
     opts["base_dir"] = basedir
 
     p = blargs.Parser(opts)
@@ -48,10 +48,9 @@ def test_create_h3h4_msd_job():
         assert os.path.isfile(p[0])
 
 
-def test_create_h3h4_fitness_lines():
+def test_create_h3h4_fitness_lines(tmpdir):
     opts = OptHolder()
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = currpath + "/dummy/"
+    basedir = copy_test_inputs(tmpdir, "dummy")
     opts["base_dir"] = basedir
 
     p = blargs.Parser(opts)
@@ -86,3 +85,42 @@ def test_create_h3h4_fitness_lines():
         fitness_func_lines[-1]
         == "FITNESS best_MH3_MH4 + 1.500000 * best_dGbind + 3.250000 * entfunc\n"
     )
+
+
+def test_h3h4_fitness_template_built_once(tmpdir):
+    opts = OptHolder()
+    basedir = copy_test_inputs(tmpdir, "dummy")
+    opts["base_dir"] = basedir
+
+    p = blargs.Parser(opts)
+    DesignDefinitionOpts.add_options(p)
+    StateVersionOpts.add_options(p)
+    MSDIntDesJobOptions.add_options(p)
+    PostProcessingOpts.add_options(p)
+
+    p.process_command_line(
+        [
+            "--des_def",
+            "desdef1_only_hphobes",
+            "--state_version",
+            "frwt_v1mock_dd1",
+            "--job_name",
+            "test_job1",
+            "--daf",
+            basedir + "input_files/fitness_functions/example_func.txt",
+        ]
+    )
+
+    msd_job = H3H4InterfaceMSDJob(opts)
+    msd_job.files_to_symlink(None)
+    template = msd_job.fitness_template()
+    assert "%(WSCAN)s" in template
+    assert "%(WENTFUNC)s * entfunc" in template
+    assert msd_job.fitness_template() is template
+
+    lines1 = msd_job.fitness_lines("testjob_1.5w_dGdiff_3.25Ent")
+    lines2 = msd_job.fitness_lines("testjob_2.0w_dGdiff_1.0Ent")
+    assert lines1[:-1] == lines2[:-1]
+    assert (
+        lines2[-1] == "FITNESS best_MH3_MH4 + 2.000000 * best_dGbind + 1.000000 * entfunc\n"
+    )
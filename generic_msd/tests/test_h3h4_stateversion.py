@@ -8,6 +8,7 @@ from generic_msd.msd_interface_design import (
 import generic_msd.tests.separate_h3h4_interface
 from generic_msd.tests.dummy_desdef import dummy_design_species
 from generic_msd.tests.dummy_state_version import dummy_state_version
+from generic_msd.tests.copied_inputs import copy_test_inputs
 import os
 
 
@@ -50,9 +51,8 @@ def test_create_state_version():
     assert state_ver.design_species is spec
 
 
-def test_state_version_determine_pdbs():
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = currpath + "/dummy/"
+def test_state_version_determine_pdbs(tmpdir):
+    basedir = copy_test_inputs(tmpdir, "dummy")
 
     dummy_opts = empty_class()
     setattr(dummy_opts, "base_dir", basedir)
@@ -97,9 +97,8 @@ def test_state_version_determine_pdbs():
     assert state_ver.neg_states_wtB == gold_neg_states_wtB
 
 
-def test_state_version_generate_states_file():
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = currpath + "/dummy/"
+def test_state_version_generate_states_file(tmpdir):
+    basedir = copy_test_inputs(tmpdir, "dummy")
 
     dummy_opts = empty_class()
     setattr(dummy_opts, "base_dir", basedir)
@@ -123,11 +122,6 @@ def test_state_version_generate_states_file():
     wtAbbs = ["rwt_0982", "wtA1", "wtA2"]
     wtBbbs = ["rwt_0982", "wtB1", "wtB2"]
 
-    # Cleanup from previous runs?
-    for species in spec.species():
-        for bb in bbs:
-            os.system("rm -f " + svdir + species + "_for_" + bb + ".states")
-
     state_ver.determine_pdbs()
     state_ver.create_state_file_lists()
 
@@ -199,16 +193,20 @@ def test_state_version_generate_states_file():
             ]
             assert lines == gold_lines
 
-    # Cleanup
+    # the species x backbone table agrees with the .states files written
     for species in spec.species():
         for bb in bbs:
-            os.system("rm -f " + svdir + species + "_for_" + bb + ".states")
+            fname = os.path.join(svdir, species + "_for_" + bb + ".states")
+            assert state_ver.species_uses_backbone(species, bb) == os.path.isfile(fname)
+            if os.path.isfile(fname):
+                with open(fname) as fid:
+                    nstates = len(fid.readlines())
+                assert state_ver.nstates_for_spec_and_bb(species, bb) == nstates
 
 
-def test_state_version_pdbs_function():
+def test_state_version_pdbs_function(tmpdir):
 
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = currpath + "/dummy/"
+    basedir = copy_test_inputs(tmpdir, "dummy")
 
     dummy_opts = empty_class()
     setattr(dummy_opts, "base_dir", basedir)
@@ -237,10 +235,9 @@ def test_state_version_pdbs_function():
     assert state_ver.pdbs() == gold_pdbs
 
 
-def test_state_version_nstates_total():
+def test_state_version_nstates_total(tmpdir):
 
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = currpath + "/dummy/"
+    basedir = copy_test_inputs(tmpdir, "dummy")
 
     dummy_opts = empty_class()
     setattr(dummy_opts, "base_dir", basedir)
@@ -4,16 +4,22 @@ from generic_msd.tests.dummy_interface_job import H3H4InterfaceMSDJob
 from generic_msd.tests.mergebb_design_species import MergeH3H4DesignSpecies
 from generic_msd.tests.mergebb_msd_job import H3H4MergeBBInterfaceMSDJob
 from generic_msd.opt_holder import OptHolder
+from generic_msd.tests.copied_inputs import copy_test_inputs
 from generic_msd.msd_interface_design import (
     MSDIntDesJobOptions,
     DesignDefinitionOpts,
     StateVersionOpts,
     PostProcessingOpts,
 )
-from generic_msd.msd_job_management import MSDJobManager, JobExecutionOptions
+from generic_msd.msd_job_management import (
+    MSDJobManager,
+    JobExecutionOptions,
+)
 from generic_msd.server_identification import KnownComputers, ServerIdentifier
 import blargs
 import os
+import shutil
+import sys
 
 
 def recursively_rm_directory(dirname):
@@ -37,10 +43,9 @@ class DogwoodServerIdentifier(ServerIdentifier):
         return KnownComputers.DOGWOOD
 
 
-def test_setup_msd_job_killdevil():
+def test_setup_msd_job_killdevil(tmpdir):
     opts = OptHolder()
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = currpath + "/dummy/"
+    basedir = copy_test_inputs(tmpdir, "dummy")
     opts["base_dir"] = basedir
 
     p = blargs.Parser(opts)
@@ -87,13 +92,19 @@ def test_setup_msd_job_killdevil():
             )
     assert os.path.isfile(focus_dir + "fitness.daf")
 
+    # the gather step runs this package by its path, as it is not installed
+    with open("test_job1_killdevil/gather_output.sh") as fid:
+        gather_command = fid.readline().split()
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert gather_command[0].startswith("PYTHONPATH=" + package_root + "$")
+    assert gather_command[1:] == [sys.executable, "-m", "generic_msd.gather_msd_output"]
+
     #recursively_rm_directory("test_job1_killdevil")
 
 
-def test_setup_msd_job_dogwood():
+def test_setup_msd_job_dogwood(tmpdir):
     opts = OptHolder()
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = currpath + "/dummy/"
+    basedir = copy_test_inputs(tmpdir, "dummy")
     opts["base_dir"] = basedir
 
     p = blargs.Parser(opts)
@@ -151,10 +162,9 @@ def test_setup_msd_job_dogwood():
 
     #recursively_rm_directory("test_job1_dogwood")
 
-def test_setup_mergebb_msd_job_killdevil():
+def test_setup_mergebb_msd_job_killdevil(tmpdir):
     opts = OptHolder()
-    currpath = os.path.dirname(os.path.abspath(__file__))
-    basedir = os.path.join(currpath,"merge_bb_inputs")
+    basedir = copy_test_inputs(tmpdir, "merge_bb_inputs")
     opts["base_dir"] = basedir
 
     p = blargs.Parser(opts)
@@ -202,3 +212,258 @@ def test_setup_mergebb_msd_job_killdevil():
     assert os.path.isfile(focus_dir + "fitness.daf")
 
     #recursively_rm_directory("test_job1_killdevil")
+
+
+def test_setup_msd_job_in_parallel(tmpdir):
+    opts = OptHolder()
+    basedir = copy_test_inputs(tmpdir, "dummy")
+    opts["base_dir"] = basedir
+
+    p = blargs.Parser(opts)
+    DesignDefinitionOpts.add_options(p)
+    StateVersionOpts.add_options(p)
+    MSDIntDesJobOptions.add_options(p)
+    PostProcessingOpts.add_options(p)
+
+    si = DogwoodServerIdentifier()
+    JobExecutionOptions.add_options(p, si)
+
+    p.process_command_line(
+        [
+            "--des_def",
+            "desdef1_only_hphobes",
+            "--state_version",
+            "frwt_v1mock_dd1",
+            "--job_name",
+            "test_job3_parallel",
+            "--daf",
+            basedir + "input_files/fitness_functions/example_func.txt",
+            "--w_dGdiff_bonus_weights_file",
+            basedir + "input_files/scan_values/scan_1_2.txt",
+            "--entfunc_weights_file",
+            basedir + "input_files/scan_values/scan_1_2_3.txt",
+            "--num_setup_threads",
+            "4",
+        ]
+    )
+
+    msd_job = H3H4InterfaceMSDJob(opts)
+
+    if os.path.isdir("test_job3_parallel"):
+        recursively_rm_directory("test_job3_parallel")
+    startdir = os.getcwd()
+    msd_manager = MSDJobManager(msd_job, opts, si)
+    msd_manager.prepare_job()
+
+    # Assertions
+    assert os.getcwd() == startdir
+    subjobs = msd_job.subjobs()
+    for subjob in subjobs:
+        focus_dir = "test_job3_parallel/" + subjob + "/"
+        assert os.path.isfile(focus_dir + "fitness.daf")
+        assert os.path.isfile(focus_dir + "submit.sh")
+        assert os.path.islink(focus_dir + "entity.resfile")
+
+    # the launch script should list the subjobs in their original order
+    with open("test_job3_parallel/submit_all_jobs.sh") as fid:
+        cd_lines = [line for line in fid.readlines() if line.startswith("cd test")]
+    assert cd_lines == ["cd " + subjob + "\n" for subjob in subjobs]
+
+    #recursively_rm_directory("test_job3_parallel")
+
+
+def test_setup_msd_job_as_array(tmpdir):
+    opts = OptHolder()
+    basedir = copy_test_inputs(tmpdir, "dummy")
+    opts["base_dir"] = basedir
+
+    p = blargs.Parser(opts)
+    DesignDefinitionOpts.add_options(p)
+    StateVersionOpts.add_options(p)
+    MSDIntDesJobOptions.add_options(p)
+    PostProcessingOpts.add_options(p)
+
+    si = DogwoodServerIdentifier()
+    JobExecutionOptions.add_options(p, si)
+
+    p.process_command_line(
+        [
+            "--des_def",
+            "desdef1_only_hphobes",
+            "--state_version",
+            "frwt_v1mock_dd1",
+            "--job_name",
+            "test_job3_array",
+            "--daf",
+            basedir + "input_files/fitness_functions/example_func.txt",
+            "--w_dGdiff_bonus_weights_file",
+            basedir + "input_files/scan_values/scan_1_2.txt",
+            "--entfunc_weights_file",
+            basedir + "input_files/scan_values/scan_1_2_3.txt",
+            "--array_submission",
+            "--array_max_concurrent",
+            "4",
+        ]
+    )
+
+    msd_job = H3H4InterfaceMSDJob(opts)
+
+    if os.path.isdir("test_job3_array"):
+        recursively_rm_directory("test_job3_array")
+    msd_manager = MSDJobManager(msd_job, opts, si)
+    msd_manager.prepare_job()
+
+    # Assertions
+    subjobs = msd_job.subjobs()
+    for subjob in subjobs:
+        focus_dir = "test_job3_array/" + subjob + "/"
+        assert os.path.isfile(focus_dir + "fitness.daf")
+        assert not os.path.isfile(focus_dir + "submit.sh")
+
+    with open("test_job3_array/subjobs.list") as fid:
+        task_lines = fid.readlines()
+    assert len(task_lines) == len(subjobs)
+    assert task_lines[0] == "test_job3_array_1.0w_dGdiff_1.0Ent 1.0 1.0\n"
+    assert task_lines[-1] == "test_job3_array_2.0w_dGdiff_3.0Ent 2.0 3.0\n"
+
+    with open("test_job3_array/submit_array.sh") as fid:
+        assert "#SBATCH --array=1-6%4\n" in fid.readlines()
+    with open("test_job3_array/submit_all_jobs.sh") as fid:
+        assert fid.readlines() == [
+            "rm -f msd_job_ids.txt\n",
+            "\n",
+            "sbatch --parsable submit_array.sh | cut -d';' -f1 >> msd_job_ids.txt\n",
+            "\n",
+        ]
+
+    #recursively_rm_directory("test_job3_array")
+
+
+def test_deduped_states_are_reported(tmpdir, capsys):
+    basedir = copy_test_inputs(tmpdir, "merge_bb_inputs")
+    svdir = os.path.join(basedir, "input_files/state_versions/frwt_v1mock_dd1")
+    shutil.copyfile(
+        os.path.join(svdir, "1KX5_chAB_0331.pdb"), os.path.join(svdir, "copy.pdb")
+    )
+    with open(os.path.join(svdir, "states.yaml"), "a") as fid:
+        fid.write("  - {species: MH3, pdb: copy.pdb}\n  - {species: MH4, pdb: copy.pdb}\n")
+
+    def prepare_job(job_name):
+        opts = OptHolder()
+        opts["base_dir"] = basedir
+        p = blargs.Parser(opts)
+        DesignDefinitionOpts.add_options(p)
+        StateVersionOpts.add_options(p)
+        MSDIntDesJobOptions.add_options(p)
+        PostProcessingOpts.add_options(p)
+        si = KilldevilServerIdentifier()
+        JobExecutionOptions.add_options(p, si)
+        p.process_command_line(
+            [
+                "--des_def", "dd1",
+                "--state_version", "frwt_v1mock_dd1",
+                "--dedupe_pdbs",
+                "--num_states_per_cpu", "3",
+                "--job_name", job_name,
+                "--daf", basedir + "input_files/fitness_functions/example_func.txt",
+                "--w_dGdiff_bonus_weights_file", basedir + "input_files/scan_values/scan_1_2.txt",
+                "--entfunc_weights_file", basedir + "input_files/scan_values/scan_1_2_3.txt",
+            ]
+        )
+        with tmpdir.as_cwd():
+            MSDJobManager(H3H4MergeBBInterfaceMSDJob(opts), opts, si).prepare_job()
+        return capsys.readouterr().out
+
+    # 16 states at 3 per cpu take 6 cpus, and 14 take 5; the second job
+    # loads the state version from its snapshot
+    report = (
+        "Replacing duplicate pdbs removed 2 of the 16 states, which saves 1 "
+        "cpus per subjob at 3 states per cpu"
+    )
+    assert report in prepare_job("dedupe1")
+    assert report in prepare_job("dedupe2")
+
+
+def test_runtime_history_is_recorded_by_the_gather_step(tmpdir, capsys):
+    basedir = copy_test_inputs(tmpdir, "merge_bb_inputs")
+    history = os.path.join(str(tmpdir), "runtime_history.json")
+    opts = OptHolder()
+    opts["base_dir"] = basedir
+    p = blargs.Parser(opts)
+    DesignDefinitionOpts.add_options(p)
+    StateVersionOpts.add_options(p)
+    MSDIntDesJobOptions.add_options(p)
+    PostProcessingOpts.add_options(p)
+    si = KilldevilServerIdentifier()
+    JobExecutionOptions.add_options(p, si)
+    p.process_command_line(
+        [
+            "--des_def", "dd1",
+            "--state_version", "frwt_v1mock_dd1",
+            "--runtime_history", history,
+            "--verbose",
+            "--job_name", "history_job",
+            "--daf", basedir + "input_files/fitness_functions/example_func.txt",
+            "--w_dGdiff_bonus_weights_file", basedir + "input_files/scan_values/scan_1_2.txt",
+            "--entfunc_weights_file", basedir + "input_files/scan_values/scan_1_2_3.txt",
+        ]
+    )
+    with tmpdir.as_cwd():
+        MSDJobManager(H3H4MergeBBInterfaceMSDJob(opts), opts, si).prepare_job()
+    assert "Linked" in capsys.readouterr().out
+    with open(os.path.join(str(tmpdir), "history_job", "gather_output.sh")) as fid:
+        lines = fid.readlines()
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    command = lines[-1].split()
+    assert command[0].startswith("PYTHONPATH=" + package_root + "$")
+    assert command[1:] == [
+        sys.executable, "-m", "generic_msd.msd_runtime_model",
+        "--job_dir", ".", "--history", history,
+    ]
+
+
+def test_setup_packed_msd_job(tmpdir, capsys):
+    opts = OptHolder()
+    basedir = copy_test_inputs(tmpdir, "dummy")
+    opts["base_dir"] = basedir
+
+    p = blargs.Parser(opts)
+    DesignDefinitionOpts.add_options(p)
+    StateVersionOpts.add_options(p)
+    MSDIntDesJobOptions.add_options(p)
+    PostProcessingOpts.add_options(p)
+
+    si = DogwoodServerIdentifier()
+    JobExecutionOptions.add_options(p, si)
+
+    p.process_command_line(
+        [
+            "--des_def", "desdef1_only_hphobes",
+            "--state_version", "frwt_v1mock_dd1",
+            "--job_name", "packed_job",
+            "--num_cpu", "20",
+            "--pack_nodes", "1",
+            "--daf", basedir + "input_files/fitness_functions/example_func.txt",
+            "--w_dGdiff_bonus_weights_file", basedir + "input_files/scan_values/scan_1_2.txt",
+            "--entfunc_weights_file", basedir + "input_files/scan_values/scan_1_2_3.txt",
+        ]
+    )
+    with tmpdir.as_cwd():
+        MSDJobManager(H3H4InterfaceMSDJob(opts), opts, si).prepare_job()
+
+    # two subjobs of 20 ranks fit on a 44-core node; each of the three
+    # packs asks for the whole node, which dogwood's 528 queue makes 45
+    job_dir = os.path.join(str(tmpdir), "packed_job")
+    for pack_ind in range(1, 4):
+        with open(os.path.join(job_dir, "pack_%d.sh" % pack_ind)) as fid:
+            lines = fid.readlines()
+        assert "#SBATCH --ntasks=45\n" in lines
+        assert len([line for line in lines if "srun --exclusive -n 20" in line]) == 2
+    assert not os.path.exists(os.path.join(job_dir, "pack_4.sh"))
+    out = capsys.readouterr().out
+    assert (
+        "Packed 6 subjobs of 20 ranks into 3 allocations of 44 cores; "
+        "88.9% of the 135 cores requested are used" in out
+    )
+    # the linker's timings are only reported given --verbose
+    assert "Linked" not in out
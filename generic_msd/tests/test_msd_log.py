@@ -0,0 +1,84 @@
+from generic_msd.msd_log import (
+    index_fname,
+    read_msd_log,
+    read_top_set,
+    values_from_logs,
+    values_from_top_set,
+)
+import json
+import os
+
+
+def write_log(logfile, ntop, fitness="-20.0"):
+    lines = [
+        "protocols.genetic_algorithm: (0) Generation %d\n" % gen for gen in range(5)
+    ]
+    for top_set in range(1, ntop + 1):
+        lines.extend(
+            [
+                "apps.public.design.mpi_msd: (0) Top set #%d:\n" % top_set,
+                "apps.public.design.mpi_msd: (0) Writing structure msd_output_%d_AB_0001.pdb with energy -10%d.5\n"
+                % (top_set, top_set),
+                "protocols.pack_daemon.DynamicAggregateFunction: (0) sub expression dGbind_AB evaluated to %s%d\n"
+                % (fitness, top_set),
+            ]
+        )
+    logfile.write("".join(lines))
+
+
+def test_read_top_set(tmpdir):
+    logfile = tmpdir.join("job.log")
+    write_log(logfile, 3)
+
+    out = read_top_set(str(logfile), 2)
+    assert out["top_set"] == "2"
+    assert out["output_tags"] == ["msd_output_2_AB_0001.pdb"]
+    assert out["msd_output_2_AB_0001.pdb"] == "-102.5"
+    assert out["dGbind_AB"] == "-20.02"
+    assert [out["top_set"] for out in read_msd_log(str(logfile))] == ["1", "2", "3"]
+    assert read_top_set(str(logfile), 3)["dGbind_AB"] == "-20.03"
+    assert len(json.loads(tmpdir.join("job.log.topsets.json").read())["offsets"]) == 3
+
+
+def test_top_set_index_is_rebuilt_when_the_log_changes(tmpdir):
+    logfile = tmpdir.join("job.log")
+    write_log(logfile, 2)
+    assert read_top_set(str(logfile), 2)["dGbind_AB"] == "-20.02"
+
+    write_log(logfile, 3, fitness="-30.0")
+    st = os.stat(str(logfile))
+    os.utime(str(logfile), (st.st_atime, st.st_mtime + 10))
+    assert read_top_set(str(logfile), 3)["dGbind_AB"] == "-30.03"
+    assert len(json.loads(open(index_fname(str(logfile))).read())["offsets"]) == 3
+
+
+def test_values_from_logs(tmpdir):
+    logfiles = []
+    for i in range(3):
+        logfile = tmpdir.join("job_%d.log" % i)
+        write_log(logfile, 2)
+        logfiles.append(str(logfile))
+
+    rows = values_from_logs(logfiles, [2, 3], ["dGbind_AB", "bestAA"], ["AB"], nprocs=2)
+    assert rows[0] == [logfiles[0], 2, "-102.5", "-20.02", None]
+    # the logs only report two top sets
+    assert rows[1] == [logfiles[0], 3, None, None, None]
+    assert [row[0] for row in rows] == [
+        logfile for logfile in logfiles for _ in range(2)
+    ]
+
+
+def test_values_from_top_set_keeps_the_first_match():
+    out = {
+        "output_tags": ["msd_output_1_AB_0001.pdb", "msd_output_1_AB_0002.pdb"],
+        "msd_output_1_AB_0001.pdb": "-101.5",
+        "msd_output_1_AB_0002.pdb": "-99.5",
+        "dGbind_AB": "-20.01",
+    }
+    # one column per partial name, unlike read_msd_log.py --logfile, which
+    # prints the energy of every matching structure
+    assert values_from_top_set(out, ["dGbind_AB"], ["AB", "BA"]) == [
+        "-101.5",
+        None,
+        "-20.01",
+    ]
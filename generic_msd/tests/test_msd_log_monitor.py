@@ -0,0 +1,55 @@
+from generic_msd.msd_log_monitor import LogFollower, MSDLogMonitor
+import json
+
+
+def generation_lines(generation, fitness):
+    return (
+        "protocols.genetic_algorithm: (0) Generation %d\n" % generation
+        + "protocols.genetic_algorithm: (0) best fitness: %.1f\n" % fitness
+        + "protocols.pack_daemon.DynamicAggregateFunction: (0) sub expression dGbind_AB evaluated to %.1f\n"
+        % (fitness / 2)
+    )
+
+
+def test_log_follower_reads_only_new_complete_lines(tmpdir):
+    log = tmpdir.join("job.log")
+    log.write("line 1\nline")
+    follower = LogFollower(str(log))
+    assert follower.new_lines() == ["line 1"]
+    assert follower.new_lines() == []
+    log.write(" 2\nline 3\n", mode="a")
+    assert follower.new_lines() == ["line 2", "line 3"]
+
+
+def test_monitor_flags_plateaued_subjobs(tmpdir):
+    plan = {"subjobs": [], "complex_sets": []}
+    fitnesses = {
+        "job_1.0w": [-1.0, -2.0, -3.0, -4.0, -5.0],
+        "job_2.0w": [-1.0, -3.0, -3.0, -3.0, -3.0],
+    }
+    for subjob, trace in fitnesses.items():
+        plan["subjobs"].append({"subjob": subjob, "outputs": []})
+        tmpdir.mkdir(subjob).join(subjob + ".log").write(
+            "".join(generation_lines(i + 1, fitness) for i, fitness in enumerate(trace))
+        )
+    tmpdir.join("gather_plan.json").write(json.dumps(plan))
+
+    monitor = MSDLogMonitor(str(tmpdir))
+    monitor.poll()
+    assert monitor.plateaued_subjobs(3) == ["job_2.0w"]
+    assert monitor.trackers["job_1.0w"].improvement_over(3) == 3.0
+    table = monitor.convergence_table(3, subexpressions=["dGbind_AB"])
+    assert table[1].split() == ["job_1.0w", "5", "-5.000", "3.000", "-2.5", "running"]
+    assert table[2].split()[-1] == "PLATEAU"
+
+    # the logs are followed: a new generation and the top sets are picked up
+    tmpdir.join("job_2.0w").join("job_2.0w.log").write(
+        generation_lines(6, -4.0)
+        + "apps.public.design.mpi_msd: (0) Top set #1:\n",
+        mode="a",
+    )
+    monitor.poll()
+    assert monitor.trackers["job_2.0w"].best_so_far()[-1] == -4.0
+    assert monitor.trackers["job_2.0w"].finished
+    assert monitor.plateaued_subjobs(3) == []
+    assert not monitor.all_finished()
@@ -0,0 +1,84 @@
+from generic_msd.msd_runtime_model import (
+    RuntimeHistory,
+    RuntimeModel,
+    fit_runtime_model,
+    choose_num_cpu,
+    candidate_cpu_counts,
+    timelimit_for_seconds,
+    record_job_runtimes,
+)
+import json
+import os
+
+
+def record(num_cpu, seconds, des_def="dd1"):
+    return {
+        "state_version": "frwt_v1",
+        "des_def": des_def,
+        "nstates": 20,
+        "n_entities": 12,
+        "pop_size": 100,
+        "ngen": 180,
+        "num_cpu": num_cpu,
+        "seconds": seconds,
+    }
+
+
+def test_fit_runtime_model():
+    # 100 s to start up plus 0.01 s per unit of work
+    records = [record(n, 100 + 0.01 * 18000 * -(-20 // n)) for n in (20, 10, 5)]
+    model = RuntimeModel.fit(records)
+    assert abs(model.intercept - 100) < 1e-6
+    assert abs(model.slope - 0.01) < 1e-9
+    assert abs(model.predict(records[0], 4) - (100 + 0.01 * 18000 * 5)) < 1e-6
+
+    # too little variation in the work to fit a line
+    assert RuntimeModel.fit(records[:1]) is None
+
+
+def test_fit_falls_back_on_all_runs(tmpdir):
+    history = RuntimeHistory(str(tmpdir.join("history.json")))
+    for n, seconds in ((20, 1000), (10, 1900)):
+        history.add(record(n, seconds, des_def="dd2"))
+    model = fit_runtime_model(history, "frwt_v1", "dd1")
+    assert model.scale_by_entities
+    history.add(record(5, 3700))
+    history.add(record(20, 1000))
+    model = fit_runtime_model(history, "frwt_v1", "dd1")
+    assert not model.scale_by_entities
+    assert model.nrecords == 2
+
+
+def test_choose_num_cpu():
+    assert candidate_cpu_counts(20, 20) == [1, 2, 3, 4, 5, 7, 10, 20]
+    model = RuntimeModel(100, 0.01, False, 3)
+    features = record(0, 0)
+    # no time limit: the fastest is 20 cpus at 280 s; 10 cpus take 460 s
+    assert choose_num_cpu(model, features, 20, lambda n: None) == (20, 280)
+    assert choose_num_cpu(model, features, 10, lambda n: None) == (10, 460)
+    # a generous tolerance prefers fewer cpus
+    assert choose_num_cpu(model, features, 20, lambda n: None, tolerance=1.0)[0] == 10
+    assert choose_num_cpu(model, features, 20, lambda n: 60) is None
+
+
+def test_timelimit_for_seconds():
+    assert timelimit_for_seconds(100) == (0, 1, 0)
+    assert timelimit_for_seconds(3 * 3600) == (0, 5, 0)
+    assert timelimit_for_seconds(20 * 3600) == (1, 6, 0)
+
+
+def test_record_job_runtimes(tmpdir):
+    features = record(20, 0)
+    del features["seconds"]
+    features["subjobs"] = ["sub1", "sub2"]
+    tmpdir.join("runtime_features.json").write(json.dumps(features))
+    tmpdir.mkdir("sub1").join("msd_walltime.txt").write("1234\n")
+    tmpdir.mkdir("sub2")
+
+    history_fname = str(tmpdir.join("history.json"))
+    record_job_runtimes(str(tmpdir), history_fname)
+    history = RuntimeHistory(history_fname)
+    assert len(history.records) == 1
+    assert history.records[0]["subjob"] == "sub1"
+    assert history.records[0]["seconds"] == 1234
+    assert history.records_for("frwt_v1", "dd1") == history.records
@@ -0,0 +1,81 @@
+from generic_msd.pdb_coordinates import (
+    duplicate_pdbs,
+    read_pdb_coordinates,
+    separate_chains,
+)
+import numpy
+
+
+def atom_line(serial, name, resname, chain, resid, xyz):
+    return "ATOM  %5d %-4s %3s %c%4d    %8.3f%8.3f%8.3f  1.00  0.00\n" % (
+        (serial, name, resname, chain, resid) + tuple(xyz)
+    )
+
+
+def write_complex(fname):
+    lines = [
+        "REMARK a complex\n",
+        atom_line(1, " CA ", "ALA", "A", 96, (0, 0, 0)),
+        atom_line(2, " CA ", "GLY", "B", 58, (3, 4, 0)),
+        atom_line(3, " CB ", "GLY", "B", 58, (1, 1, 1)),
+        "TER\n",
+        atom_line(4, " O  ", "HOH", "W", 1, (5, 5, 5)),
+        "TER\n",
+        "END\n",
+    ]
+    fname.write("".join(lines))
+
+
+def test_separate_chains(tmpdir):
+    write_complex(tmpdir.join("complex.pdb"))
+    separate_chains(
+        str(tmpdir.join("complex.pdb")),
+        str(tmpdir.join("complex_sep.pdb")),
+        ["B"],
+        ("A", "96", " CA "),
+        ("B", "58", " CA "),
+        50,
+    )
+    lines = tmpdir.join("complex_sep.pdb").readlines()
+    original = tmpdir.join("complex.pdb").readlines()
+    assert len(lines) == len(original)
+    # chain B moves 50 A along the A96 -> B58 direction; nothing else changes
+    assert lines[2] == atom_line(2, " CA ", "GLY", "B", 58, (33, 44, 0))
+    assert lines[3] == atom_line(3, " CB ", "GLY", "B", 58, (31, 41, 1))
+    for i in (0, 1, 4, 5, 6, 7):
+        assert lines[i] == original[i]
+
+
+def test_duplicate_residues(tmpdir):
+    write_complex(tmpdir.join("complex.pdb"))
+    pdbc = read_pdb_coordinates(str(tmpdir.join("complex.pdb")))
+    pdbc.duplicate_residues("W", "V", ("HOH",))
+    pdbc.translate_chains(["V"], numpy.array([1.0, 0, 0]))
+    lines = pdbc.pdb_lines()
+    assert lines[5] == atom_line(4, " O  ", "HOH", "W", 1, (5, 5, 5))
+    assert lines[7:] == [
+        atom_line(4, " O  ", "HOH", "V", 1, (6, 5, 5)),
+        "TER\n",
+        "END\n",
+    ]
+
+
+def test_duplicate_pdbs(tmpdir):
+    write_complex(tmpdir.join("complex.pdb"))
+    # renumbered atoms and other remarks: the same structure
+    renumbered = [
+        "REMARK a copy\n",
+        atom_line(11, " CA ", "ALA", "A", 96, (0, 0, 0)),
+        atom_line(12, " CA ", "GLY", "B", 58, (3, 4, 0)),
+        atom_line(13, " CB ", "GLY", "B", 58, (1, 1, 1)),
+        "TER\n",
+        atom_line(14, " O  ", "HOH", "W", 1, (5, 5, 5)),
+    ]
+    tmpdir.join("copy.pdb").write("".join(renumbered))
+    moved = list(renumbered)
+    moved[3] = atom_line(13, " CB ", "GLY", "B", 58, (1, 1, 1.001))
+    tmpdir.join("moved.pdb").write("".join(moved))
+    fnames = [str(tmpdir.join(name)) for name in ["complex.pdb", "moved.pdb", "copy.pdb"]]
+
+    assert duplicate_pdbs(fnames) == {fnames[2]: fnames[0]}
+    assert duplicate_pdbs(fnames, nworkers=2) == {fnames[2]: fnames[0]}
@@ -0,0 +1,89 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        "example",
+        "pyscripts",
+    ),
+)
+from replace_design_in_h3h4ctxt import (
+    context_template,
+    splice_design_into_context,
+    place_designs_into_xtal_context,
+)
+
+
+def atom_line(serial, name, resname, chain, resid, xyz):
+    return "ATOM  %5d %-4s %3s %c%4d    %8.3f%8.3f%8.3f  1.00  0.00\n" % (
+        (serial, name, resname, chain, resid) + tuple(xyz)
+    )
+
+
+def context_lines():
+    return [
+        "REMARK a context\n",
+        atom_line(1, " CA ", "ALA", "A", 96, (0, 0, 0)),
+        "TER\n",
+        atom_line(2, " CA ", "GLY", "B", 58, (3, 4, 0)),
+        "TER\n",
+        atom_line(3, " P  ", "  DA", "I", 1, (5, 5, 5)),
+        "TER\n",
+        "END\n",
+    ]
+
+
+def design_lines():
+    return [
+        atom_line(1, " CA ", "VAL", "A", 96, (0, 1, 0)),
+        atom_line(2, " CB ", "VAL", "A", 96, (0, 2, 0)),
+        "TER\n",
+        atom_line(3, " CA ", "LEU", "B", 58, (3, 5, 0)),
+        "TER\n",
+        atom_line(4, " O  ", "HOH", "W", 1, (9, 9, 9)),
+        "END\n",
+    ]
+
+
+def test_context_template(tmpdir):
+    ctxt = tmpdir.join("ctxt.pdb")
+    ctxt.write("".join(context_lines()))
+    lines = context_lines()
+    assert context_template(str(ctxt)) == [lines[0], "A", "B"] + lines[5:]
+
+
+def test_splice_design_into_context(tmpdir):
+    ctxt = tmpdir.join("ctxt.pdb")
+    ctxt.write("".join(context_lines()))
+    design = tmpdir.join("design.pdb")
+    design.write("".join(design_lines()))
+    outputs = place_designs_into_xtal_context(
+        str(ctxt), [(str(design), str(tmpdir.join("out.pdb")))], splice=True
+    )
+    assert outputs == [str(tmpdir.join("out.pdb"))]
+
+    des = design_lines()
+    ctxt_lines = context_lines()
+    assert tmpdir.join("out.pdb").readlines() == (
+        [ctxt_lines[0]]
+        + des[0:2]
+        + ["TER\n"]
+        + des[3:4]
+        + ["TER\n"]
+        + ctxt_lines[5:]
+    )
+
+
+def test_splice_design_missing_a_chain(tmpdir):
+    ctxt = tmpdir.join("ctxt.pdb")
+    ctxt.write("".join(context_lines()))
+    design = tmpdir.join("design.pdb")
+    design.write("".join(line for line in design_lines() if line[21:22] != "B"))
+    with pytest.raises(ValueError):
+        splice_design_into_context(
+            context_template(str(ctxt)), str(design), str(tmpdir.join("out.pdb"))
+        )
+    assert not tmpdir.join("out.pdb").exists()
@@ -0,0 +1,86 @@
+from generic_msd.results_store import ResultsStore
+import json
+import os
+
+
+def msd_log_lines(fitness):
+    lines = []
+    for top_set in [1, 2]:
+        lines.extend(
+            [
+                "apps.public.design.mpi_msd: (0) Top set #%d:\n" % top_set,
+                "apps.public.design.mpi_msd: (0) Writing structure msd_output_%d_AB_0001.pdb with energy -10%d.5\n"
+                % (top_set, top_set),
+                "apps.public.design.mpi_msd: (0) Writing structure msd_output_%d_A_0001.pdb with energy -5%d.5\n"
+                % (top_set, top_set),
+                "protocols.pack_daemon.DynamicAggregateFunction: (0) sub expression dGbind_AB evaluated to %s\n"
+                % fitness,
+            ]
+        )
+    return lines
+
+
+def write_results_job(tmpdir):
+    job_dir = tmpdir.mkdir("job")
+    plan = {"subjobs": [], "complex_sets": []}
+    for subjob in ["job_1.0w", "job_2.0w"]:
+        job_dir.mkdir(subjob).join(subjob + ".log").write("".join(msd_log_lines("-20.0")))
+        outputs = []
+        for result in [1, 2]:
+            for spec in ["AB", "A"]:
+                outputs.append(
+                    ["msd_output_%d_%s" % (result, spec), "%s_%d_%s.pdb" % (subjob, result, spec)]
+                )
+        plan["subjobs"].append({"subjob": subjob, "outputs": outputs})
+    job_dir.join("gather_plan.json").write(json.dumps(plan))
+    results = job_dir.mkdir("results")
+    results.join("complex_sets_in_ctxt.list").write(
+        "job_1.0w_1_AB_ctxt.pdb job_1.0w_1_A_ctxt.pdb\n"
+    )
+    results.mkdir("best_docked").join("after_docking_dGbind.txt").write(
+        "job_1.0w_1_AB_ctxt.pdb, -30.000000, -12.000000 ( 1.000000, 2.000000 ) ( 3.000000 )"
+        "  AH3_AH4: chA A10V chB BH3_BH4: chA chB L20F\n"
+    )
+    return job_dir
+
+
+def test_ingest_job(tmpdir):
+    job_dir = write_results_job(tmpdir)
+    store = ResultsStore(str(tmpdir.join("results.db")))
+    store.ingest_job(str(job_dir))
+
+    assert store.n_files_read == 3
+    assert store.msd_value("job", "job_2.0w", 2, "dGbind_AB") == -20.0
+    assert store.query(
+        "SELECT species, energy FROM msd_structures"
+        " WHERE subjob = 'job_1.0w' AND result_index = 2 ORDER BY species"
+    ) == [("A", -52.5), ("AB", -102.5)]
+    assert store.query(
+        "SELECT subjob, result_index, species, avg_top10_dGbind FROM docking"
+        " ORDER BY position"
+    ) == [("job_1.0w", 1, "AB", -30.0), ("job_1.0w", 1, "A", -12.0)]
+    assert store.query(
+        "SELECT label, mutations FROM mutations ORDER BY label"
+    ) == [("AH3_AH4", "chA A10V chB"), ("BH3_BH4", "chA chB L20F")]
+    store.close()
+
+
+def test_ingest_job_rereads_only_changed_files(tmpdir):
+    job_dir = write_results_job(tmpdir)
+    db = str(tmpdir.join("results.db"))
+    ResultsStore(db).ingest_job(str(job_dir))
+
+    log = job_dir.join("job_1.0w").join("job_1.0w.log")
+    log.write("".join(msd_log_lines("-25.0")))
+    # make sure the modification time changes even on coarse file systems
+    st = os.stat(str(log))
+    os.utime(str(log), (st.st_atime, st.st_mtime + 10))
+
+    store = ResultsStore(db)
+    store.ingest_job(str(job_dir))
+    assert store.n_files_read == 1
+    assert store.n_files_skipped == 2
+    assert store.msd_value("job", "job_1.0w", 1, "dGbind_AB") == -25.0
+    assert store.msd_value("job", "job_2.0w", 1, "dGbind_AB") == -20.0
+    assert store.query("SELECT COUNT(*) FROM msd_values") == [(4,)]
+    store.close()
@@ -0,0 +1,90 @@
+from generic_msd.msd_interface_design import StateVersionOpts
+from generic_msd.tests.dummy_desdef import dummy_design_species
+from generic_msd.tests.dummy_state_version import dummy_state_version
+import os
+import pytest
+import shutil
+
+
+class empty_class:
+    pass
+
+
+class failing_state_version(dummy_state_version):
+    def separate_pdb(self, complex_pdb, sep_pdb):
+        # write part of the separated pdb before failing
+        with open(os.path.join(self.state_version_dir, sep_pdb), "w") as fid:
+            fid.write("ATOM  \n")
+        raise RuntimeError("could not separate " + complex_pdb)
+
+
+class separating_state_version(dummy_state_version):
+    def separate_pdb(self, complex_pdb, sep_pdb):
+        # the callbacks must not have been invoked before the pdbs exist
+        assert len(self.all_pdbs) == 0
+        shutil.copyfile(
+            os.path.join(self.state_version_dir, complex_pdb),
+            os.path.join(self.state_version_dir, sep_pdb),
+        )
+
+
+def state_version_with_missing_separations(tmpdir, workers):
+    currpath = os.path.dirname(os.path.abspath(__file__))
+    svdir = os.path.join(str(tmpdir), "input_files/state_versions/sv")
+    shutil.copytree(
+        os.path.join(currpath, "dummy/input_files/state_versions/frwt_v1mock_dd1"),
+        svdir,
+        ignore=shutil.ignore_patterns(".state_version_cache.pkl"),
+    )
+    opts = empty_class()
+    opts.base_dir = str(tmpdir)
+    opts.state_version = "sv"
+    opts.separation_workers = workers
+    return svdir, StateVersionOpts(opts)
+
+
+def test_determine_pdbs_creates_missing_separations_in_parallel(tmpdir):
+    svdir, opts = state_version_with_missing_separations(tmpdir, 2)
+    for bb in ["0982", "0331"]:
+        os.remove(os.path.join(svdir, "1KX5_chAB_%s_sep.pdb" % bb))
+
+    state_ver = separating_state_version(opts, dummy_design_species())
+    state_ver.determine_pdbs()
+    for bb in ["0982", "0331"]:
+        assert os.path.isfile(os.path.join(svdir, "1KX5_chAB_%s_sep.pdb" % bb))
+    assert state_ver.sep_states_both_mut == {
+        "1KX5_chAB_0982_sep.pdb": "rwt_0982",
+        "1KX5_chAB_0331_sep.pdb": "rwt_0331",
+    }
+    assert len(state_ver.neg_states_wtA) == 2
+
+    # a second run finds every separated pdb in place
+    state_ver = failing_state_version(opts, dummy_design_species())
+    state_ver.determine_pdbs()
+    assert len(state_ver.pos_states) == 2
+    assert len(state_ver.sep_states_both_mut) == 2
+
+
+def test_failed_separation_leaves_no_partial_pdb(tmpdir):
+    for workers in [1, 2]:
+        svdir, opts = state_version_with_missing_separations(
+            tmpdir.mkdir("workers%d" % workers), workers
+        )
+        sep_pdb = os.path.join(svdir, "1KX5_chAB_0982_sep.pdb")
+        os.remove(sep_pdb)
+        state_ver = failing_state_version(opts, dummy_design_species())
+        with pytest.raises(RuntimeError):
+            state_ver.determine_pdbs()
+        assert not os.path.exists(sep_pdb)
+
+
+def test_state_ver_opts_separation_workers():
+    opts = empty_class()
+    opts.base_dir = "base"
+    opts.state_version = "sv"
+    assert StateVersionOpts(opts).to_command_line() == "--state_version sv"
+    opts.separation_workers = 4
+    assert (
+        StateVersionOpts(opts).to_command_line()
+        == "--state_version sv --separation_workers 4"
+    )
@@ -0,0 +1,142 @@
+from generic_msd.msd_interface_design import StateVersionOpts
+from generic_msd.tests.dummy_desdef import dummy_design_species
+from generic_msd.tests.dummy_state_version import dummy_state_version
+import os
+import pytest
+import shutil
+
+
+class empty_class:
+    pass
+
+
+def unreadable_state_version(opts, design_species):
+    state_ver = dummy_state_version(opts, design_species)
+
+    def fail():
+        raise AssertionError("the list files should not have been read")
+
+    state_ver.determine_pdbs_from_pos_backbones = fail
+    return state_ver
+
+
+def copy_state_version(tmpdir, rebuild=False):
+    currpath = os.path.dirname(os.path.abspath(__file__))
+    svdir = os.path.join(str(tmpdir), "input_files/state_versions/sv")
+    if not os.path.isdir(svdir):
+        shutil.copytree(
+            os.path.join(currpath, "dummy/input_files/state_versions/frwt_v1mock_dd1"),
+            svdir,
+            ignore=shutil.ignore_patterns(".state_version_cache.pkl"),
+        )
+    opts = empty_class()
+    opts.base_dir = str(tmpdir)
+    opts.state_version = "sv"
+    opts.rebuild_state_version_cache = rebuild
+    return svdir, StateVersionOpts(opts)
+
+
+def read_state_version(state_ver):
+    state_ver.determine_pdbs()
+    state_ver.create_state_file_lists()
+    return state_ver
+
+
+def test_snapshot_is_loaded_for_an_unchanged_state_version(tmpdir):
+    svdir, opts = copy_state_version(tmpdir)
+    first = read_state_version(dummy_state_version(opts, dummy_design_species()))
+    assert os.path.isfile(os.path.join(svdir, ".state_version_cache.pkl"))
+
+    second = read_state_version(unreadable_state_version(opts, dummy_design_species()))
+    assert second.backbone_names == first.backbone_names
+    assert second.negbackbone_names == first.negbackbone_names
+    assert second.pos_states == first.pos_states
+    assert second.neg_states_wtA == first.neg_states_wtA
+    assert second.sep_states_wtB == first.sep_states_wtB
+    assert second.all_pdbs == first.all_pdbs
+    assert second.state_counts == first.state_counts
+    assert second.nstates_total() == first.nstates_total()
+
+
+def test_snapshot_is_not_used_once_the_state_version_changes(tmpdir):
+    svdir, opts = copy_state_version(tmpdir)
+    read_state_version(dummy_state_version(opts, dummy_design_species()))
+
+    # a .states file has gone missing
+    os.remove(os.path.join(svdir, "MH3_MH4_for_rwt_0982.states"))
+    state_ver = read_state_version(dummy_state_version(opts, dummy_design_species()))
+    assert os.path.isfile(os.path.join(svdir, "MH3_MH4_for_rwt_0982.states"))
+    assert state_ver.nstates_for_spec_and_bb("MH3_MH4", "rwt_0982") == 1
+
+    # a list file has been edited: drop the second negative backbone
+    neg_backbones = os.path.join(svdir, "neg_backbones.list")
+    with open(neg_backbones) as fid:
+        lines = [line for line in fid.readlines() if line.strip()]
+    with open(neg_backbones, "w") as fid:
+        fid.writelines(lines[:2])
+    state_ver = read_state_version(dummy_state_version(opts, dummy_design_species()))
+    assert len(state_ver.negbackbone_names) == 1
+    read_state_version(unreadable_state_version(opts, dummy_design_species()))
+
+    # and it can be rebuilt on request
+    svdir, opts = copy_state_version(tmpdir, rebuild=True)
+    state_ver = dummy_state_version(opts, dummy_design_species())
+    read_state_version(state_ver)
+    assert len(state_ver.negbackbone_names) == 1
+
+
+class positive_design_species(dummy_design_species):
+    def species(self):
+        return ["MH3_MH4", "MH3_p_MH4"]
+
+
+def test_snapshot_is_shared_by_other_design_species(tmpdir):
+    svdir, opts = copy_state_version(tmpdir)
+    for fname in os.listdir(svdir):
+        if fname.endswith(".states"):
+            os.remove(os.path.join(svdir, fname))
+    read_state_version(dummy_state_version(opts, positive_design_species()))
+    assert not os.path.isfile(os.path.join(svdir, "WTH3_MH4_for_wtA1.states"))
+
+    state_ver = read_state_version(
+        unreadable_state_version(opts, dummy_design_species())
+    )
+    assert os.path.isfile(os.path.join(svdir, "WTH3_MH4_for_wtA1.states"))
+    assert state_ver.nstates_for_spec_and_bb("WTH3_MH4", "wtA1") == 1
+    assert state_ver.nstates_for_spec_and_bb("MH3_p_MH4", "rwt_0982") == 1
+
+
+def test_snapshot_of_a_copied_state_version_checks_the_copy(tmpdir):
+    svdir, opts = copy_state_version(tmpdir)
+    read_state_version(dummy_state_version(opts, dummy_design_species()))
+    moved_dir = os.path.join(str(tmpdir), "input_files/state_versions/moved")
+    shutil.copytree(svdir, moved_dir)
+    opts.state_version_dir = "moved"
+    read_state_version(unreadable_state_version(opts, dummy_design_species()))
+
+    # the copy is edited, but the original is not
+    neg_backbones = os.path.join(moved_dir, "neg_backbones.list")
+    with open(neg_backbones) as fid:
+        lines = [line for line in fid.readlines() if line.strip()]
+    with open(neg_backbones, "w") as fid:
+        fid.writelines(lines[:2])
+    state_ver = read_state_version(dummy_state_version(opts, dummy_design_species()))
+    assert len(state_ver.negbackbone_names) == 1
+
+
+def test_state_ver_opts_rebuild_state_version_cache():
+    opts = empty_class()
+    opts.base_dir = "base"
+    opts.state_version = "sv"
+    opts.rebuild_state_version_cache = True
+    assert (
+        StateVersionOpts(opts).to_command_line()
+        == "--state_version sv --rebuild_state_version_cache"
+    )
+
+
+def test_dedupe_pdbs_is_refused(tmpdir):
+    svdir, opts = copy_state_version(tmpdir)
+    opts.dedupe_pdbs = True
+    with pytest.raises(ValueError, match="MergeBB"):
+        dummy_state_version(opts, dummy_design_species())